@@ -0,0 +1,166 @@
+#! /usr/bin/python
+# Script to serve data from generate-police-data.py as a local stand-in for the police API (https://data.police.uk/docs/)
+# covers the endpoints load-police-data.py uses; point it at this server with --api-url=http://localhost:<port>/
+# optional latency, failure rate and rate limit mimic a bad day on data.police.uk, so retries and backoff can be measured too
+
+# load required libraries
+import getopt, sys, os, json, re, random, threading
+from time import sleep, time
+from urlparse import parse_qs
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+# hard coded defaults
+data_dir = 'benchmark-data'	# directory written by generate-police-data.py
+port = 8642
+latency = 0.0		# seconds added to every response
+failure_rate = 0.0	# fraction of requests answered with a 500
+rate = 0.0		# requests per second served before answering 429 (0 means no limit)
+max_results = 10000	# poly queries returning more records than this get a 503, as the police API does
+
+meta = None		# force, neighbourhoods, categories and months (meta.json)
+datasets = {}		# dataset : month : list of records
+rate_lock = threading.Lock()
+rate_window = [0.0, 0]	# start of current one second window, requests served in it
+
+# returns (min latitude, min longitude, max latitude, max longitude) of police API poly string (<lat>,<long>:<lat>,<long>...)
+def get_poly_bounds(poly):
+	points = [tuple(float(value) for value in point.split(',')) for point in poly.split(':') if len(point) > 0]
+	return (min(point[0] for point in points), min(point[1] for point in points), max(point[0] for point in points), max(point[1] for point in points))
+
+# returns (latitude, longitude) of record location (None if not located)
+def get_point(dataset, record):
+	location = record['crime']['location'] if dataset == 'outcomes' else record['location']
+	if location is None:
+		return None
+	return (float(location['latitude']), float(location['longitude']))
+
+# returns records of dataset and month inside poly bounds (MBR and tile polys are always rectangles)
+def get_poly_records(dataset, month, poly):
+	min_latitude, min_longitude, max_latitude, max_longitude = get_poly_bounds(poly)
+	records = []
+	for record in datasets[dataset].get(month, []):
+		point = get_point(dataset, record)
+		if point is not None and min_latitude <= point[0] <= max_latitude and min_longitude <= point[1] <= max_longitude:
+			records.append(record)
+	return records
+
+# returns true if request is within rate (one second windows)
+def within_rate():
+	if rate <= 0:
+		return True
+	with rate_lock:
+		now = time()
+		if now - rate_window[0] >= 1:
+			rate_window[0] = now
+			rate_window[1] = 0
+		rate_window[1] = rate_window[1] + 1
+		return rate_window[1] <= rate
+
+# answers police API requests
+class PoliceHandler(BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1'	# keep-alive, as the police API
+
+	def do_GET(self):
+		if latency > 0:
+			sleep(latency)
+		if not within_rate():
+			return self.send(429, {'error': 'rate limited'}, {'Retry-After': '1'})
+		if failure_rate > 0 and random.random() < failure_rate:
+			return self.send(500, {'error': 'synthetic failure'})
+		path, separator, query = self.path.partition('?') # not urlparse; the loader asks for '//crimes-street/...', which would parse as a host
+		params = dict((name, values[0]) for name, values in parse_qs(query).items())
+		parts = [part for part in path.split('/') if len(part) > 0]
+		if len(parts) > 0 and parts[0] == 'api':
+			parts = parts[1:]
+		status, data = self.route(parts, params)
+		self.send(status, data)
+
+	# returns (status, data) for path parts and query params
+	def route(self, parts, params):
+		if parts == ['crime-last-updated']:
+			return (200, {'date': meta['last_updated']})
+		if parts == ['crime-categories']:
+			return (200, meta['crime_categories'])
+		if parts == ['locate-neighbourhood']:
+			return (200, {'force': meta['force']['id'], 'neighbourhood': meta['neighbourhoods'][0]['id']})
+		if len(parts) == 2 and parts[0] == 'forces':
+			return (200, meta['force']) if parts[1] == meta['force']['id'] else (404, None)
+		if parts in (['crimes-street', 'all-crime'], ['outcomes-at-location'], ['stops-street']):
+			if 'poly' not in params or 'date' not in params:
+				return (400, None)
+			records = get_poly_records({'crimes-street': 'crimes', 'outcomes-at-location': 'outcomes', 'stops-street': 'stops'}[parts[0]], params['date'], params['poly'])
+			return (503, None) if len(records) > max_results else (200, records)
+		if len(parts) >= 2 and parts[0] == meta['force']['id']:
+			if parts[1] == 'neighbourhoods' and len(parts) == 2:
+				return (200, [{'id': neighbourhood['id'], 'name': neighbourhood['name']} for neighbourhood in meta['neighbourhoods']])
+			for neighbourhood in meta['neighbourhoods']:
+				if neighbourhood['id'] == parts[1]:
+					if len(parts) == 3 and parts[2] == 'boundary':
+						return (200, neighbourhood['boundary'])
+					return (200, dict((field, value) for field, value in neighbourhood.items() if field != 'boundary'))
+		return (404, None)
+
+	def send(self, status, data, headers=None):
+		body = json.dumps(data) if data is not None else ''
+		self.send_response(status)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		for header, value in (headers or {}).items():
+			self.send_header(header, value)
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):
+		pass # keep benchmark output clean
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+	daemon_threads = True
+
+
+### MAIN ###
+
+# manage commandline args
+try:
+	opts, args = getopt.getopt(sys.argv[1:], "d:", ["data=", "port=", "latency=", "failure-rate=", "rate=" ])
+except getopt.GetoptError as err:
+	print(err)
+	sys.exit(2)
+
+# get commandline options
+for o, a in opts:
+	if o in ("-d", "--data"):
+		data_dir = a
+	elif o in ("--port",):
+		port = int(a)
+	elif o in ("--latency",):
+		latency = float(a)
+	elif o in ("--failure-rate",):
+		failure_rate = float(a)
+	elif o in ("--rate",):
+		rate = float(a)
+
+# load generated data
+try:
+	with open(os.path.join(data_dir, 'meta.json')) as f:
+		meta = json.load(f)
+	for dataset in ('crimes', 'outcomes', 'stops'):
+		datasets[dataset] = {}
+		for month in meta['months']:
+			with open(os.path.join(data_dir, dataset, month + '.json')) as f:
+				datasets[dataset][month] = json.load(f)
+except Exception as ex:
+	print('ERR: Unable to read generated police data in "' + data_dir + '" (see generate-police-data.py)')
+	template = " - An exception of type {0} occurred. Arguments:\n{1!r}"
+	message = template.format(type(ex).__name__, ex.args)
+	print message
+	sys.exit(1)
+
+server = ThreadingHTTPServer(('127.0.0.1', port), PoliceHandler)
+print('INF: Serving police data from "' + data_dir + '" on http://127.0.0.1:' + str(port) + '/')
+sys.stdout.flush()
+try:
+	server.serve_forever()
+except KeyboardInterrupt:
+	pass
+server.server_close()
@@ -0,0 +1,229 @@
+#! /usr/bin/python
+# Script to generate synthetic police data for fake-police-api.py (see run-benchmark.py)
+# same random seed and volumes always give the same data, so benchmark runs are comparable
+
+# load required libraries
+import getopt, sys, os, json, random, hashlib
+from datetime import datetime
+from dateutil import relativedelta
+
+# hard coded defaults
+output_dir = 'benchmark-data'	# directory data is written to
+region = 'Reading Borough'	# region place name (must match the 'region' variable set by datamap.sql)
+bounds = (51.40, -1.05, 51.49, -0.93)	# region (min latitude, min longitude, max latitude, max longitude)
+months = 12		# months of data, ending last month
+crimes = 5000		# crimes per month
+outcomes = 0.6		# outcomes per crime (spread over the crime's month and the following months)
+stops = 300		# stops per month
+locations = 2000	# police-location streets crimes and stops are snapped to
+neighbourhoods = 4	# neighbourhoods along each side of the region (so neighbourhoods x neighbourhoods in all)
+seed = 1		# random seed
+force_id = 'bench-valley'
+
+# police API crime categories (code, name) and outcome categories (code, name)
+crime_categories = [
+		('anti-social-behaviour',	'Anti-social behaviour'),
+		('bicycle-theft',		'Bicycle theft'),
+		('burglary',			'Burglary'),
+		('criminal-damage-arson',	'Criminal damage and arson'),
+		('drugs',			'Drugs'),
+		('other-theft',			'Other theft'),
+		('possession-of-weapons',	'Possession of weapons'),
+		('public-order',		'Public order'),
+		('robbery',			'Robbery'),
+		('shoplifting',			'Shoplifting'),
+		('theft-from-the-person',	'Theft from the person'),
+		('vehicle-crime',		'Vehicle crime'),
+		('violent-crime',		'Violence and sexual offences'),
+		('other-crime',			'Other crime')
+	]
+outcome_categories = [
+		('under-investigation',		'Under investigation'),
+		('no-further-action',		'Investigation complete; no suspect identified'),
+		('unable-to-prosecute',		'Unable to prosecute suspect'),
+		('local-resolution',		'Local resolution'),
+		('charged',			'Suspect charged'),
+		('awaiting-court-result',	'Awaiting court outcome')
+	]
+
+# returns random point (latitude, longitude) in bounds
+def random_point(bounds):
+	return (random.uniform(bounds[0], bounds[2]), random.uniform(bounds[1], bounds[3]))
+
+# returns police API location for street
+def get_location(street):
+	return {'latitude': '%.6f' % street['latitude'], 'longitude': '%.6f' % street['longitude'], 'street': {'id': street['id'], 'name': street['name']}}
+
+# returns police API boundary (list of points) for rectangle
+def get_boundary(min_latitude, min_longitude, max_latitude, max_longitude):
+	return [{'latitude': '%.6f' % latitude, 'longitude': '%.6f' % longitude} for latitude, longitude in \
+		((min_latitude, min_longitude), (max_latitude, min_longitude), (max_latitude, max_longitude), (min_latitude, max_longitude))]
+
+# returns force, neighbourhoods and region details
+def generate_meta(month_strings):
+	neighbourhood_list = []
+	height = (bounds[2] - bounds[0]) / neighbourhoods
+	width = (bounds[3] - bounds[1]) / neighbourhoods
+	for row in range(neighbourhoods):
+		for column in range(neighbourhoods):
+			min_latitude = bounds[0] + row * height
+			min_longitude = bounds[1] + column * width
+			identifier = 'BN' + str(row * neighbourhoods + column + 1).rjust(3, '0')
+			neighbourhood_list.append({
+				'id': identifier,
+				'name': 'Bench neighbourhood ' + identifier,
+				'description': 'Synthetic neighbourhood ' + identifier,
+				'population': str(random.randint(5000, 15000)),
+				'centre': {'latitude': '%.6f' % (min_latitude + height / 2), 'longitude': '%.6f' % (min_longitude + width / 2)},
+				'contact_details': {'email': identifier.lower() + '@example.org', 'telephone': '101'},
+				'engagement_methods': [],
+				'boundary': get_boundary(min_latitude, min_longitude, min_latitude + height, min_longitude + width)
+				})
+	return {
+		'last_updated': month_strings[-1] + '-01',
+		'months': month_strings,
+		'region': {'name': region, 'bounds': bounds},
+		'force': {
+			'id': force_id,
+			'name': 'Bench Valley Police',
+			'description': 'Synthetic police force',
+			'url': 'http://www.example.org',
+			'telephone': '101',
+			'engagement_methods': [{'title': 'twitter', 'url': 'https://twitter.com/example', 'type': 'twitter', 'description': None}]
+			},
+		'neighbourhoods': neighbourhood_list,
+		'crime_categories': [{'url': code, 'name': name} for code, name in crime_categories]
+		}
+
+# returns crimes of month_string
+def generate_crimes(month_string, streets, next_id):
+	crime_list = []
+	for i in range(crimes):
+		street = random.choice(streets)
+		category = random.choice(crime_categories)[0]
+		outcome = None if category == 'anti-social-behaviour' else random.choice(outcome_categories)
+		crime_list.append({
+			'id': next_id + i,
+			'persistent_id': '' if category == 'anti-social-behaviour' else hashlib.sha256(month_string + str(next_id + i)).hexdigest(),
+			'category': category,
+			'context': '',
+			'month': month_string,
+			'location_type': 'Force',
+			'location_subtype': '',
+			'location': get_location(street),
+			'outcome_status': None if outcome is None else {'category': outcome[1], 'date': month_string}
+			})
+	return crime_list
+
+# returns outcomes of month_string for crimes of this and earlier months
+def generate_outcomes(month_string, crimes_by_month):
+	outcome_list = []
+	candidates = [crime for month_crimes in crimes_by_month[-3:] for crime in month_crimes if len(crime['persistent_id']) > 0]
+	for i in range(int(crimes * outcomes)):
+		crime = random.choice(candidates)
+		category = random.choice(outcome_categories)
+		outcome_list.append({
+			'category': {'code': category[0], 'name': category[1]},
+			'date': month_string,
+			'person_id': None,
+			'crime': dict((field, crime[field]) for field in ('id', 'persistent_id', 'category', 'context', 'month', 'location_type', 'location_subtype', 'location'))
+			})
+	return outcome_list
+
+# returns stops of month_string
+def generate_stops(month_string, streets):
+	stop_list = []
+	for i in range(stops):
+		street = random.choice(streets)
+		outcome = random.choice(['A no further action disposal', 'Arrest', 'Community resolution'])
+		stop_list.append({
+			'type': random.choice(['Person search', 'Person and Vehicle search', 'Vehicle search']),
+			'involved_person': True,
+			'datetime': month_string + '-%02dT%02d:%02d:00+00:00' % (random.randint(1, 28), random.randint(0, 23), random.randint(0, 59)),
+			'operation': False,
+			'operation_name': None,
+			'location': get_location(street),
+			'gender': random.choice(['Male', 'Female']),
+			'age_range': random.choice(['10-17', '18-24', '25-34', 'over 34']),
+			'self_defined_ethnicity': 'Other ethnic group - Not stated',
+			'officer_defined_ethnicity': random.choice(['White', 'Black', 'Asian', 'Other']),
+			'legislation': 'Misuse of Drugs Act 1971 (section 23)',
+			'object_of_search': 'Controlled drugs',
+			'outcome': outcome,
+			'outcome_object': {'id': outcome.lower().replace(' ', '-'), 'name': outcome},
+			'outcome_linked_to_object_of_search': random.choice([True, False, None]),
+			'removal_of_more_than_outer_clothing': False
+			})
+	return stop_list
+
+# writes data as JSON to file in output_dir
+def write_json(name, data):
+	path = os.path.join(output_dir, name)
+	if not os.path.isdir(os.path.dirname(path)):
+		os.makedirs(os.path.dirname(path))
+	with open(path, 'w') as f:
+		json.dump(data, f)
+
+
+### MAIN ###
+
+# manage commandline args
+try:
+	opts, args = getopt.getopt(sys.argv[1:], "o:", ["output=", "region=", "bounds=", "months=", "crimes=", "outcomes=", "stops=", "locations=", "neighbourhoods=", "seed=" ])
+except getopt.GetoptError as err:
+	print(err)
+	sys.exit(2)
+
+# get commandline options
+for o, a in opts:
+	if o in ("-o", "--output"):
+		output_dir = a
+	elif o in ("--region",):
+		region = a
+	elif o in ("--bounds",):
+		bounds = tuple(float(value) for value in a.split(','))
+	elif o in ("--months",):
+		months = int(a)
+	elif o in ("--crimes",):
+		crimes = int(a)
+	elif o in ("--outcomes",):
+		outcomes = float(a)
+	elif o in ("--stops",):
+		stops = int(a)
+	elif o in ("--locations",):
+		locations = int(a)
+	elif o in ("--neighbourhoods",):
+		neighbourhoods = int(a)
+	elif o in ("--seed",):
+		seed = int(a)
+
+# check for required parms
+if len(bounds) != 4 or bounds[0] >= bounds[2] or bounds[1] >= bounds[3]:
+	print('ERR: Specify bounds as min latitude, min longitude, max latitude, max longitude')
+	sys.exit(1)
+if months < 1 or crimes < 1 or locations < 1 or neighbourhoods < 1:
+	print('ERR: Specify at least one month, crime, location and neighbourhood')
+	sys.exit(1)
+
+random.seed(seed)
+
+# months end last month (the loader never loads the current month)
+last_month = datetime.today().replace(day=1) - relativedelta.relativedelta(months=1)
+month_strings = [datetime.strftime(last_month - relativedelta.relativedelta(months=months - 1 - i), '%Y-%m') for i in range(months)]
+
+streets = []
+for i in range(locations):
+	latitude, longitude = random_point(bounds)
+	streets.append({'id': 1000000 + i, 'name': 'On or near Bench Street ' + str(i + 1), 'latitude': latitude, 'longitude': longitude})
+
+write_json('meta.json', generate_meta(month_strings))
+crimes_by_month = []
+next_id = 1
+for month_string in month_strings:
+	crimes_by_month.append(generate_crimes(month_string, streets, next_id))
+	next_id = next_id + crimes
+	write_json(os.path.join('crimes', month_string + '.json'), crimes_by_month[-1])
+	write_json(os.path.join('outcomes', month_string + '.json'), generate_outcomes(month_string, crimes_by_month))
+	write_json(os.path.join('stops', month_string + '.json'), generate_stops(month_string, streets))
+
+print('INF: Generated ' + str(months) + ' months of police data in "' + output_dir + '"')
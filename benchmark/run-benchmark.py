@@ -0,0 +1,186 @@
+#! /usr/bin/python
+# Script to benchmark load-police-data.py end to end against a local fake police API (fake-police-api.py)
+# builds a scratch database from datamap.sql, adds the region, generates data (unless --data already holds some),
+# runs the loader (twice with --repeat, to time an unchanged reload) and reports records/sec and per-stage times from its --metrics summary
+# needs the mysql command line client, and a user allowed to create and drop the scratch database
+
+# load required libraries
+import getopt, sys, os, json, re, subprocess, shutil, tempfile
+from time import sleep, time
+
+# hard coded defaults
+user = 'datamap' 	# mysql user
+password = 'datamap' 	# mysql password
+host = 'localhost' 	# mysql host
+database = 'datamap_bench'	# scratch database; dropped and rebuilt every run
+data_dir = None		# generated police data (generated into a temporary directory if not given)
+port = 8642		# fake police API port
+generate_args = []	# passed on to generate-police-data.py (eg --months=24 --crimes=20000)
+api_args = []		# passed on to fake-police-api.py (eg --latency=0.2 --failure-rate=0.05)
+loader_args = []	# passed on to load-police-data.py (eg --workers=16 -o batch-commit)
+repeat = False		# run loader a second time over unchanged data
+keep = False		# leave scratch database in place afterwards
+
+benchmark_dir = os.path.dirname(os.path.abspath(__file__))
+repository_dir = os.path.dirname(benchmark_dir)
+
+# returns mysql command line for database (None for no database)
+def mysql_command(database_name):
+	command = ['mysql', '--user=' + user, '--password=' + password, '--host=' + host, '--batch', '--skip-column-names']
+	if database_name is not None:
+		command.append(database_name)
+	return command
+
+# runs sql through the mysql client against database_name (default the scratch database, as set by --database; use_database=False for none)
+# returns output, or exits on failure
+def run_sql(sql, database_name=None, use_database=True):
+	if use_database and database_name is None:
+		database_name = database
+	process = subprocess.Popen(mysql_command(database_name if use_database else None), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+	output, errors = process.communicate(sql)
+	if process.returncode != 0:
+		print('ERR: mysql failed : ' + errors.strip())
+		sys.exit(1)
+	return output
+
+# builds scratch database from datamap.sql and adds the generated region
+def build_database(meta):
+	run_sql('drop database if exists ' + database + '; create database ' + database + ' collate utf8_general_ci;', use_database=False)
+	with open(os.path.join(repository_dir, 'datamap.sql')) as f:
+		schema = re.sub('(?m)^use datamap;', 'use ' + database + ';', f.read())
+	schema = re.sub("call post_variable \('region', '[^']*'\);", "call post_variable ('region', '" + meta['region']['name'].replace("'", "''") + "');", schema)
+	run_sql(schema)
+	min_latitude, min_longitude, max_latitude, max_longitude = meta['region']['bounds']
+	polygon = ','.join(['%f %f' % point for point in ((min_longitude, min_latitude), (max_longitude, min_latitude), (max_longitude, max_latitude), (min_longitude, max_latitude), (min_longitude, min_latitude))])
+	run_sql("select post_place('borough', 'bench-region', '" + meta['region']['name'].replace("'", "''") + "', 'Benchmark region', null, null, null, null, null); " \
+		+ "update place set polygon = st_geometryfromtext('POLYGON((" + polygon + "))', get_constant('SRID')) where type = 'borough' and identifier = 'bench-region';")
+
+# runs loader once; returns (seconds, metrics summary)
+def run_loader(metrics_dir):
+	before = set(os.listdir(metrics_dir))
+	command = [sys.executable, os.path.join(repository_dir, 'load-police-data.py'), '--user=' + user, '--password=' + password, '--host=' + host, \
+		'--database=' + database, '--region=' + meta['region']['name'], '--api-url=http://127.0.0.1:' + str(port) + '/', '--metrics=' + metrics_dir] + loader_args
+	started = time()
+	returncode = subprocess.call(command)
+	seconds = time() - started
+	if returncode != 0:
+		print('ERR: load-police-data.py exited with ' + str(returncode))
+	summaries = sorted(set(os.listdir(metrics_dir)) - before)
+	if len(summaries) == 0:
+		print('ERR: load-police-data.py wrote no metrics summary')
+		return (seconds, None)
+	with open(os.path.join(metrics_dir, summaries[-1])) as f:
+		return (seconds, json.load(f))
+
+# prints records/sec and per-stage times of one loader run
+def report(title, seconds, summary):
+	print('')
+	print('== ' + title + ' ==')
+	print('wall time            %10.1f s' % seconds)
+	if summary is None:
+		return
+	totals = summary['totals']
+	print('status               %10s' % summary['run']['status'])
+	print('records              %10d' % totals['records'])
+	print('records/sec (wall)   %10.1f' % (totals['records'] / seconds if seconds > 0 else 0))
+	print('steps                %10d (%d skipped, %d failed)' % (totals['steps'], totals['skipped_steps'], totals['failed_steps']))
+	print('http requests        %10d (%d retries, %d bytes, %.1f s)' % (totals['http_requests'], totals['http_retries'], totals['http_bytes'], totals['http_seconds']))
+	print('db calls             %10d (%.1f s)' % (totals['db_calls'], totals['db_seconds']))
+	print('')
+	print('%-12s %8s %10s %10s %12s' % ('dataset', 'steps', 'records', 'seconds', 'records/sec'))
+	datasets = {}
+	for step in summary['steps']:
+		dataset = datasets.setdefault(step['dataset'], [0, 0, 0.0])
+		dataset[0] = dataset[0] + 1
+		dataset[1] = dataset[1] + step['records']
+		dataset[2] = dataset[2] + step['seconds']
+	for name, (steps, records, step_seconds) in sorted(datasets.items()):
+		print('%-12s %8d %10d %10.1f %12.1f' % (name, steps, records, step_seconds, records / step_seconds if step_seconds > 0 else 0))
+	print('')
+	print('%-36s %8s %10s %10s' % ('slowest database calls', 'calls', 'seconds', 'max'))
+	for name, entry in sorted(summary['db'].items(), key=lambda item: -item[1]['seconds'])[:10]:
+		print('%-36s %8d %10.1f %10.3f' % (name[:36], entry['calls'], entry['seconds'], entry['max_seconds']))
+	print('')
+	print('%-36s %8s %10s %10s' % ('police API endpoints', 'calls', 'seconds', 'max'))
+	for name, entry in sorted(summary['http'].items(), key=lambda item: -item[1]['seconds']):
+		print('%-36s %8d %10.1f %10.3f' % (name[:36], entry['calls'], entry['seconds'], entry['max_seconds']))
+
+
+### MAIN ###
+
+# manage commandline args
+try:
+	opts, args = getopt.getopt(sys.argv[1:], "u:p:h:d:", ["user=", "password=", "host=", "database=", "data=", "port=", "generate=", "api=", "loader=", "repeat", "keep" ])
+except getopt.GetoptError as err:
+	print(err)
+	sys.exit(2)
+
+# get commandline options
+for o, a in opts:
+	if o in ("-u", "--user"):
+		user = a
+	elif o in ("-p", "--password"):
+		password = a
+	elif o in ("-h", "--host"):
+		host = a
+	elif o in ("-d", "--database"):
+		database = a
+	elif o in ("--data",):
+		data_dir = a
+	elif o in ("--port",):
+		port = int(a)
+	elif o in ("--generate",):
+		generate_args = a.split()
+	elif o in ("--api",):
+		api_args = a.split()
+	elif o in ("--loader",):
+		loader_args = a.split()
+	elif o in ("--repeat",):
+		repeat = True
+	elif o in ("--keep",):
+		keep = True
+
+# never point the benchmark at a real database
+if database == 'datamap':
+	print('ERR: Specify a scratch database; "datamap" would be dropped')
+	sys.exit(1)
+
+work_dir = tempfile.mkdtemp(prefix='datamap-bench-')
+metrics_dir = os.path.join(work_dir, 'metrics')
+os.makedirs(metrics_dir)
+
+# generate police data (unless already generated)
+if data_dir is None:
+	data_dir = os.path.join(work_dir, 'data')
+if not os.path.isfile(os.path.join(data_dir, 'meta.json')):
+	started = time()
+	if subprocess.call([sys.executable, os.path.join(benchmark_dir, 'generate-police-data.py'), '--output=' + data_dir] + generate_args) != 0:
+		print('ERR: Unable to generate police data')
+		sys.exit(1)
+	print('INF: Generated police data in %.1f s' % (time() - started))
+with open(os.path.join(data_dir, 'meta.json')) as f:
+	meta = json.load(f)
+
+started = time()
+build_database(meta)
+print('INF: Built scratch database "' + database + '" in %.1f s' % (time() - started))
+
+api = subprocess.Popen([sys.executable, os.path.join(benchmark_dir, 'fake-police-api.py'), '--data=' + data_dir, '--port=' + str(port)] + api_args)
+try:
+	sleep(2) # let fake police API load its data
+	if api.poll() is not None:
+		print('ERR: fake-police-api.py exited with ' + str(api.returncode))
+		sys.exit(1)
+	seconds, summary = run_loader(metrics_dir)
+	report('initial load', seconds, summary)
+	if repeat:
+		# unchanged reload; crime-last-updated (shared and per region) is cleared so the loader doesnt stop at "already up to date"
+		run_sql("call delete_variable('crime-last-updated'); call delete_variable('crime-last-updated:" + meta['region']['name'].replace("'", "''") + "');")
+		seconds, summary = run_loader(metrics_dir)
+		report('unchanged reload', seconds, summary)
+finally:
+	api.terminate()
+	api.wait()
+	if not keep:
+		run_sql('drop database if exists ' + database + ';', use_database=False)
+	shutil.rmtree(work_dir)
@@ -259,8 +259,21 @@ set @function_count = ifnull(@function_count,0) + 1;
 //
 
 
+-- which table each category, person, organisation, event and place id belongs to
+-- maintained by the *_after_insert and *_delete triggers of those tables, so exists_uuid is a single primary key lookup
+-- xdrop table if exists uuid_registry;
+-- //
+create table if not exists uuid_registry
+(
+	id			binary(16)	not null,
+	table_name		varchar(64)	character set utf8 not null,
+	primary key (id)
+);
+//
+set @table_count = ifnull(@table_count,0) + 1;
+//
+
 -- returns name of table where uuid can be found
--- (prob slow and worth avoiding if possible)
 drop function if exists exists_uuid;
 //
 create function exists_uuid
@@ -269,67 +282,69 @@ create function exists_uuid
 )
 returns varchar(64)
 begin
-	declare l_exists	boolean default false;
+	declare l_table		varchar(64) default null;
 
 	-- call log('DEBUG : START exists_uuid');
 
-	select 	if(count(*) > 0, true, false)
-	into 	l_exists
-	from 	category
-	where 	id = unhex(p_uuid);
-
-	if l_exists
-	then
-		return 'category';
-	end if;
-
-	select 	if(count(*) > 0, true, false)
-	into 	l_exists
-	from 	person
+	select 	table_name
+	into 	l_table
+	from 	uuid_registry
 	where 	id = unhex(p_uuid);
 
-	if l_exists
-	then
-		return 'person';
-	end if;
-
-	select 	if(count(*) > 0, true, false)
-	into 	l_exists
-	from 	organisation
-	where 	id = unhex(p_uuid);
+	-- call log('DEBUG : END exists_uuid');
 
-	if l_exists
-	then
-		return 'organisation';
-	end if;
+	-- null if it can't be found
+	return l_table;
+end;
+//
+set @function_count = ifnull(@function_count,0) + 1;
+//
 
-	select 	if(count(*) > 0, true, false)
-	into 	l_exists
-	from 	event
-	where 	id = unhex(p_uuid);
+-- (re)registers an id in uuid_registry (called from the *_after_insert triggers)
+drop procedure if exists put_uuid_registry;
+//
+create procedure put_uuid_registry
+(
+	p_id		binary(16),
+	p_table		varchar(64)
+)
+begin
+	insert into uuid_registry
+		(id, table_name)
+	values
+		(p_id, p_table)
+	on duplicate key update
+		table_name = p_table;
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
 
-	if l_exists
+-- rebuilds uuid_registry from the entity tables (optionally only if it is empty, eg after upgrade)
+drop procedure if exists rebuild_uuid_registry;
+//
+create procedure rebuild_uuid_registry
+(
+	p_only_if_empty		boolean
+)
+procedure_block : begin
+	if p_only_if_empty and exists (select 1 from uuid_registry)
 	then
-		return 'event';
+		leave procedure_block;
 	end if;
 
-	select 	if(count(*) > 0, true, false)
-	into 	l_exists
-	from 	place
-	where 	id = unhex(p_uuid);
-
-	if l_exists
-	then
-		return 'place';
-	end if;
+	call log('INFORMATION : rebuilding uuid_registry');
 
-	-- call log('DEBUG : END exists_uuid');
+	delete from uuid_registry;
 
-	-- can't find it
-	return null;
+	insert ignore into uuid_registry (id, table_name) select id, 'category' from category;
+	insert ignore into uuid_registry (id, table_name) select id, 'person' from person;
+	insert ignore into uuid_registry (id, table_name) select id, 'organisation' from organisation;
+	insert ignore into uuid_registry (id, table_name) select id, 'event' from event;
+	insert ignore into uuid_registry (id, table_name) select id, 'place' from place;
 end;
 //
-set @function_count = ifnull(@function_count,0) + 1;
+set @procedure_count = ifnull(@procedure_count,0) + 1;
 //
 
 -- returns true if table exists
@@ -939,6 +954,135 @@ end;
 set @function_count = ifnull(@function_count,0) + 1;
 //
 
+-- dynamic columns (extension fields) in use for each table and type, maintained as fields are added
+-- lets create_views build the <table>_<type> views without scanning every extension blob
+-- xdrop table if exists extension_key;
+-- //
+create table if not exists extension_key
+(
+	table_name		varchar(64)	character set utf8 not null,
+	type			varchar(50)	character set utf8 not null,	-- <table>.type ('unknown' if null, as create_views)
+	field			varchar(64)	character set utf8 not null,	-- dynamic column name
+	timestamp_created	timestamp	default current_timestamp,
+	primary key (table_name, type, field)
+);
+//
+set @table_count = ifnull(@table_count,0) + 1;
+//
+
+-- column list each <table>_<type> view was last created with, so create_views only recreates views whose columns have changed
+-- xdrop table if exists extension_view;
+-- //
+create table if not exists extension_view
+(
+	table_name		varchar(64)	character set utf8 not null,
+	type			varchar(50)	character set utf8 not null,
+	view_name		varchar(64)	character set utf8 not null,
+	columns_digest		char(32)	character set utf8 not null,	-- md5 of view column list
+	timestamp_updated	timestamp	default current_timestamp on update current_timestamp,
+	primary key (table_name, type)
+);
+//
+set @table_count = ifnull(@table_count,0) + 1;
+//
+
+-- registers dynamic columns (comma separated list, as returned by column_list) of a table and type in extension_key
+drop procedure if exists post_extension_keys;
+//
+create procedure post_extension_keys
+(
+	p_table		varchar(64),
+	p_type		varchar(50),
+	p_fields	text
+)
+begin
+	declare l_field		varchar(64);
+	declare l_count		tinyint;
+	declare l_index		tinyint default 1;
+
+	set p_type = ifnull(nullif(trim(p_type), 'null'), 'unknown');
+	set p_fields = replace(p_fields, '`', '');
+
+	if p_table is not null and p_fields is not null and length(p_fields) > 0
+	then
+		set l_count = get_element_count(p_fields, ',');
+
+		while l_index <= l_count do
+			set l_field = trim(get_element(p_fields, l_index, ','));
+
+			if l_field is not null and length(l_field) > 0
+			then
+				insert ignore into extension_key
+					(table_name, type, field)
+				values
+					(p_table, p_type, l_field);
+			end if;
+
+			set l_index = l_index + 1;
+		end while;
+	end if;
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
+
+-- rebuilds extension_key by scanning every extension blob (optionally only if it is empty, eg after upgrade)
+drop procedure if exists rebuild_extension_keys;
+//
+create procedure rebuild_extension_keys
+(
+	p_only_if_empty		boolean
+)
+procedure_block : begin
+	declare l_tables 		varchar(100) default 'place,person,event,organisation';
+	declare l_table_name 		varchar(64);
+	declare l_table_count 		tinyint default 1;
+	declare l_table_length 		tinyint default 0;
+	declare l_type			varchar(50);
+	declare l_type_count 		tinyint default 1;
+	declare l_type_length 		tinyint default 0;
+
+	if p_only_if_empty and exists (select 1 from extension_key)
+	then
+		leave procedure_block;
+	end if;
+
+	call log('INFORMATION : rebuilding extension_key');
+
+	delete from extension_key;
+
+	set l_table_length = get_element_count( l_tables, ',');
+
+	while l_table_count <= l_table_length do
+		set l_table_name = get_element(l_tables, l_table_count, ',');
+		set @g_types = null;
+
+		set @g_sql = concat('select group_concat( distinct ifnull(type, "unknown") order by type) into @g_types from ', l_table_name, ';' );
+		prepare types from @g_sql;
+		execute types;
+
+		set l_type_length = get_element_count( @g_types, ',');
+		set l_type_count = 1;
+		while l_type_count <= l_type_length do
+			set l_type = get_element(@g_types, l_type_count, ',');
+			set @g_dynamic_columns = null;
+
+			set @g_sql = concat('select group_concat( distinct column_list(extension) ) into @g_dynamic_columns from ', l_table_name, ' where ifnull(type, "unknown") = "', l_type, '";');
+			prepare dynamic_columns from @g_sql;
+			execute dynamic_columns;
+
+			call post_extension_keys(l_table_name, l_type, sort_array(@g_dynamic_columns, 'u', ','));
+
+			set l_type_count = l_type_count + 1;
+		end while;
+
+		set l_table_count = l_table_count + 1;
+	end while;
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
+
 -- add new dynamic column
 -- doesn't add null or zero-length values
 drop function if exists post_extension;
@@ -1068,6 +1212,7 @@ begin
 
 	if exists_extension(p_id, p_field)
 	then
+		call post_extension_keys(l_table, substring(get_type(p_id), length(l_table) + 2), p_field);
 		return true;
 	end if;
 	call log(concat('ERROR: function put_extension failed: p_id="', ifnull(p_id, 'NULL'), '", p_field="', ifnull(p_field, 'NULL'), '", p_value="', ifnull(p_value, 'NULL'), '".'));
@@ -1077,6 +1222,119 @@ end;
 set @function_count = ifnull(@function_count,0) + 1;
 //
 
+-- add many dynamic columns at once; p_fields is a json object of field : value, eg '{"url":"http://..","telephone":"101"}'
+-- reads and writes the extension blob once, rather than once per field as repeated post_extension calls would
+-- as post_extension, doesn't add null or zero-length values, or replace fields that already exist
+drop function if exists post_extensions;
+//
+create function post_extensions
+(
+	p_id		char(32),	-- id of person, place, event, organisation
+	p_fields	text		-- json object of field : value
+)
+returns boolean
+begin
+	declare l_extension 		blob;
+	declare l_original_extension	blob;
+	declare l_table			varchar(64);
+	declare l_keys			text;
+	declare l_key			text;
+	declare l_field			varchar(64);
+	declare l_json_value		text;
+	declare l_value			text;
+	declare l_count			int default 0;
+	declare l_index			int default 0;
+
+	-- call log('DEBUG : START post_extensions');
+
+	set l_table = exists_uuid(p_id);
+
+	if 	l_table is null
+		or p_fields is null
+		or not json_valid(p_fields)
+		or json_type(p_fields) != 'OBJECT'
+		or not exists_field(concat(l_table, '.extension'))
+	then
+		call log(concat('ERROR: function post_extensions requires non-null id and json object of fields: p_id="', ifnull(p_id, 'NULL'), '", p_fields="', ifnull(p_fields, 'NULL'), '".'));
+		return false;
+	end if;
+
+	case l_table
+	when 'person' then
+		select extension into l_extension from person where id = unhex(p_id);
+	when 'event' then
+		select extension into l_extension from event where id = unhex(p_id);
+	when 'place' then
+		select extension into l_extension from place where id = unhex(p_id);
+	when 'organisation' then
+		select extension into l_extension from organisation where id = unhex(p_id);
+	else
+		begin
+		end;
+	end case;
+
+	if l_extension is not null and not column_check(l_extension)
+	then
+		call log(concat('ERROR: function post_extensions found invalid extension: p_id="', p_id, '".'));
+		return false;
+	end if;
+
+	set l_original_extension = l_extension;
+	set l_keys = json_keys(p_fields);
+	set l_count = ifnull(json_length(l_keys), 0);
+
+	while l_index < l_count do
+		set l_key = json_unquote(json_extract(l_keys, concat('$[', l_index, ']')));
+		-- quote the key as a json path member, escaping \ and " (engagement method titles are free text)
+		set l_json_value = json_extract(p_fields, concat('$."', replace(replace(l_key, '\\', '\\\\'), '"', '\\"'), '"'));
+		set l_field = trim(l_key);
+		set l_value = if(json_type(l_json_value) = 'NULL', null, trim(json_unquote(l_json_value)));
+
+		if 	l_field is not null and length(l_field) > 0
+			and l_value is not null and length(l_value) > 0
+		then
+			if l_extension is null
+			then
+				set l_extension = column_create(l_field, l_value);
+			elseif not column_exists(l_extension, l_field)
+			then
+				set l_extension = column_add(l_extension, l_field, l_value);
+			end if;
+		end if;
+
+		set l_index = l_index + 1;
+	end while;
+
+	-- nothing new to add
+	if l_extension <=> l_original_extension
+	then
+		return true;
+	end if;
+
+	case l_table
+	when 'person' then
+		update person set extension = l_extension where id = unhex(p_id);
+	when 'event' then
+		update event set extension = l_extension where id = unhex(p_id);
+	when 'place' then
+		update place set extension = l_extension where id = unhex(p_id);
+	when 'organisation' then
+		update organisation set extension = l_extension where id = unhex(p_id);
+	else
+		begin
+		end;
+	end case;
+
+	call post_extension_keys(l_table, substring(get_type(p_id), length(l_table) + 2), column_list(l_extension));
+
+	-- call log('DEBUG : END post_extensions');
+
+	return true;
+end;
+//
+set @function_count = ifnull(@function_count,0) + 1;
+//
+
 -- updated existing dynamic column
 drop function if exists put_extension;
 //
@@ -1173,6 +1431,7 @@ begin
 	if exists_extension(p_id, p_field)
 	then
 		call log(concat('WARNING: function put_extension updated ', l_table, ' record:"', p_id, '" field:"', ifnull(p_field, 'NULL'), '" to value:"', ifnull(p_value, 'NULL'), '".' ));
+		call post_extension_keys(l_table, substring(get_type(p_id), length(l_table) + 2), p_field);
 		return true;
 	end if;
 	call log(concat('ERROR: function put_extension failed: p_id="', ifnull(p_id, 'NULL'), '", p_field="', ifnull(p_field, 'NULL'), '", p_value="', ifnull(p_value, 'NULL'), '".'));
@@ -1329,12 +1588,17 @@ create table if not exists relation
 	index (type),
 	index (major),
 	index (minor),
+	index relation_major_minor (major, minor),
 	index (valid_from),
 	index (valid_to)
 );
 //
 set @table_count = ifnull(@table_count,0) + 1;
 //
+
+-- commutative duplicate checks look up (major, minor); add index to relation tables created before it was
+create index if not exists relation_major_minor on relation (major, minor);
+//
 	
 -- triggers to avoid commutative dupes, relations with self, and to force expected uuid ordering
 -- by this point 'major' and 'minor' have been unhexed into binary, so user-def operations need to hex them (into char)
@@ -1364,10 +1628,9 @@ begin
 			set MESSAGE_TEXT = l_err_msg1;
 	end if;
 
-	select 	if(count(*) > 0, true, false)
-	into 	l_exists
-	from 	relation
-	where 	(major = hex(new.minor) and minor = hex(new.major)) or new.minor = new.major;
+	-- relation with self, or combination already exists the other way round (binary comparison, so served by the major/minor index)
+	set l_exists = new.minor = new.major
+		or exists (select 1 from relation where major = new.minor and minor = new.major);
 
 	-- if combination already exists, return error
 	if l_exists 
@@ -1427,10 +1690,8 @@ begin
 	declare l_minor_order	tinyint;
 	declare l_temp		binary(16);
 
-	select 	if(count(*) > 0, true, false)
-	into 	l_exists
-	from 	relation
-	where 	(major = new.minor and minor = new.major) or new.minor = new.major;
+	set l_exists = new.minor = new.major
+		or exists (select 1 from relation where major = new.minor and minor = new.major);
 
 	-- if combination already exists, return error
 	if l_exists 
@@ -1579,6 +1840,122 @@ end;
 set @function_count = ifnull(@function_count,0) + 1;
 //
 
+-- bulk relation insert; callers fill relation_stage (type, major, minor) for their session, then call post_relations()
+-- staging table only ever holds in-flight rows, so is safe to drop and recreate
+drop table if exists relation_stage;
+//
+create table relation_stage
+(
+	stage_id		int		not null auto_increment,
+	session_id		int		not null,			-- connection_id() of calling session
+	type			varchar(100)	character set utf8,		-- null for default ('<major type>|<minor type>')
+	major			binary(16),
+	minor			binary(16),
+	major_table		varchar(64)	character set utf8,
+	minor_table		varchar(64)	character set utf8,
+	ordered_major		binary(16),					-- major and minor in protocol order
+	ordered_minor		binary(16),
+	primary key (stage_id),
+	index (session_id, ordered_major, ordered_minor)
+);
+//
+set @table_count = ifnull(@table_count,0) + 1;
+//
+
+-- inserts this session's relation_stage rows into relation with the same rules as post_relation, in a handful of statements
+-- rows referring to missing records or relating a record to itself are rejected; rows duplicating (either way round) an
+-- existing relation or an earlier staged row are skipped
+-- returns a single row (inserted, duplicates, rejected)
+drop procedure if exists post_relations;
+//
+create procedure post_relations()
+begin
+	declare l_session_id		int default connection_id();
+	declare l_inserted		int default 0;
+	declare l_duplicates		int default 0;
+	declare l_rejected		int default 0;
+
+	-- call log('DEBUG : START post_relations');
+
+	update 	relation_stage stage
+		left outer join uuid_registry major_registry	on major_registry.id = stage.major
+		left outer join uuid_registry minor_registry	on minor_registry.id = stage.minor
+	set 	stage.major_table	= major_registry.table_name,
+		stage.minor_table	= minor_registry.table_name,
+		stage.type		= regexp_replace(trim(lower(stage.type)),' +' ,'-' )
+	where 	stage.session_id = l_session_id;
+
+	delete
+	from 	relation_stage
+	where 	session_id = l_session_id
+		and (major_table is null or minor_table is null or major = minor);
+	set l_rejected = row_count();
+
+	if l_rejected > 0
+	then
+		call log(concat('ERROR: procedure post_relations rejected ', l_rejected, ' relations to non-existent records or to self.'));
+	end if;
+
+	-- force uuid ordering (person, organisation, event, place, category) as relation_insert does
+	update 	relation_stage
+	set 	ordered_major = if(field(major_table, 'person', 'organisation', 'event', 'place', 'category') > field(minor_table, 'person', 'organisation', 'event', 'place', 'category'), minor, major),
+		ordered_minor = if(field(major_table, 'person', 'organisation', 'event', 'place', 'category') > field(minor_table, 'person', 'organisation', 'event', 'place', 'category'), major, minor)
+	where 	session_id = l_session_id;
+
+	update 	relation_stage
+	set 	type = concat(get_type(hex(ordered_major)), '|', get_type(hex(ordered_minor)))
+	where 	session_id = l_session_id
+		and (type is null or length(type) = 0);
+
+	-- skip duplicates within the batch
+	delete 	newer
+	from 	relation_stage newer
+		join relation_stage older 	on older.session_id = newer.session_id
+						and older.stage_id < newer.stage_id
+						and ((older.ordered_major = newer.ordered_major and older.ordered_minor = newer.ordered_minor and older.type = newer.type)
+							or (older.ordered_major = newer.ordered_minor and older.ordered_minor = newer.ordered_major))
+	where 	newer.session_id = l_session_id;
+	set l_duplicates = row_count();
+
+	-- skip relations that already exist, or exist the other way round
+	delete 	stage
+	from 	relation_stage stage
+		join relation 			on relation.major = stage.ordered_major
+						and relation.minor = stage.ordered_minor
+						and relation.type = stage.type
+	where 	stage.session_id = l_session_id;
+	set l_duplicates = l_duplicates + row_count();
+
+	delete 	stage
+	from 	relation_stage stage
+		join relation 			on relation.major = stage.ordered_minor
+						and relation.minor = stage.ordered_major
+	where 	stage.session_id = l_session_id;
+	set l_duplicates = l_duplicates + row_count();
+
+	if l_duplicates > 0
+	then
+		call log(concat('WARNING: procedure post_relations skipped ', l_duplicates, ' duplicate relations.'));
+	end if;
+
+	insert into relation
+		(type, major, minor)
+	select 	type, ordered_major, ordered_minor
+	from 	relation_stage
+	where 	session_id = l_session_id
+	order by stage_id;
+	set l_inserted = row_count();
+
+	delete from relation_stage where session_id = l_session_id;
+
+	select l_inserted as inserted, l_duplicates as duplicates, l_rejected as rejected;
+
+	-- call log('DEBUG : END post_relations');
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
+
 -- delete relationship (NOT both ways; ie, only if ordering of major & minor is right)
 -- rtns true if nothing to delete 
 -- NOTE: you call delete *all* p_major relationships id p_minor is NULL
@@ -2020,6 +2397,19 @@ create trigger category_delete
 begin
 	delete from relation
 	where major = old.id or minor = old.id;
+	delete from uuid_registry	where id = old.id;
+end;
+//
+set @trigger_count = ifnull(@trigger_count,0) + 1;
+//
+
+drop trigger if exists category_after_insert;
+//
+create trigger category_after_insert 
+	after insert on category
+	for each row
+begin
+	call put_uuid_registry(new.id, 'category');
 end;
 //
 set @trigger_count = ifnull(@trigger_count,0) + 1;
@@ -2457,6 +2847,19 @@ create trigger person_delete
 begin
 	delete from relation	where major = old.id or minor = old.id;
 	delete from attribute	where record_id = old.id;
+	delete from uuid_registry	where id = old.id;
+end;
+//
+set @trigger_count = ifnull(@trigger_count,0) + 1;
+//
+
+drop trigger if exists person_after_insert;
+//
+create trigger person_after_insert 
+	after insert on person
+	for each row
+begin
+	call put_uuid_registry(new.id, 'person');
 end;
 //
 set @trigger_count = ifnull(@trigger_count,0) + 1;
@@ -2912,16 +3315,29 @@ create trigger organisation_delete
 begin
 	delete from relation	where major = old.id or minor = old.id;
 	delete from attribute	where record_id = old.id;
+	delete from uuid_registry	where id = old.id;
 end;
 //
 set @trigger_count = ifnull(@trigger_count,0) + 1;
 //
 
--- returns t/f if organisation record exists where p_field=p_value
-drop function if exists exists_organisation;
+drop trigger if exists organisation_after_insert;
 //
-create function exists_organisation
-(
+create trigger organisation_after_insert 
+	after insert on organisation
+	for each row
+begin
+	call put_uuid_registry(new.id, 'organisation');
+end;
+//
+set @trigger_count = ifnull(@trigger_count,0) + 1;
+//
+
+-- returns t/f if organisation record exists where p_field=p_value
+drop function if exists exists_organisation;
+//
+create function exists_organisation
+(
 	p_field		varchar(128),
 	p_value		text
 )
@@ -3291,16 +3707,24 @@ create table if not exists event
 	description		text		character set utf8, 
 	date_event		datetime	not null,			-- datetime of event
 	date_resolution		varchar(50)	character set utf8, 		-- date format string to resolve date; ie police API data only resolves to a month, so '%Y-%m'
+	event_month		date		as (makedate(year(date_event), 1) + interval (month(date_event) - 1) month) persistent, -- first day of month of event; indexed month key (date_format(date_event, date_resolution) cant use an index)
 	extension		blob,						-- dynamic column containing variable field details
 	timestamp_created	timestamp	default current_timestamp,
 	timestamp_updated	timestamp	null default null on update current_timestamp,
-	primary key (id),
+	primary key (id, date_event),					-- partitioning column has to be part of every unique key
 	index (type),
 	index (identifier),
 	index (name),
 	index (date_event),
 	index (date_resolution),
-	index (timestamp_created)
+	index (timestamp_created),
+	index (type, event_month)
+)
+-- one partition per year (added by put_event_partitions); queries on a date_event range only read the years they cover,
+-- and old years can be dropped whole by delete_event_partitions
+partition by range (year(date_event))
+(
+	partition p_max values less than (maxvalue)
 );
 //
 set @table_count = ifnull(@table_count,0) + 1;
@@ -3364,11 +3788,208 @@ create trigger event_delete
 begin
 	delete from relation	where major = old.id or minor = old.id;
 	delete from attribute	where record_id = old.id;
+	delete from uuid_registry	where id = old.id;
+end;
+//
+set @trigger_count = ifnull(@trigger_count,0) + 1;
+//
+
+drop trigger if exists event_after_insert;
+//
+create trigger event_after_insert 
+	after insert on event
+	for each row
+begin
+	call put_uuid_registry(new.id, 'event');
 end;
 //
 set @trigger_count = ifnull(@trigger_count,0) + 1;
 //
 
+-- adds a yearly event partition for every year from the last one there (or, the first time, the year of the earliest event
+-- or 'event-partition-start', whichever is earlier) to p_years_ahead years from now, by splitting them off p_max
+-- cheap while p_max only holds future dates, but alter table commits implicitly, so load-police-data.py only calls it
+-- at startup, before anything is written, when exists_event_partitions says a year is missing
+drop procedure if exists put_event_partitions;
+//
+create procedure put_event_partitions
+(
+	p_years_ahead	int
+)
+procedure_block : begin
+	declare l_year		int;
+	declare l_last_year	int default year(now()) + greatest(ifnull(p_years_ahead, 0), 0);
+	declare l_partitions	text default '';
+
+	if not exists (select 1 from information_schema.partitions where table_schema = schema() and table_name = 'event' and partition_name = 'p_max')
+	then
+		call log('ERROR : put_event_partitions needs event to be partitioned first; call partition_event()');
+		leave procedure_block;
+	end if;
+
+	select 	max(cast(substr(partition_name, 2) as unsigned)) + 1
+	into 	l_year
+	from 	information_schema.partitions
+	where 	table_schema = schema()
+		and table_name = 'event'
+		and partition_name regexp '^p[0-9]{4}$';
+
+	if l_year is null
+	then
+		select 	least(ifnull(year(min(date_event)), year(now())), ifnull(cast(get_variable('event-partition-start') as unsigned), year(now())))
+		into 	l_year
+		from 	event;
+	end if;
+
+	if l_year > l_last_year
+	then
+		leave procedure_block;
+	end if;
+
+	while l_year <= l_last_year do
+		set l_partitions = concat(l_partitions, 'partition p', l_year, ' values less than (', l_year + 1, '), ');
+		set l_year = l_year + 1;
+	end while;
+
+	set @event_partition_sql = concat('alter table event reorganize partition p_max into (', l_partitions, 'partition p_max values less than (maxvalue))');
+	prepare event_partition_statement from @event_partition_sql;
+	execute event_partition_statement;
+	deallocate prepare event_partition_statement;
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
+
+-- returns t/f if event has its own partition for every year up to p_years_ahead years from now (see put_event_partitions)
+-- also true if event isnt partitioned, as there is nothing put_event_partitions can do
+drop function if exists exists_event_partitions;
+//
+create function exists_event_partitions
+(
+	p_years_ahead	int
+)
+returns boolean
+begin
+	if not exists (select 1 from information_schema.partitions where table_schema = schema() and table_name = 'event' and partition_name = 'p_max')
+	then
+		return true;
+	end if;
+
+	return exists (
+		select 	1
+		from 	information_schema.partitions
+		where 	table_schema = schema()
+			and table_name = 'event'
+			and partition_name = concat('p', year(now()) + greatest(ifnull(p_years_ahead, 0), 0)));
+end;
+//
+set @function_count = ifnull(@function_count,0) + 1;
+//
+
+-- brings an event table created before event_month and partitioning up to date (does nothing if it already is), then adds partitions
+drop procedure if exists partition_event;
+//
+create procedure partition_event()
+begin
+	if not exists (select 1 from information_schema.columns where table_schema = schema() and table_name = 'event' and column_name = 'event_month')
+	then
+		call log('INFORMATION : adding event.event_month');
+
+		alter table event
+			add column event_month date as (makedate(year(date_event), 1) + interval (month(date_event) - 1) month) persistent after date_resolution,
+			add index (type, event_month);
+	end if;
+
+	if not exists (select 1 from information_schema.partitions where table_schema = schema() and table_name = 'event' and partition_name is not null)
+	then
+		call log('INFORMATION : partitioning event by year');
+
+		alter table event
+			drop primary key,
+			add primary key (id, date_event);
+
+		alter table event
+			partition by range (year(date_event))
+			(
+				partition p_max values less than (maxvalue)
+			);
+	end if;
+
+	call put_event_partitions(1);
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
+
+-- removes every event dated before the year p_before_year by dropping their yearly partitions (rather than row by row deletes)
+-- dropping a partition doesnt fire event_delete, so the relations, attributes and uuid_registry entries it would have removed go first
+drop procedure if exists delete_event_partitions;
+//
+create procedure delete_event_partitions
+(
+	p_before_year	int
+)
+procedure_block : begin
+	declare l_partitions	text default null;
+
+	select 	group_concat(partition_name order by partition_name)
+	into 	l_partitions
+	from 	information_schema.partitions
+	where 	table_schema = schema()
+		and table_name = 'event'
+		and partition_name regexp '^p[0-9]{4}$'
+		and cast(substr(partition_name, 2) as unsigned) < p_before_year;
+
+	if l_partitions is null
+	then
+		leave procedure_block;
+	end if;
+
+	call log(concat('INFORMATION : dropping event partitions ', l_partitions));
+
+	-- so the stats and exports of the dropped months are cleared
+	insert into police_month_change
+		(type, month)
+	select 	distinct type, event_month
+	from 	event
+	where 	type in ('police-crime', 'police-crime-outcome', 'police-stop')
+		and date_event < makedate(p_before_year, 1)
+	on duplicate key update
+		timestamp_updated = current_timestamp;
+
+	delete 	relation
+	from 	relation
+		join event on event.id = relation.major
+	where 	event.date_event < makedate(p_before_year, 1);
+
+	delete 	relation
+	from 	relation
+		join event on event.id = relation.minor
+	where 	event.date_event < makedate(p_before_year, 1);
+
+	delete 	attribute
+	from 	attribute
+		join event on event.id = attribute.record_id
+	where 	event.date_event < makedate(p_before_year, 1);
+
+	delete 	uuid_registry
+	from 	uuid_registry
+		join event on event.id = uuid_registry.id
+	where 	event.date_event < makedate(p_before_year, 1);
+
+	-- the loader only writes the changed part of a payload, so it mustnt think the records of dropped months are still there
+	delete from	police_load_digest
+	where		month < concat(p_before_year, '-01');
+
+	set @event_partition_sql = concat('alter table event drop partition ', l_partitions);
+	prepare event_partition_statement from @event_partition_sql;
+	execute event_partition_statement;
+	deallocate prepare event_partition_statement;
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
+
 -- returns t/f if event record exists where p_field=p_value
 drop function if exists exists_event;
 //
@@ -3847,7 +4468,197 @@ create table if not exists place
 set @table_count = ifnull(@table_count,0) + 1;
 //
 
+-- postcode and road lookup tables for get_postcode and get_road (maintained by the place triggers)
+-- saves scanning every postcode/road in place with a regexp each time an address is geocoded
+-- xdrop table if exists postcode_lookup;
+-- //
+create table if not exists postcode_lookup
+(
+	postcode_key		varchar(20)	character set utf8 not null,	-- upper case postcode without spaces, eg 'RG12AB'
+	place_id		binary(16)	not null,
+	timestamp_place		timestamp	null default null,		-- ifnull(place.timestamp_updated, place.timestamp_created)
+	primary key (place_id),
+	index (postcode_key)
+);
+//
+set @table_count = ifnull(@table_count,0) + 1;
+//
+
+-- xdrop table if exists road_lookup;
+-- //
+create table if not exists road_lookup
+(
+	first_token		varchar(100)	character set utf8 not null,	-- first word of road_key
+	road_key		varchar(500)	character set utf8 not null,	-- road name as returned by normalise_address, eg 'KINGS ROAD'
+	place_id		binary(16)	not null,
+	timestamp_place		timestamp	null default null,
+	primary key (place_id),
+	index (first_token)
+);
+//
+set @table_count = ifnull(@table_count,0) + 1;
+//
+
+-- returns the canonical form of a road type abbreviation ('RD' -> 'ROAD', 'GDNS' -> 'GARDENS' etc), or the token unchanged
+drop function if exists normalise_road_token;
+//
+create function normalise_road_token
+(
+	p_token		varchar(100)
+)
+returns varchar(100)
+no sql
+begin
+	return case
+		when p_token regexp '^R(OA)?D$'		then 'ROAD'
+		when p_token regexp '^ST(REET)?$'	then 'STREET'
+		when p_token regexp '^LA?NE?$'		then 'LANE'
+		when p_token regexp '^CLO?SE?$'		then 'CLOSE'
+		when p_token regexp '^AVE(NUE)?$'	then 'AVENUE'
+		when p_token regexp '^WA?Y$'		then 'WAY'
+		when p_token regexp '^G(AR)?DE?NS?$'	then 'GARDENS'
+		when p_token regexp '^C(OU)?R?T$'	then 'COURT'
+		when p_token regexp '^DR?I?VE?$'	then 'DRIVE'
+		when p_token regexp '^PLA?C?E?$'	then 'PLACE'
+		when p_token regexp '^SQ(UARE)?$'	then 'SQUARE'
+		when p_token regexp '^TERR(ACE)?$'	then 'TERRACE'
+		when p_token regexp '^CRESC?(ENT)?$'	then 'CRESCENT'
+		when p_token regexp '^GRO?VE?$'		then 'GROVE'
+		else p_token
+	end;
+end;
+//
+set @function_count = ifnull(@function_count,0) + 1;
+//
+
+-- upper cases address, single spaces words (commas count as spaces) and canonicalises road type abbreviations
+-- '12 kings rd, reading' -> '12 KINGS ROAD READING'
+drop function if exists normalise_address;
+//
+create function normalise_address
+(
+	p_address		varchar(500)
+)
+returns varchar(500)
+no sql
+begin
+	declare l_normalised	varchar(500) default '';
+	declare l_count		tinyint;
+	declare l_index		tinyint default 1;
+
+	set p_address = trim(regexp_replace(upper(trim(p_address)), '[ ,]+', ' '));
+
+	if p_address is null or length(p_address) = 0
+	then
+		return null;
+	end if;
+
+	set l_count = get_element_count(p_address, ' ');
+
+	while l_index <= l_count do
+		set l_normalised = concat(l_normalised, ' ', normalise_road_token(get_element(p_address, l_index, ' ')));
+		set l_index = l_index + 1;
+	end while;
+
+	return trim(l_normalised);
+end;
+//
+set @function_count = ifnull(@function_count,0) + 1;
+//
+
+-- refreshes postcode_lookup and road_lookup entries for a place (called from the place triggers)
+drop procedure if exists put_place_lookup;
+//
+create procedure put_place_lookup
+(
+	p_place_id		char(32),
+	p_type			varchar(50),
+	p_name			varchar(500),
+	p_postcode		varchar(50),
+	p_timestamp		timestamp
+)
+begin
+	declare l_road_key	varchar(500);
+
+	delete from postcode_lookup	where place_id = unhex(p_place_id);
+	delete from road_lookup		where place_id = unhex(p_place_id);
+
+	if p_type = 'postcode' and p_postcode is not null and length(trim(p_postcode)) > 0
+	then
+		insert into postcode_lookup
+			(postcode_key, place_id, timestamp_place)
+		values
+			(replace(upper(trim(p_postcode)), ' ', ''), unhex(p_place_id), p_timestamp);
+	end if;
+
+	if p_type like '%road%'
+	then
+		set l_road_key = normalise_address(p_name);
+
+		if l_road_key is not null
+		then
+			insert into road_lookup
+				(first_token, road_key, place_id, timestamp_place)
+			values
+				(get_element(l_road_key, 1, ' '), l_road_key, unhex(p_place_id), p_timestamp);
+		end if;
+	end if;
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
+
+-- rebuilds postcode_lookup and road_lookup from scratch (optionally only if both are empty, eg after upgrade)
+drop procedure if exists rebuild_place_lookup;
+//
+create procedure rebuild_place_lookup
+(
+	p_only_if_empty		boolean
+)
+procedure_block : begin
+	declare l_place_id	char(32);
+	declare l_type		varchar(50);
+	declare l_name		varchar(500);
+	declare l_postcode	varchar(50);
+	declare l_timestamp	timestamp;
+	declare l_place_done	boolean default false;
+
+	declare lc_place cursor for
+		select 	hex(id), type, name, postcode, ifnull(timestamp_updated, timestamp_created)
+		from 	place
+		where 	type = 'postcode' or type like '%road%';
+
+	declare continue handler for not found set l_place_done = true;
+
+	if p_only_if_empty and (exists (select 1 from postcode_lookup) or exists (select 1 from road_lookup))
+	then
+		leave procedure_block;
+	end if;
+
+	call log('INFORMATION : rebuilding postcode_lookup and road_lookup');
+
+	delete from postcode_lookup;
+	delete from road_lookup;
+
+	open lc_place;
+
+	place_loop : loop
+		fetch lc_place into l_place_id, l_type, l_name, l_postcode, l_timestamp;
+		if l_place_done then
+			leave place_loop;
+		end if;
+
+		call put_place_lookup(l_place_id, l_type, l_name, l_postcode, l_timestamp);
+	end loop; -- place_loop
+
+	close lc_place;
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
+
 -- returns the id of any postcode in a given address string
+-- each word, and each pair of adjacent words, of the address is looked up in postcode_lookup (postcodes can be written with or without their space)
 drop function if exists get_postcode;
 //
 create function get_postcode
@@ -3856,69 +4667,55 @@ create function get_postcode
 )
 returns char(32)
 begin
-	declare l_place_id 			char(32) default null;
-	declare l_postcode			varchar(50);
-	declare l_postcode_done 		boolean default false;
-	declare l_postcode_done_temp 		boolean default false;
-
-	declare lc_postcode cursor for
-		select distinct 
-			hex(id),
-			concat('[[:<:]]', regexp_replace(upper(trim(postcode)), ' +', ' *'), '[[:>:]]')
-		from
-			place
-		where
-			type = 'postcode'
-			and postcode is not null
-		order by ifnull(timestamp_updated, timestamp_created) desc;
-
-	declare continue handler for not found set l_postcode_done =  true;
+	declare l_place_id 		char(32) default null;
+	declare l_timestamp		timestamp default null;
+	declare l_candidate_id		char(32);
+	declare l_candidate_timestamp	timestamp default null;
+	declare l_word			varchar(100);
+	declare l_previous		varchar(100) default null;
+	declare l_count			tinyint;
+	declare l_index			tinyint default 1;
 
-	set p_address = regexp_replace(upper(trim(p_address)), '[ ,]+', ' ');
+	set p_address = trim(regexp_replace(upper(trim(p_address)), '[ ,]+', ' '));
 
-	if	p_address is null
+	if	p_address is null or length(p_address) = 0
 	then
 		-- call log('ERROR: function get_postcode requires non-null address.');
 		return null;
 	end if;
 
-	-- loop through each postcode to be assessed
-	open lc_postcode;	
-	set l_postcode_done = false;
+	set l_count = get_element_count(p_address, ' ');
 
-	postcode_loop : loop
+	while l_index <= l_count do
+		set l_word = get_element(p_address, l_index, ' ');
 
-		-- call log( concat('DEBUG : NEW LOOP postcode_loop'));
-		fetch lc_postcode 
-		into l_place_id, l_postcode;
-
-		if l_postcode_done then 
-			leave postcode_loop;
-		else
-			set l_postcode_done_temp = l_postcode_done;
-		end if;
+		-- most recently updated postcode wins, as before
+		set l_candidate_id = null;
+		select 	hex(place_id), timestamp_place
+		into 	l_candidate_id, l_candidate_timestamp
+		from 	postcode_lookup
+		where 	postcode_key in (l_word, concat(l_previous, l_word))
+		order by timestamp_place desc
+		limit 1;
 
-		-- return id of postcode if found
-		if p_address regexp l_postcode
+		if l_candidate_id is not null and (l_place_id is null or l_candidate_timestamp > l_timestamp)
 		then
-			close lc_postcode;
-			return l_place_id;
+			set l_place_id = l_candidate_id;
+			set l_timestamp = l_candidate_timestamp;
 		end if;
 
-		set l_postcode_done = l_postcode_done_temp;
-
-	end loop;
-
-	close lc_postcode;
+		set l_previous = l_word;
+		set l_index = l_index + 1;
+	end while;
 
-	-- nothing found
-	return null;
+	return l_place_id;
 end;
 //
 set @function_count = ifnull(@function_count,0) + 1;
 //
 
 -- returns the id of any street in a given address string
+-- each word of the normalised address is looked up against road_lookup.first_token, then the whole road name is checked against the address
 drop function if exists get_road;
 //
 create function get_road
@@ -3928,24 +4725,14 @@ create function get_road
 returns char(32)
 begin
 	declare l_place_id 		char(32) default null;
-	declare l_road			varchar(50);
-	declare l_road_done 		boolean default false;
-	declare l_road_done_temp 	boolean default false;
-
-	declare lc_road cursor for
-		select distinct 
-			hex(id),
-			concat('[[:<:]]', regexp_replace(upper(trim(name)), ' +', ' *'), '[[:>:]]')
-		from
-			place
-		where
-			type like '%road%'
-			and name is not null
-		order by ifnull(timestamp_updated, timestamp_created) desc;
-
-	declare continue handler for not found set l_road_done =  true;
+	declare l_timestamp		timestamp default null;
+	declare l_candidate_id		char(32);
+	declare l_candidate_timestamp	timestamp default null;
+	declare l_word			varchar(100);
+	declare l_count			tinyint;
+	declare l_index			tinyint default 1;
 
-	set p_address = regexp_replace(upper(trim(p_address)), '[ ,]+', ' ');
+	set p_address = normalise_address(p_address);
 
 	if	p_address is null
 	then
@@ -3953,58 +4740,37 @@ begin
 		return null;
 	end if;
 
-	-- loop through each postcode to be assessed
-	open lc_road;	
-	set l_road_done = false;
-
-	road_loop : loop
+	set l_count = get_element_count(p_address, ' ');
 
-		-- call log( concat('DEBUG : NEW LOOP postcode_loop'));
-		fetch lc_road 
-		into l_place_id, l_road;
+	while l_index <= l_count do
+		set l_word = get_element(p_address, l_index, ' ');
 
-		if l_road_done then 
-			leave road_loop;
-		else
-			set l_road_done_temp = l_road_done;
-		end if;
+		-- most recently updated road wins, as before
+		set l_candidate_id = null;
+		select 	hex(place_id), timestamp_place
+		into 	l_candidate_id, l_candidate_timestamp
+		from 	road_lookup
+		where 	first_token = l_word
+			and locate(concat(' ', road_key, ' '), concat(' ', p_address, ' ')) > 0
+		order by timestamp_place desc
+		limit 1;
 
-		-- munge l_road to be a better regexp
-		set l_road = regexp_replace(l_road, 'ROAD', 	'R(OA)?D');
-		set l_road = regexp_replace(l_road, 'STREET', 	'ST(REET)?');
-		set l_road = regexp_replace(l_road, 'LANE', 	'LA?NE?');
-		set l_road = regexp_replace(l_road, 'CLOSE', 	'CLO?SE?');
-		set l_road = regexp_replace(l_road, 'AVENUE', 	'AVE(NUE)?');
-		set l_road = regexp_replace(l_road, 'WAY', 	'WA?Y');
-		set l_road = regexp_replace(l_road, 'GARDENS', 	'G(AR)?DE?NS?');
-		set l_road = regexp_replace(l_road, 'COURT', 	'C(OU)?R?T');
-		set l_road = regexp_replace(l_road, 'DRIVE', 	'DR?I?VE?');
-		set l_road = regexp_replace(l_road, 'PLACE', 	'PLA?C?E?');
-		set l_road = regexp_replace(l_road, 'SQUARE', 	'SQ(UARE)?');
-		set l_road = regexp_replace(l_road, 'TERRACE', 	'TERR(ACE)?');
-		set l_road = regexp_replace(l_road, 'CRESCENT',	'CRESC?(ENT)?');
-		set l_road = regexp_replace(l_road, 'GROVE',	'GRO?VE?');
-
-		-- return id of postcode if found
-		if p_address regexp l_road
+		if l_candidate_id is not null and (l_place_id is null or l_candidate_timestamp > l_timestamp)
 		then
-			close lc_road;
-			return l_place_id;
+			set l_place_id = l_candidate_id;
+			set l_timestamp = l_candidate_timestamp;
 		end if;
 
-		set l_road_done = l_road_done_temp;
-
-	end loop;
-
-	close lc_road;
+		set l_index = l_index + 1;
+	end while;
 
-	-- nothing found
-	return null;
+	return l_place_id;
 end;
 //
 set @function_count = ifnull(@function_count,0) + 1;
 //
 
+-- returns name of the place of given type nearest to point (see place_point)
 drop function if exists get_nearest;
 //
 create function get_nearest
@@ -4014,21 +4780,54 @@ create function get_nearest
 )
 returns varchar(500)
 begin
-	declare l_nearest	varchar(500) default null;
+	declare l_type		varchar(50)	default regexp_replace(trim(lower(p_type)), ' +', '-');
+	declare l_radius	double		default 1;	-- km
+	declare l_place_id	binary(16)	default null;
+
+	-- widen the search box until the nearest place in it is also within the radius, so nothing outside the box can be nearer
+	while l_place_id is null and l_radius <= 65536
+	do
+		set l_place_id = (
+			select 	place_id
+			from 	place_point
+			where 	type = l_type
+				and mbrintersects(point, get_search_box(p_point, l_radius))
+				and (get_earth_circle_distance(p_point, point) <= l_radius or l_radius * 4 > 65536)
+			order by get_earth_circle_distance(p_point, point), place_id
+			limit 1);
+		set l_radius = l_radius * 4;
+	end while;
+
+	return (select ifnull(name, identifier) from place where id = l_place_id);
+end;
+//
+set @function_count = ifnull(@function_count,0) + 1;
+//
+
+-- returns box (in degrees) around point holding every point within p_radius km of it (used to narrow place_point searches via its spatial index)
+drop function if exists get_search_box;
+//
+create function get_search_box
+(
+	p_point		point,
+	p_radius	double
+)
+returns geometry
+deterministic
+begin
+	declare l_latitude		double	default st_y(p_point);
+	declare l_longitude		double	default st_x(p_point);
+	declare l_latitude_delta	double	default p_radius / 111.226;	-- km per degree of latitude (see get_earth_circle_distance)
+	declare l_longitude_delta	double	default 180;
 
-	select
-		ifnull(name, identifier)
-	into
-		l_nearest
-	from
-		place
-	where
-		type like concat('%', regexp_replace(trim(lower(p_type)),' +' ,'-' ), '%')
-	order by
-		st_distance(p_point, place.centre_point) asc
-	limit 1;
+	if abs(l_latitude) + l_latitude_delta < 89
+	then
+		set l_longitude_delta = least(180, l_latitude_delta / cos(radians(abs(l_latitude) + l_latitude_delta)));
+	end if;
 
-	return l_nearest;
+	return envelope(linestring(
+		point(l_longitude - l_longitude_delta, l_latitude - l_latitude_delta),
+		point(l_longitude + l_longitude_delta, l_latitude + l_latitude_delta)));
 end;
 //
 set @function_count = ifnull(@function_count,0) + 1;
@@ -4358,20 +5157,373 @@ create trigger place_delete
 	after delete on place
 	for each row
 begin
-	delete from relation	where major = old.id or minor = old.id;
-	delete from attribute	where record_id = old.id;
+	delete from relation		where major = old.id or minor = old.id;
+	delete from attribute		where record_id = old.id;
+	delete from place_spatial	where place_id = old.id;
+	delete from place_point		where place_id = old.id;
+	delete from place_containment	where place_id = old.id or container_id = old.id;
+	delete from postcode_lookup	where place_id = old.id;
+	delete from road_lookup		where place_id = old.id;
+	delete from uuid_registry	where id = old.id;
 end;
 //
 set @trigger_count = ifnull(@trigger_count,0) + 1;
 //
 
-
--- miscellaneous geospatial routines
-
--- extracts placename from kml
-drop function if exists extract_name_from_kml;
+-- spatial side tables
+-- place.polygon and place.centre_point are nullable, so cant carry a SPATIAL index; place_spatial holds each place's polygon
+-- (or centre point, if it has no polygon) in a NOT NULL column that can
+-- xdrop table if exists place_spatial;
+-- //
+create table if not exists place_spatial
+(
+	place_id		binary(16)	not null,
+	type			varchar(50)	character set utf8,		-- place.type
+	shape			geometry	not null,			-- place.polygon, or place.centre_point if no polygon
+	primary key (place_id),
+	index (type),
+	spatial index (shape)
+);
 //
-create function extract_name_from_kml
+set @table_count = ifnull(@table_count,0) + 1;
+//
+
+-- precomputed police-location -> local-authority, ward and police-neighbourhood assignment
+-- maintained by place triggers (see put_place_spatial), so reports needn't compare every location with every polygon
+-- xdrop table if exists place_containment;
+-- //
+create table if not exists place_containment
+(
+	place_id		binary(16)	not null,			-- police-location
+	container_id		binary(16)	not null,			-- place whose polygon contains the location
+	container_type		varchar(50)	character set utf8,		-- container place.type
+	primary key (place_id, container_id),
+	index (container_id),
+	index (container_type, place_id)
+);
+//
+set @table_count = ifnull(@table_count,0) + 1;
+//
+
+-- each place's centre point, for nearest place searches (see get_nearest and post_nearest_places)
+-- xdrop table if exists place_point;
+-- //
+create table if not exists place_point
+(
+	place_id		binary(16)	not null,
+	type			varchar(50)	character set utf8 not null,	-- place.type
+	point			point		not null,			-- place.centre_point
+	primary key (place_id),
+	index (type),
+	spatial index (point)
+);
+//
+set @table_count = ifnull(@table_count,0) + 1;
+//
+
+-- points whose nearest places are wanted, posted in bulk for post_nearest_places
+-- xdrop table if exists nearest_place_stage;
+-- //
+create table if not exists nearest_place_stage
+(
+	stage_id		int		not null auto_increment,
+	session_id		int		not null,			-- connection_id() of posting session
+	point_key		varchar(100)	character set utf8,		-- caller's key for the point (eg police-location identifier)
+	point			point		not null,
+	is_resolved		boolean		default false,
+	primary key (stage_id),
+	index (session_id, is_resolved)
+);
+//
+set @table_count = ifnull(@table_count,0) + 1;
+//
+
+-- refreshes place_spatial and place_containment rows of one place (after it is inserted or its geometry updated)
+-- containers are 'local-authority', 'ward' and 'police-neighbourhood' places; contained places are 'police-location' places
+drop procedure if exists put_place_spatial;
+//
+create procedure put_place_spatial
+(
+	p_place_id	char(32)
+)
+begin
+	declare l_type		varchar(50);
+	declare l_geometry	geometry;
+
+	-- call log('DEBUG : START put_place_spatial');
+
+	delete from place_spatial	where place_id = unhex(p_place_id);
+	delete from place_containment	where place_id = unhex(p_place_id) or container_id = unhex(p_place_id);
+	delete from place_point		where place_id = unhex(p_place_id);
+
+	select 	type, ifnull(polygon, centre_point)
+	into 	l_type, l_geometry
+	from 	place
+	where 	id = unhex(p_place_id);
+
+	insert into place_point
+		(place_id, type, point)
+	select 	id, type, centre_point
+	from 	place
+	where 	id = unhex(p_place_id)
+		and type is not null
+		and centre_point is not null;
+
+	if l_geometry is not null
+	then
+		insert into place_spatial
+			(place_id, type, shape)
+		values
+			(unhex(p_place_id), l_type, l_geometry);
+
+		-- locations within new container (mbrwithin uses the spatial index, st_within does the exact check)
+		if l_type in ('local-authority', 'ward', 'police-neighbourhood') and st_geometrytype(l_geometry) like '%POLYGON'
+		then
+			insert into place_containment
+				(place_id, container_id, container_type)
+			select 	location.place_id, unhex(p_place_id), l_type
+			from 	place_spatial location
+			where 	location.type = 'police-location'
+				and mbrwithin(location.shape, l_geometry)
+				and st_within(location.shape, l_geometry);
+		end if;
+
+		-- containers of new location
+		if l_type = 'police-location'
+		then
+			insert into place_containment
+				(place_id, container_id, container_type)
+			select 	unhex(p_place_id), container.place_id, container.type
+			from 	place_spatial container
+			where 	container.type in ('local-authority', 'ward', 'police-neighbourhood')
+				and mbrcontains(container.shape, l_geometry)
+				and st_within(l_geometry, container.shape);
+		end if;
+	end if;
+
+	-- call log('DEBUG : END put_place_spatial');
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
+
+-- rebuilds place_spatial and place_containment from scratch (optionally only if place_spatial is empty, eg after upgrade)
+drop procedure if exists rebuild_place_spatial;
+//
+create procedure rebuild_place_spatial
+(
+	p_only_if_empty		boolean
+)
+procedure_block : begin
+	if p_only_if_empty and exists (select 1 from place_spatial)
+	then
+		leave procedure_block;
+	end if;
+
+	call log('INFORMATION : rebuilding place_spatial and place_containment');
+
+	delete from place_containment;
+	delete from place_spatial;
+
+	insert into place_spatial
+		(place_id, type, shape)
+	select 	id, type, ifnull(polygon, centre_point)
+	from 	place
+	where 	polygon is not null or centre_point is not null;
+
+	call rebuild_place_point(false);
+
+	insert into place_containment
+		(place_id, container_id, container_type)
+	select 	location.place_id, container.place_id, container.type
+	from 	place_spatial container
+		join place_spatial location 	on location.type = 'police-location'
+						and mbrwithin(location.shape, container.shape)
+	where 	container.type in ('local-authority', 'ward', 'police-neighbourhood')
+		and st_geometrytype(container.shape) like '%POLYGON'
+		and st_within(location.shape, container.shape);
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
+
+-- rebuilds place_point from scratch (optionally only if it is empty, eg after upgrade)
+drop procedure if exists rebuild_place_point;
+//
+create procedure rebuild_place_point
+(
+	p_only_if_empty		boolean
+)
+procedure_block : begin
+	if p_only_if_empty and exists (select 1 from place_point)
+	then
+		leave procedure_block;
+	end if;
+
+	call log('INFORMATION : rebuilding place_point');
+
+	delete from place_point;
+
+	insert into place_point
+		(place_id, type, point)
+	select 	id, type, centre_point
+	from 	place
+	where 	type is not null
+		and centre_point is not null;
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
+
+-- returns the p_k places of given type nearest each point in this session's nearest_place_stage rows, in one go
+-- result set (point_key, place_id, name, distance in km, place_rank), nearest first; stage rows are removed afterwards
+-- each round searches the place_point spatial index within a box around every unresolved point, widening it 4 times over until
+-- the point has p_k places within the radius (so nothing outside the box can be nearer)
+drop procedure if exists post_nearest_places;
+//
+create procedure post_nearest_places
+(
+	p_type		varchar(50),
+	p_k		int
+)
+begin
+	declare l_session_id	int		default connection_id();
+	declare l_type		varchar(50)	default regexp_replace(trim(lower(p_type)), ' +', '-');
+	declare l_k		int		default greatest(ifnull(p_k, 1), 1);
+	declare l_radius	double		default 1;	-- km
+
+	-- call log('DEBUG : START post_nearest_places');
+
+	drop temporary table if exists nearest_place_candidate;
+	create temporary table nearest_place_candidate
+	(
+		stage_id	int		not null,
+		place_id	binary(16)	not null,
+		distance	double,
+		primary key (stage_id, place_id)
+	);
+
+	while l_radius <= 65536 and exists (select 1 from nearest_place_stage where session_id = l_session_id and not is_resolved)
+	do
+		delete
+		from 	nearest_place_candidate
+		where 	stage_id in (select stage_id from nearest_place_stage where session_id = l_session_id and not is_resolved);
+
+		insert into nearest_place_candidate
+			(stage_id, place_id, distance)
+		select 	stage.stage_id, place_point.place_id, get_earth_circle_distance(stage.point, place_point.point)
+		from 	nearest_place_stage stage
+			join place_point 	on place_point.type = l_type
+						and mbrintersects(place_point.point, get_search_box(stage.point, l_radius))
+		where 	stage.session_id = l_session_id
+			and not stage.is_resolved;
+
+		update 	nearest_place_stage stage
+		set 	stage.is_resolved = true
+		where 	stage.session_id = l_session_id
+			and not stage.is_resolved
+			and (select count(*) from nearest_place_candidate candidate where candidate.stage_id = stage.stage_id and candidate.distance <= l_radius) >= l_k;
+
+		set l_radius = l_radius * 4;
+	end while;
+
+	select 	stage.point_key,
+		hex(candidate.place_id) as place_id,
+		ifnull(place.name, place.identifier) as name,
+		candidate.distance,
+		candidate.place_rank
+	from 	(
+			select 	stage_id, place_id, distance,
+				row_number() over (partition by stage_id order by distance, place_id) as place_rank
+			from 	nearest_place_candidate
+		) candidate
+		join nearest_place_stage stage 	on stage.stage_id = candidate.stage_id
+		join place 			on place.id = candidate.place_id
+	where 	candidate.place_rank <= l_k
+	order by stage.stage_id, candidate.place_rank;
+
+	delete from nearest_place_stage where session_id = l_session_id;
+	drop temporary table if exists nearest_place_candidate;
+
+	-- call log('DEBUG : END post_nearest_places');
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
+
+-- returns the p_k places of given type nearest point (as post_nearest_places)
+drop procedure if exists get_nearest_places;
+//
+create procedure get_nearest_places
+(
+	p_point		point,
+	p_type		varchar(50),
+	p_k		int
+)
+begin
+	insert into nearest_place_stage
+		(session_id, point_key, point)
+	values
+		(connection_id(), null, p_point);
+
+	call post_nearest_places(p_type, p_k);
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
+
+drop trigger if exists place_after_insert;
+//
+create trigger place_after_insert 
+	after insert on place
+	for each row
+begin
+	call put_uuid_registry(new.id, 'place');
+
+	if new.polygon is not null or new.centre_point is not null
+	then
+		call put_place_spatial(hex(new.id));
+	end if;
+
+	if new.type = 'postcode' or new.type like '%road%'
+	then
+		call put_place_lookup(hex(new.id), new.type, new.name, new.postcode, ifnull(new.timestamp_updated, new.timestamp_created));
+	end if;
+end;
+//
+set @trigger_count = ifnull(@trigger_count,0) + 1;
+//
+
+drop trigger if exists place_after_update;
+//
+create trigger place_after_update 
+	after update on place
+	for each row
+begin
+	if 	not (old.polygon <=> new.polygon)
+		or not (old.centre_point <=> new.centre_point)
+		or not (old.type <=> new.type)
+	then
+		call put_place_spatial(hex(new.id));
+	end if;
+
+	if 	new.type = 'postcode' or new.type like '%road%'
+		or old.type = 'postcode' or old.type like '%road%'
+	then
+		call put_place_lookup(hex(new.id), new.type, new.name, new.postcode, current_timestamp);
+	end if;
+end;
+//
+set @trigger_count = ifnull(@trigger_count,0) + 1;
+//
+
+
+-- miscellaneous geospatial routines
+
+-- extracts placename from kml
+drop function if exists extract_name_from_kml;
+//
+create function extract_name_from_kml
 	(
 		p_kml 	mediumtext
 	)
@@ -5235,7 +6387,7 @@ create or replace view police_outcome
 as
 	select distinct
 		outcome.id							as "outcome_event_id",
-		date_format(outcome.date_event, outcome.date_resolution) 	as "month",
+		date_format(outcome.event_month, '%Y-%m') 			as "month",
 		crime.id							as "crime_event_id",
 		crime.identifier						as "crime_id",	-- this is the API defn of crime_id
 		crime.name							as "crime_persistent_id",
@@ -5265,7 +6417,7 @@ as
 		crime.id 						as "crime_event_id",
 		crime.identifier 					as "crime_id",		-- police API defn of crime_id
 		crime.name 						as "persistent_id",
-		date_format(crime.date_event, crime.date_resolution) 	as "month",
+		date_format(crime.event_month, '%Y-%m') 		as "month",
 		crime.description					as "context",
 		column_get(crime.extension, 'location_type' as char(100)) 	as "location_type",
 		column_get(crime.extension, 'location_subtype' as char(100)) 	as "location_subtype",
@@ -5379,10 +6531,12 @@ set @view_count = ifnull(@view_count,0) + 1;
 drop function if exists get_population; //
 create FUNCTION  get_population() returns boolean no sql  begin return false; end; //         
 
-create or replace view police_crime_stats_neighbourhood
+-- *_live views aggregate straight from the base tables; the unsuffixed views further down read the
+-- materialised police_*_stats tables, which load-police-data.py refreshes for the months it touched
+create or replace view police_crime_stats_neighbourhood_live
 as
 	select 
-		date_format(crime.date_event, crime.date_resolution) as month,
+		date_format(crime.event_month, '%Y-%m') as month,
 		police_neighbourhood.name as neighbourhood,
 		category.name as category,
 		count(*) as number
@@ -5391,12 +6545,14 @@ as
 		join relation category_relation	on crime.id = category_relation.major
 		join category			on category.id = category_relation.minor and category.type = 'police-crime'
 		join relation place_relation	on crime.id = place_relation.major 
-		join place crime_location 	on crime_location.id = place_relation.minor
-		join place region 		on region.type = 'local-authority' 
-							and region.name = get_variable('region')
-							and st_within(crime_location.centre_point, region.polygon) 
-		join place police_neighbourhood	on police_neighbourhood.type = 'police-neighbourhood' 
-							and st_within(crime_location.centre_point, police_neighbourhood.polygon)
+		join place_containment region_containment	on region_containment.place_id = place_relation.minor
+								and region_containment.container_type = 'local-authority'
+		join place region 				on region.id = region_containment.container_id
+		join variable region_variable 			on region_variable.variable = 'region'
+								and region_variable.value = region.name
+		join place_containment neighbourhood_containment on neighbourhood_containment.place_id = place_relation.minor
+								and neighbourhood_containment.container_type = 'police-neighbourhood'
+		join place police_neighbourhood			on police_neighbourhood.id = neighbourhood_containment.container_id
 	where 
 		crime.type = 'police-crime' 
 	group by 1,2,3;
@@ -5404,10 +6560,10 @@ as
 set @view_count = ifnull(@view_count,0) + 1;
 //
 
-create or replace view police_crime_stats_ward
+create or replace view police_crime_stats_ward_live
 as
 	select 
-		date_format(crime.date_event, crime.date_resolution) as month,
+		date_format(crime.event_month, '%Y-%m') as month,
 		ward.name as ward,
 		category.name as category,
 		count(*) as number
@@ -5417,12 +6573,14 @@ as
 		join relation category_relation	on crime.id = category_relation.major
 		join category			on category.id = category_relation.minor and category.type = 'police-crime'
 		join relation place_relation	on crime.id = place_relation.major 
-		join place crime_location 	on crime_location.id = place_relation.minor
-		join place region 		on region.type = 'local-authority' 
-							and region.name = get_variable('region')
-							and st_within(crime_location.centre_point, region.polygon) 
-		join place ward 		on ward.type = 'ward' 
-							and st_within(crime_location.centre_point, ward.polygon)
+		join place_containment region_containment	on region_containment.place_id = place_relation.minor
+								and region_containment.container_type = 'local-authority'
+		join place region 				on region.id = region_containment.container_id
+		join variable region_variable 			on region_variable.variable = 'region'
+								and region_variable.value = region.name
+		join place_containment ward_containment		on ward_containment.place_id = place_relation.minor
+								and ward_containment.container_type = 'ward'
+		join place ward 				on ward.id = ward_containment.container_id
 	where 
 		crime.type = 'police-crime' 
 	group by 1,2,3;
@@ -5430,22 +6588,24 @@ as
 set @view_count = ifnull(@view_count,0) + 1;
 //
 
-create or replace view police_outcome_stats_ward
+create or replace view police_outcome_stats_ward_live
 as
 	select 
-		date_format(crime.date_event, crime.date_resolution) as month,
+		date_format(crime.event_month, '%Y-%m') as month,
 		ward.name as ward,
 		ifnull(police_outcome.category_name, 'No outcome') as outcome,
 		count(*) as number
 	from
 		event crime
 		join relation place_relation			on crime.id = place_relation.major 
-		join place crime_location 			on crime_location.id = place_relation.minor
-		join place region 				on region.type = 'local-authority' 
-									and region.name = get_variable('region')
-									and st_within(crime_location.centre_point, region.polygon) 
-		join place ward 				on ward.type = 'ward' 
-									and st_within(crime_location.centre_point, ward.polygon)
+		join place_containment region_containment	on region_containment.place_id = place_relation.minor
+								and region_containment.container_type = 'local-authority'
+		join place region 				on region.id = region_containment.container_id
+		join variable region_variable 			on region_variable.variable = 'region'
+								and region_variable.value = region.name
+		join place_containment ward_containment		on ward_containment.place_id = place_relation.minor
+								and ward_containment.container_type = 'ward'
+		join place ward 				on ward.id = ward_containment.container_id
 		left outer join police_outcome on crime.id = police_outcome.crime_event_id
 	where 
 		crime.type = 'police-crime' 
@@ -5454,22 +6614,24 @@ as
 set @view_count = ifnull(@view_count,0) + 1;
 //
 
-create or replace view police_outcome_stats_neighbourhood
+create or replace view police_outcome_stats_neighbourhood_live
 as
 	select 
-		date_format(crime.date_event, crime.date_resolution) as month,
+		date_format(crime.event_month, '%Y-%m') as month,
 		police_neighbourhood.name as neighbourhood,
 		ifnull(police_outcome.category_name, 'No outcome') as outcome,
 		count(*) as number
 	from
 		event crime
 		join relation place_relation			on crime.id = place_relation.major 
-		join place crime_location 			on crime_location.id = place_relation.minor
-		join place region 				on region.type = 'local-authority' 
-									and region.name = get_variable('region')
-									and st_within(crime_location.centre_point, region.polygon) 
-		join place police_neighbourhood	on police_neighbourhood.type = 'police-neighbourhood' 
-							and st_within(crime_location.centre_point, police_neighbourhood.polygon)
+		join place_containment region_containment	on region_containment.place_id = place_relation.minor
+								and region_containment.container_type = 'local-authority'
+		join place region 				on region.id = region_containment.container_id
+		join variable region_variable 			on region_variable.variable = 'region'
+								and region_variable.value = region.name
+		join place_containment neighbourhood_containment on neighbourhood_containment.place_id = place_relation.minor
+								and neighbourhood_containment.container_type = 'police-neighbourhood'
+		join place police_neighbourhood			on police_neighbourhood.id = neighbourhood_containment.container_id
 		left outer join police_outcome on crime.id = police_outcome.crime_event_id
 	where 
 		crime.type = 'police-crime' 
@@ -5478,59 +6640,450 @@ as
 set @view_count = ifnull(@view_count,0) + 1;
 //
 
--- POLICE DATA MANIPULATION FUNCTIONS -- 
+-- POLICE MATERIALISED STATISTICS --
 
--- convert MySQL/MariaDB geometry to <lat>,<long>:<lat>,<long>... string required by police API
--- *** actually returns the co-ords of the minimum bounding rectangle containing the polygon *** to simplify resulting string
--- processing the actual polygon (appx 6k chars long) takes a prohibitively long time
--- ST_ConvexHull might be a better compromise than ST_Envelope, although it can return 2..n co-ords rather than always 4, and only exists in MariaDB 10.1.2+
+-- per month/area/category crime counts, materialised from police_crime_stats_*_live
+-- xdrop table if exists police_crime_stats;
+-- //
+create table if not exists police_crime_stats
+(
+	id			int		not null auto_increment,
+	region			varchar(250)	character set utf8 not null,	-- place.name of region the stats were built for
+	month			varchar(20)	character set utf8 not null,	-- 'YYYY-MM'
+	area_type		varchar(50)	character set utf8 not null,	-- 'police-neighbourhood' or 'ward'
+	area			varchar(500)	character set utf8 not null,	-- place.name of neighbourhood or ward
+	category		varchar(500)	character set utf8,
+	number			int		not null,
+	timestamp_created	timestamp	default current_timestamp,
+	primary key (id),
+	index (region, month),
+	index (region, area_type, month)
+);
+//
+set @table_count = ifnull(@table_count,0) + 1;
+//
 
-drop function if exists convert_geometry_to_police_string;
+-- per month/area/outcome crime counts, materialised from police_outcome_stats_*_live
+-- xdrop table if exists police_outcome_stats;
+-- //
+create table if not exists police_outcome_stats
+(
+	id			int		not null auto_increment,
+	region			varchar(250)	character set utf8 not null,
+	month			varchar(20)	character set utf8 not null,
+	area_type		varchar(50)	character set utf8 not null,
+	area			varchar(500)	character set utf8 not null,
+	outcome			varchar(500)	character set utf8,
+	number			int		not null,
+	timestamp_created	timestamp	default current_timestamp,
+	primary key (id),
+	index (region, month),
+	index (region, area_type, month)
+);
+//
+set @table_count = ifnull(@table_count,0) + 1;
 //
-create function convert_geometry_to_police_string
-	(
-		p_geometry	geometry
-	)
-	returns text
-begin
-	declare l_text 		text default null;
-	declare l_str 		text default '';
-	declare l_element	varchar(50);
-	declare l_len 		tinyint;
-	declare l_count 	tinyint default 1;
 
-	-- call log('DEBUG : START convert_geometry_to_police_string');
+-- months of police data changed by the merge_police_*_stage procedures and post_police_* functions (or dropped by delete_event_partitions)
+-- police-crime months include those of crimes whose outcomes changed, and a crime's old month when it is redated;
+-- police-crime-outcome months include those of outcomes of changed crimes
+-- lets refresh_police_stats_since and export-police-data.py find what changed without scanning every event
+-- xdrop table if exists police_month_change;
+-- //
+create table if not exists police_month_change
+(
+	type			varchar(50)	character set utf8 not null,	-- event.type
+	month			date		not null,			-- first day of month (as event.event_month)
+	timestamp_updated	timestamp	default current_timestamp on update current_timestamp,	-- last changed
+	primary key (type, month),
+	index (timestamp_updated)
+);
+//
+set @table_count = ifnull(@table_count,0) + 1;
+//
 
-	if p_geometry is not null
+-- records that police data of type p_type dated in the month of p_date (anything starting 'YYYY-MM') has changed
+drop procedure if exists post_police_month_change;
+//
+create procedure post_police_month_change
+(
+	p_type		varchar(50),
+	p_date		varchar(50)
+)
+begin
+	declare l_month		date default str_to_date(concat(left(trim(p_date), 7), '-01'), '%Y-%m-%d');
+
+	if p_type is not null and l_month is not null
 	then
+		insert into police_month_change
+			(type, month)
+		values
+			(p_type, l_month)
+		on duplicate key update
+			timestamp_updated = current_timestamp;
+	end if;
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
 
-		set l_text = substring_index(substring_index(ST_AsText(ST_Envelope(p_geometry)), '(', -1), ')', 1); -- returns "LONG LAT,LONG LAT,LONG LAT, ...
+create or replace view police_crime_stats_neighbourhood
+as
+	select 
+		stats.month		as month,
+		stats.area		as neighbourhood,
+		stats.category		as category,
+		stats.number		as number
+	from 
+		police_crime_stats stats
+		join variable region_variable 	on region_variable.variable = 'region'
+						and region_variable.value = stats.region
+	where 
+		stats.area_type = 'police-neighbourhood';
+//
+set @view_count = ifnull(@view_count,0) + 1;
+//
 
-		if ST_GeometryType(p_geometry) = 'POLYGON'
-		then
-			
-			set l_len = length( l_text ) - length( replace( l_text, ',', '' )) + 1; -- always 5 with ST_Envelope, but not with ST_ConvexHull		
+create or replace view police_crime_stats_ward
+as
+	select 
+		stats.month		as month,
+		stats.area		as ward,
+		stats.category		as category,
+		stats.number		as number
+	from 
+		police_crime_stats stats
+		join variable region_variable 	on region_variable.variable = 'region'
+						and region_variable.value = stats.region
+	where 
+		stats.area_type = 'ward';
+//
+set @view_count = ifnull(@view_count,0) + 1;
+//
 
-			-- reformat to LAT,LONG:LAT,LONG: ...
-			while l_count <= l_len do
+create or replace view police_outcome_stats_ward
+as
+	select 
+		stats.month		as month,
+		stats.area		as ward,
+		stats.outcome		as outcome,
+		stats.number		as number
+	from 
+		police_outcome_stats stats
+		join variable region_variable 	on region_variable.variable = 'region'
+						and region_variable.value = stats.region
+	where 
+		stats.area_type = 'ward';
+//
+set @view_count = ifnull(@view_count,0) + 1;
+//
 
-				set l_element = substring_index( substring_index(  l_text , ',' , l_count ), ',', -1);
-				set l_str = concat(l_str, substring_index( substring_index(  l_element , ' ' , -1 ), ' ', -1), ',', substring_index( substring_index(  l_element , ' ' , 1 ), ' ', -1 ));
-				if l_count < l_len
-				then
-					set l_str = concat(l_str, ':');
-				end if;
-			
-				set l_count = l_count + 1;
+create or replace view police_outcome_stats_neighbourhood
+as
+	select 
+		stats.month		as month,
+		stats.area		as neighbourhood,
+		stats.outcome		as outcome,
+		stats.number		as number
+	from 
+		police_outcome_stats stats
+		join variable region_variable 	on region_variable.variable = 'region'
+						and region_variable.value = stats.region
+	where 
+		stats.area_type = 'police-neighbourhood';
+//
+set @view_count = ifnull(@view_count,0) + 1;
+//
 
-			 end while;
+-- recalculates police_crime_stats and police_outcome_stats for one month ('YYYY-MM') of region p_region (null for the current region)
+-- only crimes dated in that month are aggregated, so this is cheap enough to run after every load
+drop procedure if exists refresh_police_stats;
+//
+create procedure refresh_police_stats
+(
+	p_month		varchar(20),
+	p_region	varchar(250)
+)
+begin
+	declare l_region	varchar(250);
+	declare l_from		datetime;
+	declare l_to		datetime;
+	declare l_month		date;
 
-		elseif ST_GeometryType(p_geometry) = 'POINT'
-		then
+	-- call log('DEBUG : START refresh_police_stats');
 
-			set l_str = concat(l_str, substring_index( substring_index( l_text, ' ' , -1 ), ' ', -1), ',', substring_index( substring_index( l_text , ' ' , 1 ), ' ', -1 ));
+	set p_month = left(trim(p_month), 7);
+	set l_region = ifnull(trim(p_region), get_variable('region'));
+	set l_from = convert_string_to_date(p_month);
+	set l_to = convert_string_to_date(date_format(date_add(str_to_date(concat(p_month, '-01'), '%Y-%m-%d'), interval 1 month), '%Y-%m'));
+	set l_month = str_to_date(concat(p_month, '-01'), '%Y-%m-%d');
 
-		end if;
+	if l_region is null or l_from is null
+	then
+		call log(concat('ERROR : refresh_police_stats cannot refresh month "', ifnull(p_month, 'NULL'), '" for region "', ifnull(l_region, 'NULL'), '"'));
+	else
+		delete from police_crime_stats where region = l_region and month = p_month;
+		delete from police_outcome_stats where region = l_region and month = p_month;
+
+		insert into police_crime_stats
+			(region, month, area_type, area, category, number)
+		select 
+			l_region,
+			date_format(crime.event_month, '%Y-%m'),
+			area.type,
+			area.name,
+			category.name,
+			count(*)
+		from 
+			event crime 
+			join relation category_relation	on crime.id = category_relation.major
+			join category			on category.id = category_relation.minor and category.type = 'police-crime'
+			join relation place_relation	on crime.id = place_relation.major 
+			join place_containment region_containment	on region_containment.place_id = place_relation.minor
+									and region_containment.container_type = 'local-authority'
+			join place region 				on region.id = region_containment.container_id
+									and region.name = l_region
+			join place_containment area_containment		on area_containment.place_id = place_relation.minor
+									and area_containment.container_type in ('police-neighbourhood', 'ward')
+			join place area					on area.id = area_containment.container_id
+		where 
+			crime.type = 'police-crime' 
+			and crime.event_month = l_month		-- (type, event_month) index
+			and crime.date_event >= l_from		-- only reads the partition holding the month
+			and crime.date_event < l_to
+		group by 2,3,4,5;
+
+		insert into police_outcome_stats
+			(region, month, area_type, area, outcome, number)
+		select 
+			l_region,
+			date_format(crime.event_month, '%Y-%m'),
+			area.type,
+			area.name,
+			ifnull(police_outcome.category_name, 'No outcome'),
+			count(*)
+		from
+			event crime
+			join relation place_relation			on crime.id = place_relation.major 
+			join place_containment region_containment	on region_containment.place_id = place_relation.minor
+									and region_containment.container_type = 'local-authority'
+			join place region 				on region.id = region_containment.container_id
+									and region.name = l_region
+			join place_containment area_containment		on area_containment.place_id = place_relation.minor
+									and area_containment.container_type in ('police-neighbourhood', 'ward')
+			join place area					on area.id = area_containment.container_id
+			left outer join police_outcome on crime.id = police_outcome.crime_event_id
+		where 
+			crime.type = 'police-crime' 
+			and crime.event_month = l_month		-- (type, event_month) index
+			and crime.date_event >= l_from		-- only reads the partition holding the month
+			and crime.date_event < l_to
+		group by 2,3,4,5;
+	end if;
+
+	-- call log('DEBUG : END refresh_police_stats');
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
+
+-- refreshes stats of region p_region (null for the current region) for every month with crimes, or outcomes of crimes, added or changed since p_since
+-- outcomes usually arrive months after the crime, so the months refreshed are those of the crimes, not of the load (see police_month_change)
+-- (moving existing police locations between wards/neighbourhoods needs a full rebuild_police_stats)
+drop procedure if exists refresh_police_stats_since;
+//
+create procedure refresh_police_stats_since
+(
+	p_since		datetime,
+	p_region	varchar(250)
+)
+begin
+	declare l_month		varchar(20);
+	declare l_month_done	boolean default false;
+
+	declare lc_month cursor for
+		select 	date_format(month, '%Y-%m')
+		from 	police_month_change
+		where 	type = 'police-crime'
+			and timestamp_updated >= p_since;
+
+	declare continue handler for not found set l_month_done = true;
+
+	open lc_month;
+
+	month_loop : loop
+		fetch lc_month into l_month;
+		if l_month_done then
+			leave month_loop;
+		end if;
+
+		call refresh_police_stats(l_month, p_region);
+	end loop; -- month_loop
+
+	close lc_month;
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
+
+-- rebuilds police_crime_stats and police_outcome_stats for every month of the current region (optionally only if there are none yet)
+drop procedure if exists rebuild_police_stats;
+//
+create procedure rebuild_police_stats
+(
+	p_only_if_empty		boolean
+)
+procedure_block : begin
+	declare l_month		varchar(20);
+	declare l_month_done	boolean default false;
+
+	declare lc_month cursor for
+		select 	distinct date_format(event_month, '%Y-%m')	-- read straight off the (type, event_month) index
+		from 	event
+		where 	type = 'police-crime';
+
+	declare continue handler for not found set l_month_done = true;
+
+	if p_only_if_empty and exists (select 1 from police_crime_stats where region = get_variable('region'))
+	then
+		leave procedure_block;
+	end if;
+
+	call log('INFORMATION : rebuilding police_crime_stats and police_outcome_stats');
+
+	delete from police_crime_stats where region = get_variable('region');
+	delete from police_outcome_stats where region = get_variable('region');
+
+	open lc_month;
+
+	month_loop : loop
+		fetch lc_month into l_month;
+		if l_month_done then
+			leave month_loop;
+		end if;
+
+		call refresh_police_stats(l_month, null);
+	end loop; -- month_loop
+
+	close lc_month;
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
+
+-- compares the materialised stats views with their *_live equivalents; logs and returns the number of mismatched rows (0 = consistent)
+drop function if exists check_police_stats;
+//
+create function check_police_stats()
+	returns int
+begin
+	declare l_count		int default 0;
+	declare l_mismatch	int default 0;
+
+	select 	count(*) into l_count
+	from 	police_crime_stats_neighbourhood_live live
+	where 	not exists (select 1 from police_crime_stats_neighbourhood stats where stats.month <=> live.month and stats.neighbourhood <=> live.neighbourhood and stats.category <=> live.category and stats.number = live.number);
+	set l_mismatch = l_mismatch + l_count;
+
+	select 	count(*) into l_count
+	from 	police_crime_stats_neighbourhood stats
+	where 	not exists (select 1 from police_crime_stats_neighbourhood_live live where stats.month <=> live.month and stats.neighbourhood <=> live.neighbourhood and stats.category <=> live.category and stats.number = live.number);
+	set l_mismatch = l_mismatch + l_count;
+
+	select 	count(*) into l_count
+	from 	police_crime_stats_ward_live live
+	where 	not exists (select 1 from police_crime_stats_ward stats where stats.month <=> live.month and stats.ward <=> live.ward and stats.category <=> live.category and stats.number = live.number);
+	set l_mismatch = l_mismatch + l_count;
+
+	select 	count(*) into l_count
+	from 	police_crime_stats_ward stats
+	where 	not exists (select 1 from police_crime_stats_ward_live live where stats.month <=> live.month and stats.ward <=> live.ward and stats.category <=> live.category and stats.number = live.number);
+	set l_mismatch = l_mismatch + l_count;
+
+	select 	count(*) into l_count
+	from 	police_outcome_stats_neighbourhood_live live
+	where 	not exists (select 1 from police_outcome_stats_neighbourhood stats where stats.month <=> live.month and stats.neighbourhood <=> live.neighbourhood and stats.outcome <=> live.outcome and stats.number = live.number);
+	set l_mismatch = l_mismatch + l_count;
+
+	select 	count(*) into l_count
+	from 	police_outcome_stats_neighbourhood stats
+	where 	not exists (select 1 from police_outcome_stats_neighbourhood_live live where stats.month <=> live.month and stats.neighbourhood <=> live.neighbourhood and stats.outcome <=> live.outcome and stats.number = live.number);
+	set l_mismatch = l_mismatch + l_count;
+
+	select 	count(*) into l_count
+	from 	police_outcome_stats_ward_live live
+	where 	not exists (select 1 from police_outcome_stats_ward stats where stats.month <=> live.month and stats.ward <=> live.ward and stats.outcome <=> live.outcome and stats.number = live.number);
+	set l_mismatch = l_mismatch + l_count;
+
+	select 	count(*) into l_count
+	from 	police_outcome_stats_ward stats
+	where 	not exists (select 1 from police_outcome_stats_ward_live live where stats.month <=> live.month and stats.ward <=> live.ward and stats.outcome <=> live.outcome and stats.number = live.number);
+	set l_mismatch = l_mismatch + l_count;
+
+	if l_mismatch > 0
+	then
+		call log(concat('ERROR : check_police_stats found ', l_mismatch, ' rows differing between police_*_stats and police_*_stats_*_live; run rebuild_police_stats(false)'));
+	end if;
+
+	return l_mismatch;
+end;
+//
+set @function_count = ifnull(@function_count,0) + 1;
+//
+
+-- POLICE DATA MANIPULATION FUNCTIONS -- 
+
+-- convert MySQL/MariaDB geometry to <lat>,<long>:<lat>,<long>... string required by police API
+-- *** actually returns the co-ords of the minimum bounding rectangle containing the polygon *** to simplify resulting string
+-- processing the actual polygon (appx 6k chars long) takes a prohibitively long time
+-- ST_ConvexHull might be a better compromise than ST_Envelope, although it can return 2..n co-ords rather than always 4, and only exists in MariaDB 10.1.2+
+
+drop function if exists convert_geometry_to_police_string;
+//
+create function convert_geometry_to_police_string
+	(
+		p_geometry	geometry
+	)
+	returns text
+begin
+	declare l_text 		text default null;
+	declare l_str 		text default '';
+	declare l_element	varchar(50);
+	declare l_len 		tinyint;
+	declare l_count 	tinyint default 1;
+
+	-- call log('DEBUG : START convert_geometry_to_police_string');
+
+	if p_geometry is not null
+	then
+
+		set l_text = substring_index(substring_index(ST_AsText(ST_Envelope(p_geometry)), '(', -1), ')', 1); -- returns "LONG LAT,LONG LAT,LONG LAT, ...
+
+		if ST_GeometryType(p_geometry) = 'POLYGON'
+		then
+			
+			set l_len = length( l_text ) - length( replace( l_text, ',', '' )) + 1; -- always 5 with ST_Envelope, but not with ST_ConvexHull		
+
+			-- reformat to LAT,LONG:LAT,LONG: ...
+			while l_count <= l_len do
+
+				set l_element = substring_index( substring_index(  l_text , ',' , l_count ), ',', -1);
+				set l_str = concat(l_str, substring_index( substring_index(  l_element , ' ' , -1 ), ' ', -1), ',', substring_index( substring_index(  l_element , ' ' , 1 ), ' ', -1 ));
+				if l_count < l_len
+				then
+					set l_str = concat(l_str, ':');
+				end if;
+			
+				set l_count = l_count + 1;
+
+			 end while;
+
+		elseif ST_GeometryType(p_geometry) = 'POINT'
+		then
+
+			set l_str = concat(l_str, substring_index( substring_index( l_text, ' ' , -1 ), ' ', -1), ',', substring_index( substring_index( l_text , ' ' , 1 ), ' ', -1 ));
+
+		end if;
 
 	end if;
 	
@@ -5751,15 +7304,10 @@ begin
 				);
 
 		-- post crime extensions
-		if p_location_type is not null and length(p_location_type) > 0
-		then
-			set l_extension = post_extension(l_event_id, 'location_type', p_location_type);
-		end if;
-
-		if p_location_subtype is not null and length(p_location_subtype) > 0
-		then
-			set l_extension = post_extension(l_event_id, 'location_subtype', p_location_subtype);
-		end if;
+		set l_extension = post_extensions(l_event_id, json_object(
+						'location_type',	p_location_type,
+						'location_subtype',	p_location_subtype
+						));
 
 		-- link to category
 		if not exists_relation (null, l_event_id, l_crime_category_id)
@@ -5900,6 +7448,24 @@ begin
 	--			);
 	-- end if;
 
+	-- note changed months; the old month and the months of outcomes too if the crime was already there
+	call post_police_month_change('police-crime', p_month);
+
+	if l_old_month is not null
+	then
+		call post_police_month_change('police-crime', l_old_month);
+
+		insert into police_month_change
+			(type, month)
+		select 	distinct 'police-crime-outcome', outcome.event_month
+		from 	relation
+			join event outcome 	on outcome.id = relation.minor
+						and outcome.type = 'police-crime-outcome'
+		where 	relation.major = unhex(l_event_id)
+		on duplicate key update
+			timestamp_updated = current_timestamp;
+	end if;
+
 	-- call log('DEBUG : END post_police_crime');
 
 	return l_event_id;
@@ -5975,6 +7541,8 @@ begin
 	declare l_crime_month			varchar(10);
 	declare l_old_crime_persistent_id	varchar(64);
 	declare l_identifier			varchar(500);
+	declare l_crime_from			datetime;
+	declare l_crime_to			datetime;
 
 	-- call log('DEBUG : START post_police_outcome');
 
@@ -6000,7 +7568,28 @@ begin
 
 	-- find underlying crime record
 	-- only do stuff if crime not already posted
-	if p_crime_persistent_id is not null and length(p_crime_persistent_id) > 0
+	-- look in the month the outcome gives for the crime first (only reads the event partition holding that month)
+	if length(ifnull(p_crime_month, '')) > 0
+	then
+		set l_crime_from = convert_string_to_date(left(p_crime_month, 7));
+		set l_crime_to = convert_string_to_date(date_format(date_add(str_to_date(concat(left(p_crime_month, 7), '-01'), '%Y-%m-%d'), interval 1 month), '%Y-%m'));
+	end if;
+
+	if l_crime_from is not null and p_crime_persistent_id is not null and length(p_crime_persistent_id) > 0
+	then
+	 	select 	distinct
+			hex(id), date_format(date_event, date_resolution)
+	 	into 	l_crime_event_id, l_crime_month
+	 	from 	event
+	 	where	name = p_crime_persistent_id
+	 	and	type = 'police-crime'
+		and	date_event >= l_crime_from
+		and	date_event < l_crime_to
+		order by timestamp_created desc
+	 	limit 1;
+	end if;
+
+	if l_crime_event_id is null and p_crime_persistent_id is not null and length(p_crime_persistent_id) > 0
 	then
 	 	select 	distinct
 			hex(id), date_format(date_event, date_resolution)
@@ -6260,6 +7849,20 @@ begin
 			'".'));
 	end if;
 
+	-- note changed months of outcome and crime
+	if l_outcome_event_id is not null
+	then
+		call post_police_month_change('police-crime-outcome', p_month);
+
+		insert into police_month_change
+			(type, month)
+		select 	'police-crime', event_month
+		from 	event
+		where 	id = unhex(l_crime_event_id)
+		on duplicate key update
+			timestamp_updated = current_timestamp;
+	end if;
+
 	-- call log('DEBUG : END post_police_outcome');
 	return l_outcome_event_id;
 end;
@@ -6482,149 +8085,1914 @@ begin
 			-- call log(concat('DEBUG : [new] l_person_id = ', ifnull(l_person_id, 'NULL') ));
 
 			-- post person extensions
-			if p_self_defined_ethnicity is not null and length(p_self_defined_ethnicity) > 0 
-			then
-				set l_extension = post_extension(l_person_id, 'self_defined_ethnicity', p_self_defined_ethnicity);
-			end if;
+			set l_extension = post_extensions(l_person_id, json_object(
+							'self_defined_ethnicity',	p_self_defined_ethnicity,
+							'officer_defined_ethnicity',	p_officer_defined_ethnicity,
+							'age_range',			p_age_range
+							));
 
-			if p_officer_defined_ethnicity is not null and length(p_officer_defined_ethnicity) > 0 
-			then
-				set l_extension = post_extension(l_person_id, 'officer_defined_ethnicity', p_officer_defined_ethnicity);
-			end if;
+		end if;
+
+	end if;
+
+	-- artificial (event) identifier (a checksum intended to be unique for the given variables)
+	-- ?cant do this - can have 1+ stops at the same place, same time, same reason (ie 2 ppl stopped at once)
+	set l_identifier = concat( 	ifnull(p_stop_type, 'NULL'), '-', 
+					ifnull(p_location_id, 'NULL'), '-', 
+					ifnull(p_datetime, 'NULL'), '-', 
+					ifnull(p_operation_name, 'NULL') , '-', 
+					ifnull(p_legislation, 'NULL'), '-', 
+					ifnull(p_object_of_search, 'NULL'), '-', 
+					ifnull(p_outcome_linked_to_object_of_search, 'NULL'), '-', 
+					ifnull(p_involved_person, 'NULL'), '-', 
+					ifnull(p_removal_of_more_than_outer_clothing, 'NULL')
+				);
+
+	-- check if stop already logged
+	-- bit of a guess this; it's not easy to identify a unique stop, but we want to avoid adding duplicates!
+	select 	distinct 
+		hex(id)
+	into 	l_stop_event_id
+	from 	event
+	where	identifier = md5(l_identifier)
+	and	type = 'police-stop'
+	order by timestamp_created desc
+	limit 1;
+
+	if l_stop_event_id is null
+	then
+		-- post stop record
+		set l_stop_event_id = post_event(
+				'police-stop',
+				md5(l_identifier),
+				l_identifier,
+				p_legislation,
+				str_to_date(p_datetime, l_date_format),
+				l_date_format
+				);
+
+		-- post stop extensions
+		set l_extension = post_extensions(l_stop_event_id, json_object(
+						'outcome_linked_to_object_of_search',	p_outcome_linked_to_object_of_search,
+						'operation',				p_operation,
+						'object_of_search',			p_object_of_search,
+						'operation_name',			p_operation_name,
+						'removal_of_more_than_outer_clothing',	p_removal_of_more_than_outer_clothing,
+						'outcome',				p_outcome,
+						'involved_person',			p_involved_person
+						));
+
+		-- link to category
+		if not exists_relation (null, l_stop_event_id, l_stop_category_id)
+		then
+			set l_relation = post_relation(null, l_stop_event_id, l_stop_category_id);
+		end if;
+
+		-- link to location (if any)
+		if p_location_id is not null and not exists_relation (null, l_stop_event_id, l_place_id)
+		then
+			set l_relation = post_relation(null, l_stop_event_id, l_place_id);
+		end if;
+
+		-- link to person (if any)
+		if l_person_id is not null and not exists_relation (null, l_person_id, l_stop_event_id)
+		then
+			set l_relation = post_relation(null, l_person_id, l_stop_event_id);
+		end if;
+
+/*	else
+		-- cater for amendments [not possible - no way to identify record]
+
+		if p_outcome_linked_to_object_of_search is not null and l_old_outcome_linked_to_object_of_search != p_outcome_linked_to_object_of_search
+		then
+			set l_extension = post_extension(l_stop_event_id, 'location_type', p_outcome_linked_to_object_of_search);
+		end if;
+
+		if p_operation is not null and l_old_operation != p_operation
+		then
+			set l_extension = post_extension(l_stop_event_id, 'location_type', p_operation);
+		end if;
+
+		if p_removal_of_more_than_outer_clothing is not null and l_old_removal_of_more_than_outer_clothing != p_removal_of_more_than_outer_clothing
+		then
+			set l_extension = post_extension(l_stop_event_id, 'location_type', p_removal_of_more_than_outer_clothing);
+		end if;
+
+		if p_outcome is not null and l_old_outcome != p_outcome
+		then
+			set l_extension = post_extension(l_stop_event_id, 'location_type', p_outcome);
+		end if;
+
+		if p_involved_person is not null and l_old_involved_person != p_involved_person
+		then
+			set l_extension = post_extension(l_stop_event_id, 'location_type', p_involved_person);
+		end if;
+*/
+
+	end if;
+
+	-- note changed month
+	if l_stop_event_id is not null
+	then
+		call post_police_month_change('police-stop', p_datetime);
+	end if;
+
+	-- call log('DEBUG : END post_police_stop');
+
+	return l_stop_event_id;
+end;
+//
+set @function_count = ifnull(@function_count,0) + 1;
+//
+
+-- POLICE BULK LOAD --
+-- staging tables loaded in bulk by load-police-data.py (one multi-row insert per batch rather than one post_police_* call per record)
+-- and merged into event, place, relation and category by set-based procedures using the same rules as post_police_crime etc
+-- rows are keyed by session_id (connection_id() of the loading session) so concurrent loads don't merge each other's rows
+-- staging tables only ever hold in-flight rows, so are safe to drop and recreate
+-- the loader may fill in category_id and place_id from its id cache; the merge procedures only resolve those left null
+
+drop table if exists police_crime_stage;
+//
+create table police_crime_stage
+(
+	stage_id		int		not null auto_increment,
+	session_id		int		not null,			-- connection_id() of loading session
+	crime_category_code	varchar(100)	character set utf8,
+	crime_id		int,						-- police API crime_id, not crime_event_id
+	crime_persistent_id	varchar(64)	character set utf8,
+	context			text		character set utf8,
+	month			varchar(10)	character set utf8,		-- 'YYYY-MM'
+	location_type		varchar(100)	character set utf8,
+	location_subtype	varchar(100)	character set utf8,
+	location_id		varchar(100)	character set utf8,
+	location_name		varchar(100)	character set utf8,
+	location_latitude	float,
+	location_longitude	float,
+	outcome_category_name	varchar(100)	character set utf8,		-- not actually used (as post_police_crime)
+	outcome_date		varchar(10)	character set utf8,		-- not actually used (as post_police_crime)
+	crime_key		varchar(64)	character set utf8,		-- persistent_id, or crime_id if there isn't one
+	location_key		varchar(300)	character set utf8,
+	category_id		binary(16),
+	place_id		binary(16),
+	event_id		binary(16),
+	is_new			boolean		default false,
+	primary key (stage_id),
+	index (session_id, crime_key),
+	index (session_id, location_key),
+	index (event_id)
+);
+//
+set @table_count = ifnull(@table_count,0) + 1;
+//
+
+drop table if exists police_outcome_stage;
+//
+create table police_outcome_stage
+(
+	stage_id		int		not null auto_increment,
+	session_id		int		not null,
+	category_code		varchar(100)	character set utf8,
+	category_name		varchar(100)	character set utf8,
+	month			varchar(10)	character set utf8,
+	person_identifier	int,
+	crime_category_code	varchar(100)	character set utf8,
+	crime_id		int,
+	crime_persistent_id	varchar(64)	character set utf8,
+	context			text		character set utf8,
+	crime_month		varchar(10)	character set utf8,
+	location_type		varchar(100)	character set utf8,
+	location_subtype	varchar(100)	character set utf8,
+	location_id		varchar(100)	character set utf8,
+	location_name		varchar(100)	character set utf8,
+	location_latitude	float,
+	location_longitude	float,
+	crime_identifier	varchar(100)	character set utf8,		-- event.identifier of underlying crime
+	outcome_name		varchar(500)	character set utf8,		-- artificial identifier (as post_police_outcome)
+	outcome_identifier	char(32)	character set utf8,		-- md5(outcome_name)
+	crime_event_id		binary(16),
+	category_id		binary(16),
+	event_id		binary(16),
+	person_id		binary(16),
+	primary key (stage_id),
+	index (session_id),
+	index (outcome_identifier),
+	index (crime_event_id)
+);
+//
+set @table_count = ifnull(@table_count,0) + 1;
+//
+
+drop table if exists police_stop_stage;
+//
+create table police_stop_stage
+(
+	stage_id				int		not null auto_increment,
+	session_id				int		not null,
+	datetime				varchar(20)	character set utf8,
+	outcome_linked_to_object_of_search	varchar(10)	character set utf8,
+	stop_type				varchar(100)	character set utf8,
+	operation				varchar(10)	character set utf8,
+	object_of_search			varchar(100)	character set utf8,
+	operation_name				varchar(100)	character set utf8,
+	removal_of_more_than_outer_clothing	varchar(10)	character set utf8,
+	outcome					varchar(100)	character set utf8,
+	legislation				varchar(100)	character set utf8,
+	involved_person				varchar(10)	character set utf8,
+	location_id				varchar(100)	character set utf8,
+	location_name				varchar(100)	character set utf8,
+	location_latitude			float,
+	location_longitude			float,
+	gender					varchar(20)	character set utf8,
+	self_defined_ethnicity			varchar(100)	character set utf8,
+	officer_defined_ethnicity		varchar(100)	character set utf8,
+	age_range				varchar(10)	character set utf8,
+	location_key				varchar(300)	character set utf8,
+	person_name				varchar(500)	character set utf8,	-- artificial identifiers (as post_police_stop)
+	person_identifier			char(32)	character set utf8,
+	stop_name				varchar(500)	character set utf8,
+	stop_identifier				char(32)	character set utf8,
+	category_id				binary(16),
+	place_id				binary(16),
+	person_id				binary(16),
+	event_id				binary(16),
+	primary key (stage_id),
+	index (session_id, location_key),
+	index (person_identifier),
+	index (stop_identifier)
+);
+//
+set @table_count = ifnull(@table_count,0) + 1;
+//
+
+-- resolves (or creates) the police-location places listed in temporary table police_location_stage
+-- expects police_location_stage(location_key, location_id, location_name, location_latitude, location_longitude, identifier, place_id, is_new)
+-- follows post_police_crime: latest place with the same identifier, or a new place with a suffixed identifier if the lat/long differs
+drop procedure if exists merge_police_locations;
+//
+create procedure merge_police_locations()
+begin
+	-- latest place with this identifier
+	update 	police_location_stage location
+	set 	location.place_id = (
+			select 	place.id
+			from 	place
+			where 	place.type = 'police-location'
+				and place.identifier = location.location_id
+			order by ifnull(place.timestamp_updated, place.timestamp_created) desc
+			limit 1);
+
+	-- cater for possible case where street identifier exists, but refers to different lat/long (urgh!)
+	-- reuse a previously suffixed place at the same lat/long before adding yet another one
+	update 	police_location_stage location
+		join place on place.id = location.place_id
+	set 	location.place_id = (
+			select 	suffixed.id
+			from 	place suffixed
+			where 	suffixed.type = 'police-location'
+				and suffixed.identifier like concat(location.location_id, '-%')
+				and abs(location.location_longitude - suffixed.longitude) <= 0.0001
+				and abs(location.location_latitude - suffixed.latitude) <= 0.0001
+			order by ifnull(suffixed.timestamp_updated, suffixed.timestamp_created) desc
+			limit 1),
+		location.identifier = concat(location.location_id, '-', substring(rand(),3))
+	where	abs(location.location_longitude - place.longitude) > 0.0001
+		or abs(location.location_latitude - place.latitude) > 0.0001;
+
+	-- post new places
+	update 	police_location_stage
+	set 	identifier = ifnull(identifier, location_id),
+		place_id = ordered_uuid(),
+		is_new = true
+	where 	place_id is null;
+
+	-- same street identifier at more than one lat/long within the batch; all but the first new place get a suffixed identifier (as post_police_crime would)
+	-- (ranked in a copy, as a temporary table cant be opened twice in one statement)
+	drop temporary table if exists police_location_duplicate;
+	create temporary table police_location_duplicate
+	(
+		location_key		varchar(300)	character set utf8,
+		primary key (location_key)
+	);
+
+	insert into police_location_duplicate (location_key)
+	select 	ranked.location_key
+	from 	(
+			select 	location_key,
+				row_number() over (partition by location_id order by location_key) as location_rank
+			from 	police_location_stage
+			where 	is_new
+				and identifier = location_id
+		) ranked
+	where 	ranked.location_rank > 1;
+
+	update 	police_location_stage location
+		join police_location_duplicate duplicate on duplicate.location_key = location.location_key
+	set 	location.identifier = concat(location.location_id, '-', substring(rand(),3));
+
+	insert into place
+		(id, type, identifier, name, longitude, latitude)
+	select	place_id,
+		'police-location',
+		identifier,
+		propercase(ifnull(location_name, '')),
+		location_longitude,
+		location_latitude
+	from 	police_location_stage
+	where 	is_new;
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
+
+-- merges this session's police_crime_stage rows (see post_police_crime)
+drop procedure if exists merge_police_crime_stage;
+//
+create procedure merge_police_crime_stage()
+begin
+	declare l_session_id		int default connection_id();
+	declare l_date_format		varchar(5) default '%Y-%m';
+	declare l_rejected		int default 0;
+	declare l_from			datetime;
+	declare l_to			datetime;
+
+	-- call log('DEBUG : START merge_police_crime_stage');
+
+	update 	police_crime_stage
+	set 	crime_category_code	= lower(trim(crime_category_code)),
+		crime_persistent_id	= trim(crime_persistent_id),
+		location_type		= trim(location_type),
+		location_subtype	= trim(location_subtype),
+		location_id		= trim(location_id),
+		location_name		= trim(location_name),
+		month			= trim(month)
+	where 	session_id = l_session_id;
+
+	delete
+	from 	police_crime_stage
+	where	session_id = l_session_id
+		and (	length(ifnull(crime_category_code, '')) = 0
+			or length(ifnull(month, '')) = 0
+			or (length(ifnull(crime_id, '')) = 0 and length(ifnull(crime_persistent_id, '')) = 0)
+			or convert_string_to_date(month) > now() );
+	set l_rejected = row_count();
+
+	if l_rejected > 0
+	then
+		call log(concat('ERROR: procedure merge_police_crime_stage rejected ', l_rejected, ' crimes without category, month and crime id or persistent id, or dated in the future.'));
+	end if;
+
+	-- fix month in case delivered as yyyy-mm rather than required yyyy-mm-dd
+	update 	police_crime_stage
+	set 	month = if(length(month) = 7, concat(month, '-00'), month),
+		crime_key = if(length(ifnull(crime_persistent_id, '')) > 0, crime_persistent_id, crime_id),
+		location_key = concat_ws('|', location_id, location_latitude, location_longitude)
+	where 	session_id = l_session_id;
+
+	-- only the last copy of a crime in the batch counts (as it would when posted one at a time)
+	delete 	older
+	from 	police_crime_stage older
+		join police_crime_stage newer 	on newer.session_id = older.session_id
+						and newer.crime_key = older.crime_key
+						and newer.stage_id > older.stage_id
+	where 	older.session_id = l_session_id;
+
+	-- log categories
+	drop temporary table if exists police_category_stage;
+	create temporary table police_category_stage
+	(
+		identifier	varchar(100)	character set utf8,
+		category_id	binary(16),
+		primary key (identifier)
+	);
+
+	insert into police_category_stage (identifier)
+	select 	distinct crime_category_code
+	from 	police_crime_stage
+	where 	session_id = l_session_id
+		and category_id is null;
+
+	update 	police_category_stage
+		join category	on category.type = 'police-crime'
+				and category.identifier = police_category_stage.identifier
+	set 	police_category_stage.category_id = category.id;
+
+	update 	police_category_stage
+	set 	category_id = ordered_uuid()
+	where 	category_id is null;
+
+	insert into category
+		(id, type, identifier)
+	select	stage.category_id, 'police-crime', stage.identifier
+	from	police_category_stage stage
+	where	not exists (select 1 from category where category.id = stage.category_id);
+
+	update 	police_crime_stage stage
+		join police_category_stage on police_category_stage.identifier = stage.crime_category_code
+	set 	stage.category_id = police_category_stage.category_id
+	where 	stage.session_id = l_session_id
+		and stage.category_id is null;
+
+	-- log locations (if any)
+	drop temporary table if exists police_location_stage;
+	create temporary table police_location_stage
+	(
+		location_key		varchar(300)	character set utf8,
+		location_id		varchar(100)	character set utf8,
+		location_name		varchar(100)	character set utf8,
+		location_latitude	float,
+		location_longitude	float,
+		identifier		varchar(100)	character set utf8,
+		place_id		binary(16),
+		is_new			boolean		default false,
+		primary key (location_key)
+	);
+
+	insert into police_location_stage
+		(location_key, location_id, location_name, location_latitude, location_longitude)
+	select 	location_key,
+		max(location_id),
+		max(if(location_type = 'BTP', concat(location_name, ' (BTP)'), location_name)),
+		max(location_latitude),
+		max(location_longitude)
+	from 	police_crime_stage
+	where 	session_id = l_session_id
+		and location_id is not null
+		and place_id is null
+	group by location_key;
+
+	call merge_police_locations();
+
+	update 	police_crime_stage stage
+		join police_location_stage on police_location_stage.location_key = stage.location_key
+	set 	stage.place_id = police_location_stage.place_id
+	where 	stage.session_id = l_session_id
+		and stage.place_id is null;
+
+	-- month range of the batch (crimes are dated as convert_string_to_date('YYYY-MM'))
+	select 	convert_string_to_date(min(left(month, 7))),
+		convert_string_to_date(date_format(str_to_date(concat(max(left(month, 7)), '-01'), '%Y-%m-%d') + interval 1 month, '%Y-%m'))
+	into 	l_from, l_to
+	from 	police_crime_stage
+	where 	session_id = l_session_id;
+
+	-- check if crimes already posted; persistent_id first, then crime_id (see post_police_crime)
+	-- each is looked for in the batch's months first, which only reads their event partitions,
+	-- and then anywhere for crimes not found there (new ones, or ones being redated)
+	update 	police_crime_stage stage
+	set 	stage.event_id = (
+			select 	event.id
+			from 	event
+			where 	event.name = stage.crime_persistent_id
+				and event.type = 'police-crime'
+				and event.date_event >= l_from and event.date_event < l_to
+			order by event.timestamp_created desc
+			limit 1)
+	where 	stage.session_id = l_session_id
+		and length(ifnull(stage.crime_persistent_id, '')) > 0;
+
+	update 	police_crime_stage stage
+	set 	stage.event_id = (
+			select 	event.id
+			from 	event
+			where 	event.name = stage.crime_persistent_id
+				and event.type = 'police-crime'
+			order by event.timestamp_created desc
+			limit 1)
+	where 	stage.session_id = l_session_id
+		and stage.event_id is null
+		and length(ifnull(stage.crime_persistent_id, '')) > 0;
+
+	update 	police_crime_stage stage
+	set 	stage.event_id = (
+			select 	event.id
+			from 	event
+			where 	event.identifier = convert(stage.crime_id, char)
+				and event.type = 'police-crime'
+				and event.date_event >= l_from and event.date_event < l_to
+			order by event.timestamp_created desc
+			limit 1)
+	where 	stage.session_id = l_session_id
+		and stage.event_id is null
+		and length(ifnull(stage.crime_id, '')) > 0;
+
+	update 	police_crime_stage stage
+	set 	stage.event_id = (
+			select 	event.id
+			from 	event
+			where 	event.identifier = convert(stage.crime_id, char)
+				and event.type = 'police-crime'
+			order by event.timestamp_created desc
+			limit 1)
+	where 	stage.session_id = l_session_id
+		and stage.event_id is null
+		and length(ifnull(stage.crime_id, '')) > 0;
+
+	-- post new crimes
+	update 	police_crime_stage
+	set 	event_id = ordered_uuid(),
+		is_new = true
+	where 	session_id = l_session_id
+		and event_id is null;
+
+	insert into event
+		(id, type, identifier, name, description, date_event, date_resolution, extension)
+	select	event_id,
+		'police-crime',
+		crime_id,
+		crime_persistent_id,
+		context,
+		convert_string_to_date(month),
+		l_date_format,
+		case
+			when length(ifnull(location_type, '')) > 0 and length(ifnull(location_subtype, '')) > 0
+				then column_create('location_type', location_type, 'location_subtype', location_subtype)
+			when length(ifnull(location_type, '')) > 0
+				then column_create('location_type', location_type)
+			when length(ifnull(location_subtype, '')) > 0
+				then column_create('location_subtype', location_subtype)
+			else null
+		end
+	from 	police_crime_stage
+	where 	session_id = l_session_id
+		and is_new;
+
+	-- note changed months (see police_month_change); existing crimes' (and their outcomes') months before any redating below
+	insert into police_month_change
+		(type, month)
+	select 	type, month
+	from 	(
+			select 	'police-crime' as type, str_to_date(concat(left(stage.month, 7), '-01'), '%Y-%m-%d') as month
+			from 	police_crime_stage stage
+			where 	stage.session_id = l_session_id
+			union
+			select 	'police-crime', crime.event_month
+			from 	police_crime_stage stage
+				join event crime 	on crime.id = stage.event_id
+			where 	stage.session_id = l_session_id
+				and not stage.is_new
+			union
+			select 	'police-crime-outcome', outcome.event_month
+			from 	police_crime_stage stage
+				join relation crime_relation	on crime_relation.major = stage.event_id
+				join event outcome 		on outcome.id = crime_relation.minor
+								and outcome.type = 'police-crime-outcome'
+			where 	stage.session_id = l_session_id
+				and not stage.is_new
+		) changed
+	on duplicate key update
+		timestamp_updated = current_timestamp;
+
+	-- cater for postdated amendments to previously posted crimes
+	update 	event crime
+		join police_crime_stage stage on crime.id = stage.event_id
+	set 	crime.identifier = stage.crime_id
+	where 	stage.session_id = l_session_id
+		and not stage.is_new
+		and length(ifnull(stage.crime_persistent_id, '')) > 0 and stage.crime_persistent_id = crime.name
+		and ifnull(stage.crime_id, 0) > 0 and ifnull(crime.identifier, '') != convert(stage.crime_id, char);
+
+	update 	event crime
+		join police_crime_stage stage on crime.id = stage.event_id
+	set 	crime.description = trim(stage.context)
+	where 	stage.session_id = l_session_id
+		and not stage.is_new
+		and stage.context is not null and ifnull(crime.description, '') != trim(stage.context);
+
+	update 	event crime
+		join police_crime_stage stage on crime.id = stage.event_id
+	set 	crime.date_event = convert_string_to_date(stage.month)
+	where 	stage.session_id = l_session_id
+		and not stage.is_new
+		and ifnull(date_format(crime.date_event, crime.date_resolution), '') != left(stage.month, 7);
+
+	update 	event crime
+		join police_crime_stage stage on crime.id = stage.event_id
+	set 	crime.extension = if(crime.extension is null, column_create('location_type', stage.location_type), column_add(crime.extension, 'location_type', stage.location_type))
+	where 	stage.session_id = l_session_id
+		and not stage.is_new
+		and length(ifnull(stage.location_type, '')) > 0
+		and ifnull(column_get(crime.extension, 'location_type' as char), '') != stage.location_type;
+
+	update 	event crime
+		join police_crime_stage stage on crime.id = stage.event_id
+	set 	crime.extension = if(crime.extension is null, column_create('location_subtype', stage.location_subtype), column_add(crime.extension, 'location_subtype', stage.location_subtype))
+	where 	stage.session_id = l_session_id
+		and not stage.is_new
+		and length(ifnull(stage.location_subtype, '')) > 0
+		and ifnull(column_get(crime.extension, 'location_subtype' as char), '') != stage.location_subtype;
+
+	-- register extension fields used, for create_views
+	insert ignore into extension_key
+		(table_name, type, field)
+	select	distinct 'event', 'police-crime', field.name
+	from 	police_crime_stage stage
+		join (	select 'location_type' as name
+			union all select 'location_subtype') field
+	where 	stage.session_id = l_session_id
+		and length(ifnull(case field.name
+			when 'location_type'	then stage.location_type
+			when 'location_subtype'	then stage.location_subtype
+		end, '')) > 0;
+
+	-- relink crimes whose category or location has changed
+	delete 	relation
+	from 	relation
+		join police_crime_stage stage 	on relation.major = stage.event_id
+		join category 			on category.id = relation.minor and category.type = 'police-crime'
+	where 	stage.session_id = l_session_id
+		and not stage.is_new
+		and relation.minor != stage.category_id;
+
+	delete 	relation
+	from 	relation
+		join police_crime_stage stage 	on relation.major = stage.event_id
+		join place 			on place.id = relation.minor and place.type = 'police-location'
+	where 	stage.session_id = l_session_id
+		and not stage.is_new
+		and stage.place_id is not null
+		and relation.minor != stage.place_id;
+
+	-- link to category and location (if any)
+	insert into relation
+		(type, major, minor)
+	select	distinct 'event.police-crime|category.police-crime', stage.event_id, stage.category_id
+	from 	police_crime_stage stage
+	where 	stage.session_id = l_session_id
+		and stage.category_id is not null
+		and not exists (select 1 from relation where relation.major = stage.event_id and relation.minor = stage.category_id);
+
+	insert into relation
+		(type, major, minor)
+	select	distinct 'event.police-crime|place.police-location', stage.event_id, stage.place_id
+	from 	police_crime_stage stage
+	where 	stage.session_id = l_session_id
+		and stage.place_id is not null
+		and not exists (select 1 from relation where relation.major = stage.event_id and relation.minor = stage.place_id);
+
+	-- return ids resolved here (table, type, identifier, id, longitude, latitude) so the loader can cache them
+	select 	'category', 'police-crime', identifier, hex(category_id), null, null
+	from 	police_category_stage
+	union all
+	select 	'place', 'police-location', location_id, hex(place_id), location_longitude, location_latitude
+	from 	police_location_stage
+	where 	ifnull(identifier, location_id) = location_id;
+
+	delete from police_crime_stage where session_id = l_session_id;
+	drop temporary table if exists police_category_stage;
+	drop temporary table if exists police_location_stage;
+
+	-- call log('DEBUG : END merge_police_crime_stage');
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
+
+-- merges this session's police_outcome_stage rows (see post_police_outcome)
+drop procedure if exists merge_police_outcome_stage;
+//
+create procedure merge_police_outcome_stage()
+begin
+	declare l_session_id		int default connection_id();
+	declare l_date_format		varchar(5) default '%Y-%m';
+	declare l_rejected		int default 0;
+	declare l_missing		int default 0;
+	declare l_from			datetime;
+	declare l_to			datetime;
+	declare l_outcome_from		datetime;
+	declare l_outcome_to		datetime;
+
+	-- call log('DEBUG : START merge_police_outcome_stage');
+
+	update 	police_outcome_stage
+	set 	category_code		= lower(trim(category_code)),
+		category_name		= trim(category_name),
+		crime_category_code	= trim(crime_category_code),
+		crime_persistent_id	= trim(crime_persistent_id),
+		month			= trim(month),
+		crime_month		= trim(crime_month),
+		location_type		= trim(location_type),
+		location_subtype	= trim(location_subtype),
+		location_id		= trim(location_id),
+		location_name		= trim(location_name)
+	where 	session_id = l_session_id;
+
+	delete
+	from 	police_outcome_stage
+	where	session_id = l_session_id
+		and (	(length(ifnull(category_code, '')) = 0 and length(ifnull(category_name, '')) = 0)
+			or length(ifnull(month, '')) = 0
+			or (length(ifnull(crime_id, '')) = 0 and length(ifnull(crime_persistent_id, '')) = 0)
+			or convert_string_to_date(month) > now() );
+	set l_rejected = row_count();
+
+	if l_rejected > 0
+	then
+		call log(concat('ERROR: procedure merge_police_outcome_stage rejected ', l_rejected, ' outcomes without category code or name, a past month and crime id or persistent id.'));
+	end if;
+
+	-- month range of the batch's crimes (as far as known; outcomes usually come after their crimes) and outcomes
+	select 	convert_string_to_date(min(left(ifnull(crime_month, month), 7))),
+		convert_string_to_date(date_format(str_to_date(concat(max(greatest(left(ifnull(crime_month, month), 7), left(month, 7))), '-01'), '%Y-%m-%d') + interval 1 month, '%Y-%m')),
+		convert_string_to_date(min(left(month, 7))),
+		convert_string_to_date(date_format(str_to_date(concat(max(left(month, 7)), '-01'), '%Y-%m-%d') + interval 1 month, '%Y-%m'))
+	into 	l_from, l_to, l_outcome_from, l_outcome_to
+	from 	police_outcome_stage
+	where 	session_id = l_session_id;
+
+	-- find underlying crime records; persistent_id first, then crime_id
+	-- each is looked for in the batch's months first, which only reads their event partitions, and then anywhere for crimes not found there
+	update 	police_outcome_stage stage
+	set 	stage.crime_event_id = (
+			select 	event.id
+			from 	event
+			where 	event.name = stage.crime_persistent_id
+				and event.type = 'police-crime'
+				and event.date_event >= l_from and event.date_event < l_to
+			order by event.timestamp_created desc
+			limit 1)
+	where 	stage.session_id = l_session_id
+		and length(ifnull(stage.crime_persistent_id, '')) > 0;
+
+	update 	police_outcome_stage stage
+	set 	stage.crime_event_id = (
+			select 	event.id
+			from 	event
+			where 	event.name = stage.crime_persistent_id
+				and event.type = 'police-crime'
+			order by event.timestamp_created desc
+			limit 1)
+	where 	stage.session_id = l_session_id
+		and stage.crime_event_id is null
+		and length(ifnull(stage.crime_persistent_id, '')) > 0;
+
+	update 	police_outcome_stage stage
+	set 	stage.crime_event_id = (
+			select 	event.id
+			from 	event
+			where 	event.identifier = convert(stage.crime_id, char)
+				and event.type = 'police-crime'
+				and event.date_event >= l_from and event.date_event < l_to
+			order by event.timestamp_created desc
+			limit 1)
+	where 	stage.session_id = l_session_id
+		and stage.crime_event_id is null
+		and length(ifnull(stage.crime_id, '')) > 0;
+
+	update 	police_outcome_stage stage
+	set 	stage.crime_event_id = (
+			select 	event.id
+			from 	event
+			where 	event.identifier = convert(stage.crime_id, char)
+				and event.type = 'police-crime'
+			order by event.timestamp_created desc
+			limit 1)
+	where 	stage.session_id = l_session_id
+		and stage.crime_event_id is null
+		and length(ifnull(stage.crime_id, '')) > 0;
+
+	-- add crime records (that will, with luck, be updated with the real crime later) for outcomes that arrive before their crimes
+	insert into police_crime_stage
+		(
+			session_id,
+			crime_category_code,
+			crime_id,
+			crime_persistent_id,
+			context,
+			month,
+			location_type,
+			location_subtype,
+			location_id,
+			location_name,
+			location_latitude,
+			location_longitude
+		)
+	select 	l_session_id,
+		if(length(ifnull(crime_category_code, '')) = 0, 'unknown', crime_category_code),
+		crime_id,
+		crime_persistent_id,
+		context,
+		ifnull(crime_month, month),
+		location_type,
+		location_subtype,
+		location_id,
+		location_name,
+		location_latitude,
+		location_longitude
+	from 	police_outcome_stage
+	where 	session_id = l_session_id
+		and crime_event_id is null
+	order by stage_id;
+	set l_missing = row_count();
+
+	if l_missing > 0
+	then
+		call merge_police_crime_stage();
+		call log(concat('WARNING: procedure merge_police_outcome_stage added ', l_missing, ' new crime records.'));
+
+		update 	police_outcome_stage stage
+		set 	stage.crime_event_id = (
+				select 	event.id
+				from 	event
+				where 	event.name = stage.crime_persistent_id
+					and event.type = 'police-crime'
+					and event.date_event >= l_from and event.date_event < l_to
+				order by event.timestamp_created desc
+				limit 1)
+		where 	stage.session_id = l_session_id
+			and stage.crime_event_id is null
+			and length(ifnull(stage.crime_persistent_id, '')) > 0;
+
+		update 	police_outcome_stage stage
+		set 	stage.crime_event_id = (
+				select 	event.id
+				from 	event
+				where 	event.name = stage.crime_persistent_id
+					and event.type = 'police-crime'
+				order by event.timestamp_created desc
+				limit 1)
+		where 	stage.session_id = l_session_id
+			and stage.crime_event_id is null
+			and length(ifnull(stage.crime_persistent_id, '')) > 0;
+
+		update 	police_outcome_stage stage
+		set 	stage.crime_event_id = (
+				select 	event.id
+				from 	event
+				where 	event.identifier = convert(stage.crime_id, char)
+					and event.type = 'police-crime'
+					and event.date_event >= l_from and event.date_event < l_to
+				order by event.timestamp_created desc
+				limit 1)
+		where 	stage.session_id = l_session_id
+			and stage.crime_event_id is null
+			and length(ifnull(stage.crime_id, '')) > 0;
+
+		update 	police_outcome_stage stage
+		set 	stage.crime_event_id = (
+				select 	event.id
+				from 	event
+				where 	event.identifier = convert(stage.crime_id, char)
+					and event.type = 'police-crime'
+				order by event.timestamp_created desc
+				limit 1)
+		where 	stage.session_id = l_session_id
+			and stage.crime_event_id is null
+			and length(ifnull(stage.crime_id, '')) > 0;
+	end if;
+
+	-- set crime_id or persistent_id where one or the other was null, and build the artificial outcome identifier
+	update 	police_outcome_stage stage
+		join event crime on crime.id = stage.crime_event_id
+	set 	stage.crime_identifier = crime.identifier,
+		stage.crime_persistent_id = crime.name,
+		stage.outcome_name = concat( ifnull(crime.identifier, 'NULL'), '-', ifnull(crime.name, 'NULL'), '-', ifnull(stage.category_code, 'NULL'), '-', ifnull(stage.month, 'NULL') ),
+		stage.outcome_identifier = md5(concat( ifnull(crime.identifier, 'NULL'), '-', ifnull(crime.name, 'NULL'), '-', ifnull(stage.category_code, 'NULL'), '-', ifnull(stage.month, 'NULL') ))
+	where 	stage.session_id = l_session_id;
+
+	delete from police_outcome_stage where session_id = l_session_id and crime_event_id is null;
+
+	-- post categories if not already there
+	update 	police_outcome_stage stage
+	set 	stage.category_id = (
+			select 	category.id
+			from 	category
+			where 	category.type = 'police-crime-outcome'
+				and (category.identifier = stage.category_code or category.name = stage.category_name)
+			limit 1)
+	where 	stage.session_id = l_session_id;
+
+	drop temporary table if exists police_category_stage;
+	create temporary table police_category_stage
+	(
+		identifier	varchar(100)	character set utf8,
+		name		varchar(100)	character set utf8,
+		category_id	binary(16)
+	);
+
+	insert into police_category_stage (identifier, name)
+	select 	category_code, max(category_name)
+	from 	police_outcome_stage
+	where 	session_id = l_session_id
+		and category_id is null
+	group by category_code, if(length(ifnull(category_code, '')) = 0, category_name, null);
+
+	update 	police_category_stage
+	set 	category_id = ordered_uuid();
+
+	insert into category
+		(id, type, identifier, name)
+	select	category_id, 'police-crime-outcome', identifier, name
+	from	police_category_stage;
+
+	update 	police_outcome_stage stage
+		join police_category_stage 	on police_category_stage.identifier = stage.category_code
+						or (length(ifnull(stage.category_code, '')) = 0 and police_category_stage.name = stage.category_name)
+	set 	stage.category_id = police_category_stage.category_id
+	where 	stage.session_id = l_session_id
+		and stage.category_id is null;
+
+	-- check if outcomes of these crimes have already been logged for the month
+	-- (the identifier includes the month, so only the batch's months need be read)
+	update 	police_outcome_stage stage
+	set 	stage.event_id = (
+			select 	event.id
+			from 	event
+			where 	event.type = 'police-crime-outcome'
+				and event.identifier = stage.outcome_identifier
+				and event.date_event >= l_outcome_from and event.date_event < l_outcome_to
+			limit 1)
+	where 	stage.session_id = l_session_id;
+
+	-- post new outcomes (once each, however many times they are staged)
+	drop temporary table if exists police_event_stage;
+	create temporary table police_event_stage
+	(
+		identifier	char(32)	character set utf8,
+		event_id	binary(16),
+		primary key (identifier)
+	);
+
+	insert into police_event_stage (identifier)
+	select 	distinct outcome_identifier
+	from 	police_outcome_stage
+	where 	session_id = l_session_id
+		and event_id is null;
+
+	update 	police_event_stage
+	set 	event_id = ordered_uuid();
+
+	update 	police_outcome_stage stage
+		join police_event_stage on police_event_stage.identifier = stage.outcome_identifier
+	set 	stage.event_id = police_event_stage.event_id
+	where 	stage.session_id = l_session_id
+		and stage.event_id is null;
+
+	insert into event
+		(id, type, identifier, name, date_event, date_resolution)
+	select 	stage.event_id,
+		'police-crime-outcome',
+		stage.outcome_identifier,
+		max(stage.outcome_name),
+		convert_string_to_date(max(stage.month)),
+		l_date_format
+	from 	police_outcome_stage stage
+		join police_event_stage on police_event_stage.event_id = stage.event_id
+	where 	stage.session_id = l_session_id
+	group by stage.event_id, stage.outcome_identifier;
+
+	-- link to crime and category records
+	insert into relation
+		(type, major, minor)
+	select	distinct 'event.police-crime|event.police-crime-outcome', stage.crime_event_id, stage.event_id
+	from 	police_outcome_stage stage
+	where 	stage.session_id = l_session_id
+		and not exists (select 1 from relation where relation.major = stage.crime_event_id and relation.minor = stage.event_id);
+
+	insert into relation
+		(type, major, minor)
+	select	distinct 'event.police-crime-outcome|category.police-crime-outcome', stage.event_id, stage.category_id
+	from 	police_outcome_stage stage
+	where 	stage.session_id = l_session_id
+		and stage.category_id is not null
+		and not exists (select 1 from relation where relation.major = stage.event_id and relation.minor = stage.category_id);
+
+	-- outcome events come from police api crime records (without persons) or from outcome records (with persons)
+	update 	police_outcome_stage stage
+	set 	stage.person_id = (
+			select 	person.id
+			from 	person
+			where 	person.identifier = convert(stage.person_identifier, char)
+				and person.type = 'police-criminal'
+			limit 1)
+	where 	stage.session_id = l_session_id
+		and stage.person_identifier is not null;
+
+	drop temporary table if exists police_person_stage;
+	create temporary table police_person_stage
+	(
+		identifier	varchar(100)	character set utf8,
+		person_id	binary(16),
+		primary key (identifier)
+	);
+
+	insert into police_person_stage (identifier)
+	select 	distinct convert(person_identifier, char)
+	from 	police_outcome_stage
+	where 	session_id = l_session_id
+		and person_identifier is not null
+		and person_id is null;
+
+	update 	police_person_stage
+	set 	person_id = ordered_uuid();
+
+	insert into person
+		(id, type, identifier)
+	select	person_id, 'police-criminal', identifier
+	from	police_person_stage;
+
+	update 	police_outcome_stage stage
+		join police_person_stage on police_person_stage.identifier = convert(stage.person_identifier, char)
+	set 	stage.person_id = police_person_stage.person_id
+	where 	stage.session_id = l_session_id
+		and stage.person_id is null;
+
+	-- link persons to outcome and crime (possibly redundant)
+	insert into relation
+		(type, major, minor)
+	select	distinct 'person.police-criminal|event.police-crime-outcome', stage.person_id, stage.event_id
+	from 	police_outcome_stage stage
+	where 	stage.session_id = l_session_id
+		and stage.person_id is not null
+		and not exists (select 1 from relation where relation.major = stage.person_id and relation.minor = stage.event_id);
+
+	insert into relation
+		(type, major, minor)
+	select	distinct 'person.police-criminal|event.police-crime', stage.person_id, stage.crime_event_id
+	from 	police_outcome_stage stage
+	where 	stage.session_id = l_session_id
+		and stage.person_id is not null
+		and not exists (select 1 from relation where relation.major = stage.person_id and relation.minor = stage.crime_event_id);
+
+	-- note changed months of outcomes and their crimes (see police_month_change)
+	insert into police_month_change
+		(type, month)
+	select 	type, month
+	from 	(
+			select 	'police-crime-outcome' as type, str_to_date(concat(left(stage.month, 7), '-01'), '%Y-%m-%d') as month
+			from 	police_outcome_stage stage
+			where 	stage.session_id = l_session_id
+			union
+			select 	'police-crime', crime.event_month
+			from 	police_outcome_stage stage
+				join event crime 	on crime.id = stage.crime_event_id
+			where 	stage.session_id = l_session_id
+		) changed
+	on duplicate key update
+		timestamp_updated = current_timestamp;
+
+	delete from police_outcome_stage where session_id = l_session_id;
+	drop temporary table if exists police_category_stage;
+	drop temporary table if exists police_event_stage;
+	drop temporary table if exists police_person_stage;
+
+	-- call log('DEBUG : END merge_police_outcome_stage');
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
+
+-- merges this session's police_stop_stage rows (see post_police_stop)
+drop procedure if exists merge_police_stop_stage;
+//
+create procedure merge_police_stop_stage()
+begin
+	declare l_session_id		int default connection_id();
+	declare l_date_format		varchar(20) default '%Y-%m-%dT%H:%i:%s'; -- '2015-03-04T11:12:22'
+	declare l_rejected		int default 0;
+	declare l_from			datetime;
+	declare l_to			datetime;
+
+	-- call log('DEBUG : START merge_police_stop_stage');
+
+	update 	police_stop_stage
+	set 	datetime				= trim(datetime),
+		outcome_linked_to_object_of_search	= trim(outcome_linked_to_object_of_search),
+		stop_type				= lower(trim(stop_type)),
+		operation				= lower(trim(operation)),
+		object_of_search			= lower(trim(object_of_search)),
+		operation_name				= lower(trim(operation_name)),
+		removal_of_more_than_outer_clothing	= lower(trim(removal_of_more_than_outer_clothing)),
+		outcome					= lower(trim(outcome)),
+		legislation				= lower(trim(legislation)),
+		involved_person				= lower(trim(involved_person)),
+		location_id				= trim(location_id),
+		location_name				= trim(location_name),
+		gender					= lower(ifnull(trim(gender), 'unknown')),
+		self_defined_ethnicity			= lower(ifnull(trim(self_defined_ethnicity), 'unknown')),
+		officer_defined_ethnicity		= lower(ifnull(trim(officer_defined_ethnicity), 'unknown')),
+		age_range				= lower(ifnull(trim(age_range), 'unknown'))
+	where 	session_id = l_session_id;
+
+	delete
+	from 	police_stop_stage
+	where	session_id = l_session_id
+		and (	length(ifnull(stop_type, '')) = 0
+			or length(ifnull(datetime, '')) = 0
+			or length(ifnull(location_id, '')) = 0
+			or str_to_date(datetime, l_date_format) > now() );
+	set l_rejected = row_count();
+
+	if l_rejected > 0
+	then
+		call log(concat('ERROR: procedure merge_police_stop_stage rejected ', l_rejected, ' stops without stop type, datetime and location_id, or dated in the future.'));
+	end if;
+
+	-- artificial (person and event) identifiers (checksums intended to be unique for the given variables)
+	update 	police_stop_stage
+	set 	location_key = concat_ws('|', location_id, location_latitude, location_longitude),
+		person_name = if(involved_person = 'true' or involved_person = '1',
+				concat( ifnull(gender, 'NULL'), '-', ifnull(age_range, 'NULL'), '-', ifnull(officer_defined_ethnicity, 'NULL'), '-', ifnull(self_defined_ethnicity, 'NULL'), '-', ifnull(location_id, 'NULL') ),
+				null),
+		stop_name = concat( 	ifnull(stop_type, 'NULL'), '-',
+					ifnull(location_id, 'NULL'), '-',
+					ifnull(datetime, 'NULL'), '-',
+					ifnull(operation_name, 'NULL') , '-',
+					ifnull(legislation, 'NULL'), '-',
+					ifnull(object_of_search, 'NULL'), '-',
+					ifnull(outcome_linked_to_object_of_search, 'NULL'), '-',
+					ifnull(involved_person, 'NULL'), '-',
+					ifnull(removal_of_more_than_outer_clothing, 'NULL')
+				)
+	where 	session_id = l_session_id;
+
+	update 	police_stop_stage
+	set 	person_identifier = md5(person_name),
+		stop_identifier = md5(stop_name)
+	where 	session_id = l_session_id;
+
+	-- log categories
+	drop temporary table if exists police_category_stage;
+	create temporary table police_category_stage
+	(
+		name		varchar(100)	character set utf8,
+		category_id	binary(16),
+		primary key (name)
+	);
+
+	insert into police_category_stage (name)
+	select 	distinct stop_type
+	from 	police_stop_stage
+	where 	session_id = l_session_id;
+
+	update 	police_category_stage stage
+	set 	stage.category_id = (
+			select 	category.id
+			from 	category
+			where 	category.type = 'police-stop'
+				and lower(category.name) = stage.name
+			limit 1);
+
+	update 	police_category_stage
+	set 	category_id = ordered_uuid()
+	where 	category_id is null;
+
+	insert into category
+		(id, type, name)
+	select	stage.category_id, 'police-stop', stage.name
+	from	police_category_stage stage
+	where	not exists (select 1 from category where category.id = stage.category_id);
+
+	update 	police_stop_stage stage
+		join police_category_stage on police_category_stage.name = stage.stop_type
+	set 	stage.category_id = police_category_stage.category_id
+	where 	stage.session_id = l_session_id;
+
+	-- log locations
+	drop temporary table if exists police_location_stage;
+	create temporary table police_location_stage
+	(
+		location_key		varchar(300)	character set utf8,
+		location_id		varchar(100)	character set utf8,
+		location_name		varchar(100)	character set utf8,
+		location_latitude	float,
+		location_longitude	float,
+		identifier		varchar(100)	character set utf8,
+		place_id		binary(16),
+		is_new			boolean		default false,
+		primary key (location_key)
+	);
+
+	insert into police_location_stage
+		(location_key, location_id, location_name, location_latitude, location_longitude)
+	select 	location_key,
+		max(location_id),
+		max(location_name),
+		max(location_latitude),
+		max(location_longitude)
+	from 	police_stop_stage
+	where 	session_id = l_session_id
+		and place_id is null
+	group by location_key;
+
+	call merge_police_locations();
+
+	update 	police_stop_stage stage
+		join police_location_stage on police_location_stage.location_key = stage.location_key
+	set 	stage.place_id = police_location_stage.place_id
+	where 	stage.session_id = l_session_id
+		and stage.place_id is null;
+
+	-- log persons
+	update 	police_stop_stage stage
+	set 	stage.person_id = (
+			select 	person.id
+			from 	person
+			where 	person.identifier = stage.person_identifier
+				and person.type = 'police-stop'
+			order by ifnull(person.timestamp_updated, person.timestamp_created) desc
+			limit 1)
+	where 	stage.session_id = l_session_id
+		and stage.person_identifier is not null;
+
+	drop temporary table if exists police_person_stage;
+	create temporary table police_person_stage
+	(
+		identifier	char(32)	character set utf8,
+		person_id	binary(16),
+		primary key (identifier)
+	);
+
+	insert into police_person_stage (identifier)
+	select 	distinct person_identifier
+	from 	police_stop_stage
+	where 	session_id = l_session_id
+		and person_identifier is not null
+		and person_id is null;
+
+	update 	police_person_stage
+	set 	person_id = ordered_uuid();
+
+	update 	police_stop_stage stage
+		join police_person_stage on police_person_stage.identifier = stage.person_identifier
+	set 	stage.person_id = police_person_stage.person_id
+	where 	stage.session_id = l_session_id
+		and stage.person_id is null;
+
+	insert into person
+		(id, type, identifier, description, gender, extension)
+	select	stage.person_id,
+		'police-stop',
+		stage.person_identifier,
+		max(stage.person_name),
+		upper(substring(max(stage.gender),1,1)),
+		column_create(
+			'self_defined_ethnicity', max(stage.self_defined_ethnicity),
+			'officer_defined_ethnicity', max(stage.officer_defined_ethnicity),
+			'age_range', max(stage.age_range) )
+	from 	police_stop_stage stage
+		join police_person_stage on police_person_stage.person_id = stage.person_id
+	where 	stage.session_id = l_session_id
+	group by stage.person_id, stage.person_identifier;
+
+	insert ignore into extension_key
+		(table_name, type, field)
+	select	distinct 'person', 'police-stop', field.name
+	from 	police_stop_stage stage
+		join police_person_stage on police_person_stage.person_id = stage.person_id
+		join (	select 'self_defined_ethnicity' as name
+			union all select 'officer_defined_ethnicity'
+			union all select 'age_range') field
+	where 	stage.session_id = l_session_id
+		and length(ifnull(case field.name
+			when 'self_defined_ethnicity'		then stage.self_defined_ethnicity
+			when 'officer_defined_ethnicity'	then stage.officer_defined_ethnicity
+			when 'age_range'			then stage.age_range
+		end, '')) > 0;
+
+	-- time range of the batch
+	select 	min(str_to_date(datetime, l_date_format)), max(str_to_date(datetime, l_date_format))
+	into 	l_from, l_to
+	from 	police_stop_stage
+	where 	session_id = l_session_id;
+
+	-- check if stops already logged
+	-- (the identifier includes the stop time, so only the batch's time range, and its event partitions, need be read)
+	update 	police_stop_stage stage
+	set 	stage.event_id = (
+			select 	event.id
+			from 	event
+			where	event.identifier = stage.stop_identifier
+				and event.type = 'police-stop'
+				and event.date_event between l_from and l_to
+			order by event.timestamp_created desc
+			limit 1)
+	where 	stage.session_id = l_session_id;
+
+	-- post new stops (once each, however many times they are staged)
+	drop temporary table if exists police_event_stage;
+	create temporary table police_event_stage
+	(
+		identifier	char(32)	character set utf8,
+		event_id	binary(16),
+		primary key (identifier)
+	);
+
+	insert into police_event_stage (identifier)
+	select 	distinct stop_identifier
+	from 	police_stop_stage
+	where 	session_id = l_session_id
+		and event_id is null;
+
+	update 	police_event_stage
+	set 	event_id = ordered_uuid();
+
+	update 	police_stop_stage stage
+		join police_event_stage on police_event_stage.identifier = stage.stop_identifier
+	set 	stage.event_id = police_event_stage.event_id
+	where 	stage.session_id = l_session_id
+		and stage.event_id is null;
+
+	insert into event
+		(id, type, identifier, name, description, date_event, date_resolution)
+	select 	stage.event_id,
+		'police-stop',
+		stage.stop_identifier,
+		max(stage.stop_name),
+		max(stage.legislation),
+		str_to_date(max(stage.datetime), l_date_format),
+		l_date_format
+	from 	police_stop_stage stage
+		join police_event_stage on police_event_stage.event_id = stage.event_id
+	where 	stage.session_id = l_session_id
+	group by stage.event_id, stage.stop_identifier;
+
+	-- post stop extensions
+	update 	event stop
+		join (
+			select 	stage.event_id,
+				max(nullif(stage.outcome_linked_to_object_of_search, '')) 	as outcome_linked_to_object_of_search,
+				max(nullif(stage.operation, '')) 				as operation,
+				max(nullif(stage.object_of_search, '')) 			as object_of_search,
+				max(nullif(stage.operation_name, '')) 				as operation_name,
+				max(nullif(stage.removal_of_more_than_outer_clothing, '')) 	as removal_of_more_than_outer_clothing,
+				max(nullif(stage.outcome, '')) 					as outcome,
+				max(nullif(stage.involved_person, '')) 				as involved_person
+			from 	police_stop_stage stage
+				join police_event_stage on police_event_stage.event_id = stage.event_id
+			where 	stage.session_id = l_session_id
+			group by stage.event_id
+		) new_stop on new_stop.event_id = stop.id
+	set 	stop.extension = column_add(
+				column_create('involved_person', new_stop.involved_person),
+				'outcome_linked_to_object_of_search', 	new_stop.outcome_linked_to_object_of_search,
+				'operation', 				new_stop.operation,
+				'object_of_search', 			new_stop.object_of_search,
+				'operation_name', 			new_stop.operation_name,
+				'removal_of_more_than_outer_clothing', 	new_stop.removal_of_more_than_outer_clothing,
+				'outcome', 				new_stop.outcome
+			);
+
+	insert ignore into extension_key
+		(table_name, type, field)
+	select	distinct 'event', 'police-stop', field.name
+	from 	police_stop_stage stage
+		join police_event_stage on police_event_stage.event_id = stage.event_id
+		join (	select 'outcome_linked_to_object_of_search' as name
+			union all select 'operation'
+			union all select 'object_of_search'
+			union all select 'operation_name'
+			union all select 'removal_of_more_than_outer_clothing'
+			union all select 'outcome'
+			union all select 'involved_person') field
+	where 	stage.session_id = l_session_id
+		and length(ifnull(case field.name
+			when 'outcome_linked_to_object_of_search'	then stage.outcome_linked_to_object_of_search
+			when 'operation'				then stage.operation
+			when 'object_of_search'				then stage.object_of_search
+			when 'operation_name'				then stage.operation_name
+			when 'removal_of_more_than_outer_clothing'	then stage.removal_of_more_than_outer_clothing
+			when 'outcome'					then stage.outcome
+			when 'involved_person'				then stage.involved_person
+		end, '')) > 0;
+
+	-- link to category, location and person (if any)
+	insert into relation
+		(type, major, minor)
+	select	distinct 'event.police-stop|category.police-stop', stage.event_id, stage.category_id
+	from 	police_stop_stage stage
+	where 	stage.session_id = l_session_id
+		and stage.category_id is not null
+		and not exists (select 1 from relation where relation.major = stage.event_id and relation.minor = stage.category_id);
+
+	insert into relation
+		(type, major, minor)
+	select	distinct 'event.police-stop|place.police-location', stage.event_id, stage.place_id
+	from 	police_stop_stage stage
+	where 	stage.session_id = l_session_id
+		and stage.place_id is not null
+		and not exists (select 1 from relation where relation.major = stage.event_id and relation.minor = stage.place_id);
+
+	insert into relation
+		(type, major, minor)
+	select	distinct 'person.police-stop|event.police-stop', stage.person_id, stage.event_id
+	from 	police_stop_stage stage
+	where 	stage.session_id = l_session_id
+		and stage.person_id is not null
+		and not exists (select 1 from relation where relation.major = stage.person_id and relation.minor = stage.event_id);
+
+	-- return ids resolved here (table, type, identifier, id, longitude, latitude) so the loader can cache them
+	select 	'place', 'police-location', location_id, hex(place_id), location_longitude, location_latitude
+	from 	police_location_stage
+	where 	ifnull(identifier, location_id) = location_id;
+
+	-- note changed months (see police_month_change)
+	insert into police_month_change
+		(type, month)
+	select 	distinct 'police-stop', str_to_date(concat(left(stage.datetime, 7), '-01'), '%Y-%m-%d')
+	from 	police_stop_stage stage
+	where 	stage.session_id = l_session_id
+	on duplicate key update
+		timestamp_updated = current_timestamp;
+
+	delete from police_stop_stage where session_id = l_session_id;
+	drop temporary table if exists police_category_stage;
+	drop temporary table if exists police_location_stage;
+	drop temporary table if exists police_person_stage;
+	drop temporary table if exists police_event_stage;
+
+	-- call log('DEBUG : END merge_police_stop_stage');
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
+
+-- POLICE LOAD TRACKING --
+
+-- checksum of the police API payload last loaded for each region, dataset and month
+-- lets load-police-data.py skip months that havent changed since the last load, and write only the batches of records from the first changed one on
+-- xdrop table if exists police_load_digest;
+-- //
+create table if not exists police_load_digest
+(
+	region			varchar(250)	character set utf8 not null,	-- place.name
+	dataset			varchar(50)	character set utf8 not null,	-- 'categories', 'crimes', 'outcomes' or 'stops'
+	month			char(7)		character set utf8 not null,	-- 'YYYY-MM'
+	digest			char(40)	character set utf8 not null,	-- sha1 of payload records
+	records			int,
+	batches			text		character set utf8,		-- comma separated sha1 of each batch of payload records (see load-police-data.py digest_batch)
+	logdate 		timestamp 	default current_timestamp on update current_timestamp,
+	primary key (region, dataset, month)
+);
+//
+set @table_count = ifnull(@table_count,0) + 1;
+//
+
+-- returns checksum of police API payload last loaded for region, dataset and month (null if never loaded)
+drop function if exists get_police_load_digest;
+//
+create function get_police_load_digest
+(
+	p_region	varchar(250),
+	p_dataset	varchar(50),
+	p_month		varchar(10)
+)
+returns char(40)
+begin
+	declare l_digest	char(40) default null;
+
+	select 	digest
+	into 	l_digest
+	from 	police_load_digest
+	where 	region = trim(p_region)
+		and dataset = trim(p_dataset)
+		and month = left(trim(p_month), 7);
+
+	return l_digest;
+end;
+//
+set @function_count = ifnull(@function_count,0) + 1;
+//
+
+-- returns comma separated checksums of each batch of the police API payload last loaded for region, dataset and month (null if never loaded)
+drop function if exists get_police_load_batches;
+//
+create function get_police_load_batches
+(
+	p_region	varchar(250),
+	p_dataset	varchar(50),
+	p_month		varchar(10)
+)
+returns text
+begin
+	declare l_batches	text default null;
+
+	select 	batches
+	into 	l_batches
+	from 	police_load_digest
+	where 	region = trim(p_region)
+		and dataset = trim(p_dataset)
+		and month = left(trim(p_month), 7);
+
+	return l_batches;
+end;
+//
+set @function_count = ifnull(@function_count,0) + 1;
+//
 
-			if p_age_range is not null and length(p_age_range) > 0 
-			then
-				set l_extension = post_extension(l_person_id, 'age_range', p_age_range);
-			end if;
+-- records checksum (and batch checksums) of police API payload loaded for region, dataset and month (replacing any previous one)
+drop procedure if exists put_police_load_digest;
+//
+create procedure put_police_load_digest
+(
+	p_region	varchar(250),
+	p_dataset	varchar(50),
+	p_month		varchar(10),
+	p_digest	char(40),
+	p_records	int,
+	p_batches	text
+)
+begin
+	if 	p_region is null
+		or p_dataset is null
+		or p_month is null
+		or p_digest is null
+	then
+		call log('ERROR: procedure put_police_load_digest requires non-null region, dataset, month and digest');
+	else
+		insert into police_load_digest
+			(region, dataset, month, digest, records, batches)
+		values
+			(trim(p_region), trim(p_dataset), left(trim(p_month), 7), trim(p_digest), p_records, p_batches)
+		on duplicate key update
+			digest = values(digest),
+			records = values(records),
+			batches = values(batches);
+	end if;
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
 
-		end if;
+-- one row per load-police-data.py run; totals plus the full JSON summary (police API and database timings, and each dataset and month loaded)
+-- xdrop table if exists load_run;
+-- //
+create table if not exists load_run
+(
+	id			int		not null auto_increment,
+	region			varchar(250)	character set utf8 not null,	-- place.name
+	session_id		int,						-- connection id of loading session
+	started			datetime	not null,
+	finished		datetime,
+	status			varchar(20)	character set utf8,		-- 'complete' or 'failed' (some step failed)
+	steps			int,
+	failed_steps		int,
+	records			int,
+	http_requests		int,
+	http_retries		int,
+	http_bytes		bigint,
+	http_seconds		float,
+	db_calls		int,
+	db_seconds		float,
+	summary			longtext	character set utf8,		-- JSON
+	logdate 		timestamp 	default current_timestamp,
+	primary key (id),
+	index (region, started)
+);
+//
+set @table_count = ifnull(@table_count,0) + 1;
+//
 
+-- records a load-police-data.py run, taking its totals from the JSON summary
+drop procedure if exists post_load_run;
+//
+create procedure post_load_run
+(
+	p_region	varchar(250),
+	p_session_id	int,
+	p_started	varchar(30),
+	p_finished	varchar(30),
+	p_status	varchar(20),
+	p_summary	longtext
+)
+begin
+	if 	p_region is null
+		or p_started is null
+		or p_summary is null
+		or not json_valid(p_summary)
+	then
+		call log('ERROR: procedure post_load_run requires non-null region, start time and JSON summary');
+	else
+		insert into load_run
+			(region, session_id, started, finished, status, steps, failed_steps, records,
+			http_requests, http_retries, http_bytes, http_seconds, db_calls, db_seconds, summary)
+		values
+			(
+				trim(p_region),
+				p_session_id,
+				p_started,
+				p_finished,
+				p_status,
+				json_value(p_summary, '$.totals.steps'),
+				json_value(p_summary, '$.totals.failed_steps'),
+				json_value(p_summary, '$.totals.records'),
+				json_value(p_summary, '$.totals.http_requests'),
+				json_value(p_summary, '$.totals.http_retries'),
+				json_value(p_summary, '$.totals.http_bytes'),
+				json_value(p_summary, '$.totals.http_seconds'),
+				json_value(p_summary, '$.totals.db_calls'),
+				json_value(p_summary, '$.totals.db_seconds'),
+				p_summary
+			);
 	end if;
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
 
-	-- artificial (event) identifier (a checksum intended to be unique for the given variables)
-	-- ?cant do this - can have 1+ stops at the same place, same time, same reason (ie 2 ppl stopped at once)
-	set l_identifier = concat( 	ifnull(p_stop_type, 'NULL'), '-', 
-					ifnull(p_location_id, 'NULL'), '-', 
-					ifnull(p_datetime, 'NULL'), '-', 
-					ifnull(p_operation_name, 'NULL') , '-', 
-					ifnull(p_legislation, 'NULL'), '-', 
-					ifnull(p_object_of_search, 'NULL'), '-', 
-					ifnull(p_outcome_linked_to_object_of_search, 'NULL'), '-', 
-					ifnull(p_involved_person, 'NULL'), '-', 
-					ifnull(p_removal_of_more_than_outer_clothing, 'NULL')
-				);
+-- load lease for each region; held by one load-police-data.py run at a time, and renewed as it goes
+-- a run that dies stops renewing, so its lease expires and the next run takes it over (no variable to delete by hand)
+-- xdrop table if exists load_lease;
+-- //
+create table if not exists load_lease
+(
+	name			varchar(250)	character set utf8 not null,	-- eg 'police-data-load:Reading Borough'
+	holder			varchar(100)	character set utf8 not null,	-- host, process and connection id of holding run
+	status			varchar(250)	character set utf8,		-- progress of holding run
+	acquired		datetime	not null,
+	renewed			datetime	not null,
+	expires			datetime	not null,
+	primary key (name)
+);
+//
+set @table_count = ifnull(@table_count,0) + 1;
+//
 
-	-- check if stop already logged
-	-- bit of a guess this; it's not easy to identify a unique stop, but we want to avoid adding duplicates!
-	select 	distinct 
-		hex(id)
-	into 	l_stop_event_id
-	from 	event
-	where	identifier = md5(l_identifier)
-	and	type = 'police-stop'
-	order by timestamp_created desc
-	limit 1;
+-- takes lease for p_seconds if free, expired or already held by holder; returns true if holder now holds it
+drop function if exists acquire_load_lease;
+//
+create function acquire_load_lease
+(
+	p_name		varchar(250),
+	p_holder	varchar(100),
+	p_seconds	int
+)
+returns boolean
+begin
+	declare l_holder	varchar(100) default null;
 
-	if l_stop_event_id is null
+	if 	p_name is null
+		or p_holder is null
+		or ifnull(p_seconds, 0) <= 0
 	then
-		-- post stop record
-		set l_stop_event_id = post_event(
-				'police-stop',
-				md5(l_identifier),
-				l_identifier,
-				p_legislation,
-				str_to_date(p_datetime, l_date_format),
-				l_date_format
-				);
+		call log('ERROR: function acquire_load_lease requires non-null name, holder and a lease time above 0');
+		return false;
+	end if;
 
-		-- post stop extensions
-		if p_outcome_linked_to_object_of_search is not null and length(p_outcome_linked_to_object_of_search) > 0 
-		then
-			set l_extension = post_extension(l_stop_event_id, 'outcome_linked_to_object_of_search', p_outcome_linked_to_object_of_search);
-		end if;
+	-- one statement, so two runs cant both find the lease free and both take it
+	-- assignments apply in order and see earlier ones, so holder and expires (which the condition reads) are set last
+	insert into load_lease
+		(name, holder, status, acquired, renewed, expires)
+	values
+		(trim(p_name), trim(p_holder), 'started', now(), now(), now() + interval p_seconds second)
+	on duplicate key update
+		status = if(holder = values(holder) or expires < now(), values(status), status),
+		acquired = if(holder = values(holder) or expires < now(), values(acquired), acquired),
+		renewed = if(holder = values(holder) or expires < now(), values(renewed), renewed),
+		holder = if(holder = values(holder) or expires < now(), values(holder), holder),
+		expires = if(holder = values(holder) or expires < now(), values(expires), expires);
+
+	select 	holder
+	into 	l_holder
+	from 	load_lease
+	where 	name = trim(p_name);
+
+	return ifnull(l_holder = trim(p_holder), false);
+end;
+//
+set @function_count = ifnull(@function_count,0) + 1;
+//
 
-		if p_operation is not null and length(p_operation) > 0 
-		then
-			set l_extension = post_extension(l_stop_event_id, 'operation', p_operation);
-		end if;
+-- extends lease held by holder for another p_seconds and records its progress; returns false if holder no longer holds it
+drop function if exists renew_load_lease;
+//
+create function renew_load_lease
+(
+	p_name		varchar(250),
+	p_holder	varchar(100),
+	p_seconds	int,
+	p_status	varchar(250)
+)
+returns boolean
+begin
+	declare l_holder	varchar(100) default null;
 
-		if p_object_of_search is not null and length(p_object_of_search) > 0 
-		then
-			set l_extension = post_extension(l_stop_event_id, 'object_of_search', p_object_of_search);
-		end if;
+	update	load_lease
+	set	status = ifnull(trim(p_status), status),
+		renewed = now(),
+		expires = now() + interval p_seconds second
+	where	name = trim(p_name)
+		and holder = trim(p_holder);
 
-		if p_operation_name is not null and length(p_operation_name) > 0 
-		then	
-			set l_extension = post_extension(l_stop_event_id, 'operation_name', p_operation_name);
-		end if;
+	select 	holder
+	into 	l_holder
+	from 	load_lease
+	where 	name = trim(p_name);
 
-		if p_removal_of_more_than_outer_clothing is not null and length(p_removal_of_more_than_outer_clothing) > 0 
-		then
-			set l_extension = post_extension(l_stop_event_id, 'removal_of_more_than_outer_clothing', p_removal_of_more_than_outer_clothing);
-		end if;
+	return ifnull(l_holder = trim(p_holder), false);
+end;
+//
+set @function_count = ifnull(@function_count,0) + 1;
+//
 
-		if p_outcome is not null and length(p_outcome) > 0 
-		then
-			set l_extension = post_extension(l_stop_event_id, 'outcome', p_outcome);
-		end if;
+-- gives up lease (does nothing if holder no longer holds it)
+drop procedure if exists release_load_lease;
+//
+create procedure release_load_lease
+(
+	p_name		varchar(250),
+	p_holder	varchar(100)
+)
+begin
+	delete from	load_lease
+	where		name = trim(p_name)
+			and holder = trim(p_holder);
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
 
-		if p_involved_person is not null and length(p_involved_person) > 0 
-		then
-			set l_extension = post_extension(l_stop_event_id, 'involved_person', p_involved_person);
-		end if;
+-- one row per (region, dataset, month) step of the latest load-police-data.py run of each region and source
+-- a run that stops part way leaves steps that arent 'complete'; the next run resumes with just those
+-- xdrop table if exists load_job;
+-- //
+create table if not exists load_job
+(
+	region			varchar(250)	character set utf8 not null,	-- place.name (each region loaded together has its own steps)
+	source			varchar(20)	character set utf8 not null,	-- 'api' or 'archive'
+	dataset			varchar(50)	character set utf8 not null,	-- 'categories', 'crimes', 'outcomes' or 'stops'
+	month			char(7)		character set utf8 not null,	-- 'YYYY-MM'
+	status			varchar(20)	character set utf8 not null,	-- 'pending', 'running', 'complete' or 'failed'
+	attempts		int		not null default 0,
+	records			int,
+	queued			datetime	not null,
+	started			datetime,
+	finished		datetime,
+	logdate 		timestamp 	default current_timestamp on update current_timestamp,
+	primary key (region, source, dataset, month),
+	index (region, source, status)
+);
+//
+set @table_count = ifnull(@table_count,0) + 1;
+//
 
-		-- link to category
-		if not exists_relation (null, l_stop_event_id, l_stop_category_id)
-		then
-			set l_relation = post_relation(null, l_stop_event_id, l_stop_category_id);
-		end if;
+-- clears steps of region and source, before a run queues its steps afresh
+drop procedure if exists delete_load_jobs;
+//
+create procedure delete_load_jobs
+(
+	p_region	varchar(250),
+	p_source	varchar(20)
+)
+begin
+	delete from	load_job
+	where		region = trim(p_region)
+			and source = trim(p_source);
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
 
-		-- link to location (if any)
-		if p_location_id is not null and not exists_relation (null, l_stop_event_id, l_place_id)
-		then
-			set l_relation = post_relation(null, l_stop_event_id, l_place_id);
-		end if;
+-- queues step of region and source as 'pending' (requeueing it if already there)
+drop procedure if exists post_load_job;
+//
+create procedure post_load_job
+(
+	p_region	varchar(250),
+	p_source	varchar(20),
+	p_dataset	varchar(50),
+	p_month		varchar(10)
+)
+begin
+	if 	p_region is null
+		or p_source is null
+		or p_dataset is null
+		or p_month is null
+	then
+		call log('ERROR: procedure post_load_job requires non-null region, source, dataset and month');
+	else
+		insert into load_job
+			(region, source, dataset, month, status, attempts, records, queued, started, finished)
+		values
+			(trim(p_region), trim(p_source), trim(p_dataset), left(trim(p_month), 7), 'pending', 0, null, now(), null, null)
+		on duplicate key update
+			status = 'pending',
+			attempts = 0,
+			records = null,
+			queued = now(),
+			started = null,
+			finished = null;
+	end if;
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
 
-		-- link to person (if any)
-		if l_person_id is not null and not exists_relation (null, l_person_id, l_stop_event_id)
-		then
-			set l_relation = post_relation(null, l_person_id, l_stop_event_id);
-		end if;
+-- records step of region and source as 'running' (counting the attempt), 'complete' or 'failed'
+drop procedure if exists put_load_job;
+//
+create procedure put_load_job
+(
+	p_region	varchar(250),
+	p_source	varchar(20),
+	p_dataset	varchar(50),
+	p_month		varchar(10),
+	p_status	varchar(20),
+	p_records	int
+)
+begin
+	if 	p_status is null
+		or p_status not in ('running', 'complete', 'failed')
+	then
+		call log(concat('ERROR: procedure put_load_job does not recognise status "', ifnull(p_status, 'null'), '"'));
+	elseif 	p_status = 'running'
+	then
+		update	load_job
+		set	status = p_status,
+			attempts = attempts + 1,
+			started = now(),
+			finished = null
+		where	region = trim(p_region)
+			and source = trim(p_source)
+			and dataset = trim(p_dataset)
+			and month = left(trim(p_month), 7);
+	else
+		update	load_job
+		set	status = p_status,
+			records = p_records,
+			finished = now()
+		where	region = trim(p_region)
+			and source = trim(p_source)
+			and dataset = trim(p_dataset)
+			and month = left(trim(p_month), 7);
+	end if;
+end;
+//
+set @procedure_count = ifnull(@procedure_count,0) + 1;
+//
 
-/*	else
-		-- cater for amendments [not possible - no way to identify record]
+-- returns status of step of region and source (null if not queued by the latest run)
+drop function if exists get_load_job_status;
+//
+create function get_load_job_status
+(
+	p_region	varchar(250),
+	p_source	varchar(20),
+	p_dataset	varchar(50),
+	p_month		varchar(10)
+)
+returns varchar(20)
+begin
+	declare l_status	varchar(20) default null;
 
-		if p_outcome_linked_to_object_of_search is not null and l_old_outcome_linked_to_object_of_search != p_outcome_linked_to_object_of_search
-		then
-			set l_extension = post_extension(l_stop_event_id, 'location_type', p_outcome_linked_to_object_of_search);
-		end if;
+	select 	status
+	into 	l_status
+	from 	load_job
+	where 	region = trim(p_region)
+		and source = trim(p_source)
+		and dataset = trim(p_dataset)
+		and month = left(trim(p_month), 7);
 
-		if p_operation is not null and l_old_operation != p_operation
-		then
-			set l_extension = post_extension(l_stop_event_id, 'location_type', p_operation);
-		end if;
+	return l_status;
+end;
+//
+set @function_count = ifnull(@function_count,0) + 1;
+//
 
-		if p_removal_of_more_than_outer_clothing is not null and l_old_removal_of_more_than_outer_clothing != p_removal_of_more_than_outer_clothing
-		then
-			set l_extension = post_extension(l_stop_event_id, 'location_type', p_removal_of_more_than_outer_clothing);
-		end if;
+-- returns number of steps of region and source the latest run didnt complete (0 if it finished, or never ran)
+drop function if exists count_unfinished_load_jobs;
+//
+create function count_unfinished_load_jobs
+(
+	p_region	varchar(250),
+	p_source	varchar(20)
+)
+returns int
+begin
+	declare l_count		int default 0;
 
-		if p_outcome is not null and l_old_outcome != p_outcome
-		then
-			set l_extension = post_extension(l_stop_event_id, 'location_type', p_outcome);
-		end if;
+	select 	count(*)
+	into 	l_count
+	from 	load_job
+	where 	region = trim(p_region)
+		and source = trim(p_source)
+		and status != 'complete';
 
-		if p_involved_person is not null and l_old_involved_person != p_involved_person
-		then
-			set l_extension = post_extension(l_stop_event_id, 'location_type', p_involved_person);
-		end if;
-*/
+	return l_count;
+end;
+//
+set @function_count = ifnull(@function_count,0) + 1;
+//
 
-	end if;
+-- returns when the latest run of region and source started its first step (null if none started)
+drop function if exists get_load_jobs_started;
+//
+create function get_load_jobs_started
+(
+	p_region	varchar(250),
+	p_source	varchar(20)
+)
+returns datetime
+begin
+	declare l_started	datetime default null;
 
-	-- call log('DEBUG : END post_police_stop');
+	select 	min(started)
+	into 	l_started
+	from 	load_job
+	where 	region = trim(p_region)
+		and source = trim(p_source);
 
-	return l_stop_event_id;
+	return l_started;
 end;
 //
 set @function_count = ifnull(@function_count,0) + 1;
@@ -8672,6 +12040,8 @@ set @procedure_count = ifnull(@procedure_count,0) + 1;
 //
 
 -- Create standard views (ie, denormalise tables
+-- types and dynamic columns come from extension_key, and a view is only recreated if its column list has changed (or it has gone)
+-- types with no rows left are dropped from extension_key along with their view
 drop procedure if exists create_views;
 //
 create procedure create_views()
@@ -8686,6 +12056,8 @@ procedure_block : begin
 	declare l_type			varchar(50);
 	declare l_type_count 		tinyint default 1;
 	declare l_type_length 		tinyint default 0;
+	declare l_view_name		varchar(64);
+	declare l_digest		char(32);
 	declare l_dynamic_column	varchar(64);
 	declare l_dynamic_columns	varchar(50000) default '';
 	declare l_dynamic_column_count 	tinyint default 1;
@@ -8709,28 +12081,55 @@ procedure_block : begin
 		prepare static_columns from @g_sql;
 		execute static_columns;
 
-		-- get list of types
-		set @g_sql = concat('select group_concat( distinct ifnull(type, "unknown") order by type) into @g_types from ', l_table_name, ';' );
-		-- call log(concat('DEBUG : [types] @g_sql=', @g_sql));
-		prepare types from @g_sql;
-		execute types;
+		-- get list of types (from extension field registry, and views already created)
+		select 	group_concat( distinct type order by type )
+		into 	@g_types
+		from 	(
+				select	type
+				from	extension_key
+				where	table_name = l_table_name
+				union
+				select	type
+				from	extension_view
+				where	table_name = l_table_name
+			) types;
 
 		-- get list of dynamic columns
-		set l_type_length = get_element_count( @g_types, ',');
+		set l_type_length = ifnull(get_element_count( @g_types, ','), 0);
 		set l_type_count = 1;
-		while l_type_count <= l_type_length do
+		type_loop : while l_type_count <= l_type_length do
 
 			set l_columns = '';
 			set l_type = get_element(@g_types, l_type_count, ',');
+			set l_view_name = concat(l_table_name, '_', replace(l_type, '-', '_'));
 
-			set @g_sql = concat('select group_concat( distinct column_list(extension) ) into @g_dynamic_columns from ', l_table_name, ' where type = "', l_type, '";');
-			-- call log(concat('DEBUG : [dynamic columns] @g_sql=', @g_sql));
-			prepare dynamic_columns from @g_sql;
-			execute dynamic_columns;
-			
-			-- get unique list of dynamic columns
-			set @g_dynamic_columns = sort_array(@g_dynamic_columns, 'u', ',');
-			set l_dynamic_column_length = get_element_count( @g_dynamic_columns, ',');
+			-- forget types with no rows left (from type index)
+			set @g_type_exists = null;
+			set @g_sql = concat('select exists (select 1 from ', l_table_name, ' where ', if(l_type = 'unknown', 'type is null', concat('type = "', l_type, '"')), ') into @g_type_exists;' );
+			-- call log(concat('DEBUG : [type exists] @g_sql=', @g_sql));
+			prepare type_exists from @g_sql;
+			execute type_exists;
+
+			if not @g_type_exists
+			then
+				delete from extension_key where table_name = l_table_name and type = l_type;
+				delete from extension_view where table_name = l_table_name and type = l_type;
+
+				set @g_sql = concat('drop view if exists ', l_view_name, ';');
+				prepare drop_view from @g_sql;
+				execute drop_view;
+
+				set l_type_count = l_type_count + 1;
+				iterate type_loop;
+			end if;
+
+			select 	group_concat( field order by field )
+			into 	@g_dynamic_columns
+			from 	extension_key
+			where 	table_name = l_table_name
+				and type = l_type;
+
+			set l_dynamic_column_length = ifnull(get_element_count( @g_dynamic_columns, ','), 0);
 
 			if l_dynamic_column_length > 0
 			then
@@ -8738,7 +12137,7 @@ procedure_block : begin
 				set l_dynamic_column_count = 1;
 				set l_dynamic_columns = '';
 				while l_dynamic_column_count <= l_dynamic_column_length do
-					set l_dynamic_column =  replace(get_element(@g_dynamic_columns, l_dynamic_column_count, ','), '`', '"');
+					set l_dynamic_column =  concat('"', get_element(@g_dynamic_columns, l_dynamic_column_count, ','), '"');
 					set l_dynamic_columns = concat(l_dynamic_columns, ', column_get(extension,', l_dynamic_column, ' as char(100)) as ', l_dynamic_column );
 					set l_dynamic_column_count = l_dynamic_column_count + 1;
 				end while;
@@ -8747,15 +12146,29 @@ procedure_block : begin
 			else
 				set l_columns = @g_static_columns;
 			end if;
-		
-			-- create the view
-			set @g_sql = concat('create or replace view ', l_table_name, '_', replace(l_type, '-', '_'), ' as select ', l_columns, ' from ', l_table_name, ' where type = "', l_type, '";');
-			-- call log(concat('DEBUG : [create view] @g_sql=', @g_sql));
-			prepare create_view from @g_sql;
-			execute create_view;
+
+			set l_digest = md5(l_columns);
+
+			-- create the view, unless it already exists with the same columns
+			if not exists (select 1 from extension_view where table_name = l_table_name and type = l_type and columns_digest = l_digest)
+				or not exists (select 1 from information_schema.views where table_schema = l_database and table_name = l_view_name)
+			then
+				set @g_sql = concat('create or replace view ', l_view_name, ' as select ', l_columns, ' from ', l_table_name, ' where type = "', l_type, '";');
+				-- call log(concat('DEBUG : [create view] @g_sql=', @g_sql));
+				prepare create_view from @g_sql;
+				execute create_view;
+
+				insert into extension_view
+					(table_name, type, view_name, columns_digest)
+				values
+					(l_table_name, l_type, l_view_name, l_digest)
+				on duplicate key update
+					view_name = l_view_name,
+					columns_digest = l_digest;
+			end if;
 
 			set l_type_count = l_type_count + 1;
-		end while;
+		end while type_loop;
 
 		set l_table_count = l_table_count + 1;
 	end while;
@@ -8785,6 +12198,12 @@ begin
 
 	-- call log('DEBUG : START EVENT daily_housekeeping');
 
+	-- once a week, rebuild extension field registry so fields no longer used by any row are pruned
+	if dayofweek(current_date) = 1
+	then
+		call rebuild_extension_keys(false);
+	end if;
+
 	-- set up standard (procedure does nothing if nothing required)
 	call create_views();
 
@@ -8818,10 +12237,36 @@ call post_variable ('SRID', '4326');
 call post_variable ('crime-last-updated', '2010-11-30');
 -- call post_variable ('crime-last-updated', '2016-01-30');
 //
+-- earliest year given its own event partition (earlier events share it); police data starts in 2010
+call post_variable ('event-partition-start', '2010');
+//
 -- region interested in
 call post_variable ('region', 'Reading Borough');
 //
 
+-- populate id -> table registry (only does anything the first time)
+call rebuild_uuid_registry(true);
+//
+
+-- populate extension field registry used by create_views (only does anything the first time)
+call rebuild_extension_keys(true);
+//
+
+-- populate spatial side tables (only does anything the first time, or if place_spatial has been emptied)
+call rebuild_place_spatial(true);
+//
+call rebuild_place_point(true);
+//
+-- populate postcode and road lookup tables (only does anything the first time)
+call rebuild_place_lookup(true);
+//
+-- add event.event_month and yearly partitions to an event table created before them, and partitions up to next year
+call partition_event();
+//
+-- populate materialised police stats for the region (only does anything the first time)
+call rebuild_police_stats(true);
+//
+
 
 -- Report control parameters
 -- reports are stored in a local table and are extracted to console (to email via the OS, or whatever you want to do with them) through the "get_reports" procedure.
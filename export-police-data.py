@@ -0,0 +1,387 @@
+#! /usr/bin/python
+# Script to export police data (as loaded by load-police-data.py) as pre-built map tiles
+# writes crimes, outcomes and stops as <output>/<dataset>/<YYYY-MM>/<area>.ndjson (newline delimited GeoJSON features)
+# and <area>.csv (same records, one column per property), plus an index.json per month and one for the whole export
+# areas are grid squares of --tile degrees ('<latitude row>_<longitude column>', ie floor(latitude / tile) and floor(longitude / tile))
+# each run only exports months with records added or changed since the last run (unless --full)
+
+# load required libraries
+import getopt, sys, os, re, json, csv, shutil, math
+from time import time
+from datetime import datetime
+from dateutil import relativedelta
+import mysql.connector 		# https://dev.mysql.com/doc/connector-python/en
+
+# hard coded defaults
+user = 'datamap' 	# mysql user
+password = 'datamap' 	# mysql password
+host = 'localhost' 	# mysql host
+database = 'datamap'	# mysql database
+output_dir = 'police-export'	# directory tiles are written to
+tile_size = 0.05	# degrees; width and height of export areas
+full = False		# export every month, not just those changed since the last run (--full)
+fetch_batch = 1000	# rows read from the server side cursor at a time
+last_run_variable = 'police-export-last-run'	# database time the last export started; months changed since are exported
+
+db = None
+
+# columns exported for each dataset (the order of CSV columns); 'latitude' and 'longitude' become the GeoJSON geometry
+dataset_columns = {
+	'crimes': ['id', 'crime_id', 'persistent_id', 'month', 'category_code', 'category_name', 'context', 'location_type', 'location_subtype', \
+		'location_id', 'location_name', 'latitude', 'longitude', 'outcome_status'],
+	'outcomes': ['id', 'crime_event_id', 'crime_id', 'crime_persistent_id', 'month', 'category_code', 'category_name', \
+		'location_id', 'location_name', 'latitude', 'longitude'],
+	'stops': ['id', 'datetime', 'stop_type', 'legislation', 'object_of_search', 'outcome', 'outcome_linked_to_object_of_search', 'involved_person', \
+		'operation', 'operation_name', 'removal_of_more_than_outer_clothing', 'gender', 'age_range', 'self_defined_ethnicity', 'officer_defined_ethnicity', \
+		'location_id', 'location_name', 'latitude', 'longitude']
+	}
+
+# event type of each dataset
+dataset_types = {
+	'crimes':	'police-crime',
+	'outcomes':	'police-crime-outcome',
+	'stops':	'police-stop'
+	}
+
+# one month of each query; 'month_filter' is replaced by month_filter() so only the (type, event_month) index and one event partition are read
+dataset_queries = {
+	'crimes': """
+		select 	hex(crime.id), crime.identifier, crime.name, date_format(crime.event_month, '%%Y-%%m'), category.identifier, category.name, crime.description,
+			column_get(crime.extension, 'location_type' as char(100)), column_get(crime.extension, 'location_subtype' as char(100)),
+			location.identifier, location.name, location.latitude, location.longitude
+		from 	event crime
+			join relation category_relation		on crime.id = category_relation.major
+			join category				on category.id = category_relation.minor and category.type = 'police-crime'
+			left outer join (
+				relation place_relation
+				join place location		on location.id = place_relation.minor and location.type = 'police-location'
+			)					on crime.id = place_relation.major
+		where 	crime.type = 'police-crime'
+			and month_filter(crime)""",
+	'outcomes': """
+		select 	hex(outcome.id), hex(crime.id), crime.identifier, crime.name, date_format(outcome.event_month, '%%Y-%%m'), category.identifier, category.name,
+			location.identifier, location.name, location.latitude, location.longitude
+		from 	event outcome
+			join relation crime_relation		on outcome.id = crime_relation.minor
+			join event crime			on crime.id = crime_relation.major and crime.type = 'police-crime'
+			join relation category_relation		on outcome.id = category_relation.major
+			join category				on category.id = category_relation.minor and category.type = 'police-crime-outcome'
+			left outer join (
+				relation place_relation
+				join place location		on location.id = place_relation.minor and location.type = 'police-location'
+			)					on crime.id = place_relation.major
+		where 	outcome.type = 'police-crime-outcome'
+			and month_filter(outcome)""",
+	'stops': """
+		select 	hex(stop.id), date_format(stop.date_event, stop.date_resolution), category.name, stop.description,
+			column_get(stop.extension, 'object_of_search' as char(64)), column_get(stop.extension, 'outcome' as char(64)),
+			column_get(stop.extension, 'outcome_linked_to_object_of_search' as char(1)), column_get(stop.extension, 'involved_person' as char(1)),
+			column_get(stop.extension, 'operation' as char(1)), column_get(stop.extension, 'operation_name' as char(64)),
+			column_get(stop.extension, 'removal_of_more_than_outer_clothing' as char(1)),
+			person.gender, column_get(person.extension, 'age_range' as char), column_get(person.extension, 'self_defined_ethnicity' as char),
+			column_get(person.extension, 'officer_defined_ethnicity' as char),
+			location.identifier, location.name, location.latitude, location.longitude
+		from 	event stop
+			join relation category_relation		on stop.id = category_relation.major
+			join category				on category.id = category_relation.minor and category.type = 'police-stop'
+			left outer join (
+				relation place_relation
+				join place location		on location.id = place_relation.minor and location.type = 'police-location'
+			)					on stop.id = place_relation.major
+			left outer join (
+				relation person_relation
+				join person			on person.id = person_relation.major and person.type = 'police-stop'
+			)					on stop.id = person_relation.minor
+		where 	stop.type = 'police-stop'
+			and month_filter(stop)"""
+	}
+
+# returns event table filter for one month ('YYYY-MM') of given alias, and its params
+# event_month picks the rows off the (type, event_month) index; the date_event range limits the read to the event partition holding the month
+def month_filter(alias, month):
+	next_month = datetime.strftime(datetime.strptime(month, '%Y-%m') + relativedelta.relativedelta(months=1), '%Y-%m')
+	query = alias + '.event_month = %s and ' + alias + '.date_event >= convert_string_to_date(%s) and ' + alias + '.date_event < convert_string_to_date(%s)'
+	return (query, [month + '-01', month, next_month])
+
+# returns query and params of dataset for month
+def get_query(dataset, month):
+	query = dataset_queries[dataset]
+	alias = re.search('month_filter\(([a-z]+)\)', query).group(1)
+	filter_query, params = month_filter(alias, month)
+	return (query.replace('month_filter(' + alias + ')', filter_query), params)
+
+# returns value of database variable (None if not set)
+def get_variable(variable):
+	variable_cursor = db.cursor()
+	try:
+		variable_cursor.execute('select get_variable(%s)', (variable,))
+		return variable_cursor.fetchone()[0]
+	except Exception as ex:
+		print 'ERR: get_variable "' + variable + '" failed.'
+		template = " - An exception of type {0} occurred. Arguments:\n{1!r}"
+		message = template.format(type(ex).__name__, ex.args)
+		print message
+		return None
+	finally:
+		variable_cursor.close()
+
+# sets database variable (adding it if not already there)
+def set_variable(variable, value):
+	variable_cursor = db.cursor()
+	try:
+		variable_cursor.callproc('post_variable', [variable, value])
+		variable_cursor.callproc('put_variable', [variable, value])
+		db.commit()
+	finally:
+		variable_cursor.close()
+
+# returns query results as a list (small lookups only; records are streamed by export_month)
+def get_rows(query, params):
+	rows_cursor = db.cursor()
+	try:
+		rows_cursor.execute(query, params)
+		return rows_cursor.fetchall()
+	finally:
+		rows_cursor.close()
+
+# returns sorted months ('YYYY-MM') holding records of dataset, and those already exported (so months with no records left are cleared)
+# only those changed since given database time, if any, as recorded in police_month_change by the load
+# (crimes also count as changed when an outcome of theirs is, as their outcome_status comes from their latest outcome)
+def get_months(dataset, since):
+	if since is not None:
+		rows = get_rows("""
+			select 	date_format(month, '%%Y-%%m')
+			from 	police_month_change
+			where 	type = %s
+				and timestamp_updated >= %s""", (dataset_types[dataset], since))
+		return sorted(row[0] for row in rows if row[0] is not None)
+	rows = get_rows("select distinct date_format(event_month, '%%Y-%%m') from event where type = %s", (dataset_types[dataset],))
+	months = set(row[0] for row in rows if row[0] is not None)
+	dataset_dir = os.path.join(output_dir, dataset)
+	if os.path.isdir(dataset_dir):
+		months.update(month for month in os.listdir(dataset_dir) if re.match('^[0-9]{4}-[0-9]{2}$', month))
+	return sorted(months)
+
+# returns 'YYYY-MM:<category name>' of latest outcome of each crime of month, by crime hex id
+def get_outcome_status(month):
+	filter_query, params = month_filter('crime', month)
+	rows = get_rows("""
+		select 	hex(crime.id), date_format(outcome.event_month, '%%Y-%%m'), category.name
+		from 	event crime
+			join relation crime_relation		on crime.id = crime_relation.major
+			join event outcome			on outcome.id = crime_relation.minor and outcome.type = 'police-crime-outcome'
+			join relation category_relation		on outcome.id = category_relation.major
+			join category				on category.id = category_relation.minor and category.type = 'police-crime-outcome'
+		where 	crime.type = 'police-crime'
+			and """ + filter_query + """
+		order by outcome.date_event, outcome.timestamp_created""", params)
+	return dict((crime_id, outcome_month + ':' + category_name) for crime_id, outcome_month, category_name in rows)
+
+# returns area of point ('none' if not located)
+def get_area(latitude, longitude):
+	if latitude is None or longitude is None:
+		return 'none'
+	return str(int(math.floor(latitude / tile_size))) + '_' + str(int(math.floor(longitude / tile_size)))
+
+# returns value as text for CSV (utf-8, empty for null)
+def csv_value(value):
+	if value is None:
+		return ''
+	if isinstance(value, unicode):
+		return value.encode('utf-8')
+	return str(value)
+
+# open NDJSON and CSV files of one area of the month being exported, with its counts and bounds
+class AreaWriter(object):
+	def __init__(self, directory, area, columns):
+		self.area = area
+		self.columns = columns
+		self.records = 0
+		self.bounds = None
+		self.ndjson_file = open(os.path.join(directory, area + '.ndjson'), 'w')
+		self.csv_file = open(os.path.join(directory, area + '.csv'), 'wb')
+		self.csv_writer = csv.writer(self.csv_file)
+		self.csv_writer.writerow(columns)
+
+	# writes one record (dict of columns)
+	def write(self, record):
+		latitude, longitude = record['latitude'], record['longitude']
+		feature = {
+			'type': 'Feature',
+			'id': record['id'],
+			'geometry': None if latitude is None else {'type': 'Point', 'coordinates': [longitude, latitude]},
+			'properties': dict((column, record[column]) for column in self.columns if column not in ('id', 'latitude', 'longitude'))
+			}
+		self.ndjson_file.write(json.dumps(feature, separators=(',', ':'), sort_keys=True) + '\n')
+		self.csv_writer.writerow([csv_value(record[column]) for column in self.columns])
+		self.records = self.records + 1
+		if latitude is not None:
+			if self.bounds is None:
+				self.bounds = [latitude, longitude, latitude, longitude]
+			else:
+				self.bounds = [min(self.bounds[0], latitude), min(self.bounds[1], longitude), max(self.bounds[2], latitude), max(self.bounds[3], longitude)]
+
+	def close(self):
+		self.ndjson_file.close()
+		self.csv_file.close()
+
+# exports one month of dataset; records are streamed off a server side cursor into per area files of a temporary directory,
+# which then replaces the month's directory whole (so readers never see a half written month); returns month index (None on failure)
+# a month with no records left (eg dropped by delete_event_partitions) has its directory removed
+def export_month(dataset, month):
+	columns = dataset_columns[dataset]
+	month_dir = os.path.join(output_dir, dataset, month)
+	temp_dir = month_dir + '.tmp'
+	if os.path.isdir(temp_dir):
+		shutil.rmtree(temp_dir)
+	os.makedirs(temp_dir)
+
+	outcome_status = get_outcome_status(month) if dataset == 'crimes' else None
+	query, params = get_query(dataset, month)
+	writers = {}
+	export_cursor = db.cursor(buffered=False)	# unbuffered; rows are read from the server as they are written out
+	try:
+		export_cursor.execute(query, params)
+		while True:
+			rows = export_cursor.fetchmany(fetch_batch)
+			if len(rows) == 0:
+				break
+			for row in rows:
+				if dataset == 'crimes':
+					record = dict(zip(columns[:-1], row))
+					record['outcome_status'] = outcome_status.get(record['id'])
+				else:
+					record = dict(zip(columns, row))
+				record['latitude'] = None if record['latitude'] is None else float(record['latitude'])
+				record['longitude'] = None if record['longitude'] is None else float(record['longitude'])
+				area = get_area(record['latitude'], record['longitude'])
+				if area not in writers:
+					writers[area] = AreaWriter(temp_dir, area, columns)
+				writers[area].write(record)
+	except Exception as ex:
+		print 'ERR: export_month ' + dataset + ' (' + month + ') failed.'
+		template = " - An exception of type {0} occurred. Arguments:\n{1!r}"
+		message = template.format(type(ex).__name__, ex.args)
+		print message
+		for writer in writers.values():
+			writer.close()
+		shutil.rmtree(temp_dir)
+		return None
+	finally:
+		export_cursor.close()
+
+	for writer in writers.values():
+		writer.close()
+	if len(writers) == 0:
+		shutil.rmtree(temp_dir)
+		if os.path.isdir(month_dir):
+			shutil.rmtree(month_dir)
+		return {'dataset': dataset, 'month': month, 'records': 0, 'areas': {}}
+	month_index = {
+		'dataset': dataset,
+		'month': month,
+		'tile_size': tile_size,
+		'columns': columns,
+		'records': sum(writer.records for writer in writers.values()),
+		'areas': dict((area, {'records': writer.records, 'bounds': writer.bounds}) for area, writer in writers.items())
+		}
+	with open(os.path.join(temp_dir, 'index.json'), 'w') as f:
+		json.dump(month_index, f, sort_keys=True, indent=2)
+
+	if os.path.isdir(month_dir):
+		shutil.rmtree(month_dir)
+	os.rename(temp_dir, month_dir)
+	return month_index
+
+# rewrites index.json of the whole export from each month's index.json (records and areas of every dataset and month)
+def write_index(started):
+	index = {'tile_size': tile_size, 'exported': started, 'datasets': {}}
+	for dataset in sorted(dataset_columns):
+		dataset_dir = os.path.join(output_dir, dataset)
+		index['datasets'][dataset] = {'columns': dataset_columns[dataset], 'months': {}}
+		if not os.path.isdir(dataset_dir):
+			continue
+		for month in sorted(os.listdir(dataset_dir)):
+			month_file = os.path.join(dataset_dir, month, 'index.json')
+			if re.match('^[0-9]{4}-[0-9]{2}$', month) and os.path.isfile(month_file):
+				with open(month_file) as f:
+					month_index = json.load(f)
+				index['datasets'][dataset]['months'][month] = {'records': month_index['records'], 'areas': sorted(month_index['areas'])}
+	temp_file = os.path.join(output_dir, 'index.json.tmp')
+	with open(temp_file, 'w') as f:
+		json.dump(index, f, sort_keys=True, indent=2)
+	os.rename(temp_file, os.path.join(output_dir, 'index.json'))
+
+
+### MAIN ###
+
+# manage commandline args
+try:
+	opts, args = getopt.getopt(sys.argv[1:], "u:p:h:d:o:", ["user=", "password=", "host=", "database=", "output=", "tile=", "full" ])
+except getopt.GetoptError as err:
+	print(err)
+	sys.exit(2)
+
+# get commandline options
+for o, a in opts:
+	if o in ("-u", "--user"):
+		user = a
+	elif o in ("-p", "--password"):
+		password = a
+	elif o in ("-h", "--host"):
+		host = a
+	elif o in ("-d", "--database"):
+		database = a
+	elif o in ("-o", "--output"):
+		output_dir = a
+	elif o in ("--tile",):
+		tile_size = float(a)
+	elif o in ("--full",):
+		full = True
+
+# check for required parms
+if user is None or password is None or host is None or database is None:
+	print('ERR: Specify all parameters')
+	sys.exit(1)
+if tile_size <= 0:
+	print('ERR: Specify a tile size above 0 degrees')
+	sys.exit(1)
+
+# test connection to database
+try:
+	db = mysql.connector.connect(user=user, password=password, host=host, database=database, charset='utf8')
+except:
+	print('ERR: Unable to connect to database "' + database + '" with user "' + user + '"' )
+	sys.exit(1)
+
+# database time export started; the next run exports months changed after this
+# a change of tile size invalidates every area, so forces a full export
+export_started = str(get_rows('select now()', ())[0][0])
+since = None if full else get_variable(last_run_variable)
+index_file = os.path.join(output_dir, 'index.json')
+if since is not None and os.path.isfile(index_file):
+	with open(index_file) as f:
+		if json.load(f).get('tile_size') != tile_size:
+			since = None
+elif since is not None:
+	since = None # nothing exported here yet
+
+failed = False
+for dataset in sorted(dataset_columns):
+	for month in get_months(dataset, since):
+		started = time()
+		month_index = export_month(dataset, month)
+		if month_index is None:
+			failed = True
+			continue
+		print('INF: Exported %d %s for %s in %d areas (%.1f s)' % (month_index['records'], dataset, month, len(month_index['areas']), time() - started))
+
+if not os.path.isdir(output_dir):
+	os.makedirs(output_dir)
+write_index(export_started)
+
+# months that failed are picked up again next run, as long as the last run time stays put
+if failed:
+	print('ERR: Some months failed to export')
+	sys.exit(1)
+set_variable(last_run_variable, export_started)
@@ -2,13 +2,15 @@
 # Script to load police data (https://data.police.uk/)
 
 # load required libraries
-import getopt, sys, pprint, copy, re, json, pdb
-from time import sleep
+import getopt, sys, os, pprint, copy, re, json, pdb, threading, Queue, hashlib, random, csv, zipfile, bisect, socket, collections
+from time import sleep, time
 from types import *
 from datetime import datetime, timedelta
 import calendar
 from dateutil import relativedelta
 import requests 		# http://docs.python-requests.org/en/master/
+from requests.adapters import HTTPAdapter
+from multiprocessing.pool import ThreadPool
 import mysql.connector 		# https://dev.mysql.com/doc/connector-python/en
 
 # experimental codec failure override
@@ -19,7 +21,7 @@ import codecs
 codecs.register_error("strict", codecs.ignore_errors) # this is a BAD SOLUTION
 
 # hard coded defaults
-region = 'Reading Borough'
+region = 'Reading Borough'	# region place name; several may be given comma separated (eg 'Reading Borough,Wokingham Borough')
 user = 'datamap' 	# mysql user
 password = 'datamap' 	# mysql password
 host = 'localhost' 	# mysql host
@@ -28,8 +30,172 @@ api_url = 'https://data.police.uk/api/'
 options = ''		# specialised options for swifter loading, debugging etc
 
 # police API wait and retry parms
-wait = 10 	# seconds
-retry = 6 	# times
+# failed requests are retried after an exponential backoff (wait, 2 x wait, 4 x wait ... up to wait_max) with jitter, or after any longer Retry-After
+wait = 2 	# seconds
+wait_max = 60	# seconds
+endpoint_limits = {	# (retries, (connect timeout, read timeout) in seconds) per police API endpoint
+	'crime-last-updated':	(6, (10, 30)),
+	'crime-categories':	(6, (10, 30)),
+	'forces':		(6, (10, 30)),
+	'locate-neighbourhood':	(6, (10, 30)),
+	'boundary':		(4, (10, 60)),		# neighbourhood boundaries
+	'crimes-street':	(6, (10, 120)),		# slow for large polys
+	'outcomes-at-location':	(6, (10, 120)),
+	'stops-street':		(6, (10, 120)),
+	'default':		(4, (10, 60))		# neighbourhoods
+	}
+
+# police API rate limit parms; one token bucket is shared by every fetch thread (police API allows 15 requests/second, bursting to 30)
+rate = 15.0	# requests per second (--rate)
+burst = 30	# requests (--burst)
+rate_bucket = None
+
+# police API concurrency parms
+workers = 8		# concurrent police API requests (fetch_pool threads, and pooled keep-alive connections)
+http_session = None	# shared requests.Session, so connections to the police API are reused
+fetch_pool = None	# worker threads for police API requests (never database calls)
+prefetch = 4		# (month, dataset) payloads fetched ahead of the database writer
+place_string = None	# police API 'poly' string for the MBR of every region
+regions = []		# regions loaded together (--region, comma separated); they share force data, tiles and fetches,
+			# but each keeps its own payload digests, load jobs, lease, crime-last-updated and stats
+loaded_forces = set()	# police API force ids whose neighbourhoods have been loaded this run
+
+# police API streaming parms (crimes, outcomes and stops are parsed and staged a batch at a time unless options contains 'no-stream' or 'no-bulk-load')
+json_chunk = 65536	# bytes read from police API response (or cache file) at a time
+stream_batch = 500	# records handed from fetch thread to database writer at a time
+digest_batch = 500	# records of a region checksummed together; a changed payload is only written from its first changed batch on
+stream_queue = 4	# batches of one (month, dataset) step held ahead of the database writer
+
+# region tiling parms (crimes, outcomes and stops are queried tile by tile over the region polygon, rather than by its MBR, unless --tile=0)
+tile_size = 0.05	# degrees; width and height of initial tiles
+tile_depth = 4		# times a tile may be split into quarters when the police API says it holds too many (10,000+) records
+tile_pool = None	# worker threads for the tiles of one (month, dataset) step (never database calls)
+region_tiles = None	# (min latitude, min longitude, max latitude, max longitude) of tiles covering the region polygon
+region_bounds = None	# (min latitude, min longitude, max latitude, max longitude) of every region polygon
+region_shapes = []	# (bounds, bands) of each region polygon; bands hold its edges (longitude, latitude, longitude, latitude), bucketed by latitude band
+region_shape_names = []	# region name of each of region_shapes
+region_band_count = 200	# latitude bands; point in region tests only look at the edges of one band
+
+# archive parms; --archive loads data.police.uk monthly archive CSVs (zip files, directories or CSV files) instead of querying the police API
+archive_paths = None	# list of archive paths (--archive, comma separated)
+archive_files = {}	# (month 'YYYY-MM-01', dataset) : [(path, zip member or None), ...]
+archive_datasets = {	# archive CSV file suffix : dataset
+	'street':		'crimes',
+	'outcomes':		'outcomes',
+	'stop-and-search':	'stops'
+	}
+archive_crime_codes = {	# archive crime type : police API crime category (categories already in the database take precedence)
+	'anti-social behaviour':	'anti-social-behaviour',
+	'bicycle theft':		'bicycle-theft',
+	'burglary':			'burglary',
+	'criminal damage and arson':	'criminal-damage-arson',
+	'drugs':			'drugs',
+	'other crime':			'other-crime',
+	'other theft':			'other-theft',
+	'possession of weapons':	'possession-of-weapons',
+	'public disorder and weapons':	'public-disorder-weapons',
+	'public order':			'public-order',
+	'robbery':			'robbery',
+	'shoplifting':			'shoplifting',
+	'theft from the person':	'theft-from-the-person',
+	'vehicle crime':		'vehicle-crime',
+	'violence and sexual offences':	'violent-crime',
+	'violent crime':		'violent-crime'
+	}
+archive_outcome_codes = {}	# archive outcome type : police API outcome category (from the database)
+archive_forces = set()		# police API force ids in the database; archive files of other forces are skipped
+archive_locations = {}		# '<latitude>,<longitude>' : police-location identifier (from the database)
+
+# police API response cache parms (cache is off unless --cache is specified)
+cache_dir = None	# directory holding cached responses, one file per (endpoint, params)
+offline = False		# serve police API responses from cache only (--offline)
+cache_ttl = {		# seconds cached responses remain fresh
+	'crime-last-updated':	3600,		# 1 hr
+	'recent-month':		86400,		# 1 day; months in the last quarter are still being revised
+	'month':		2592000,	# 30 days; older months rarely change
+	'default':		2592000		# 30 days; forces, neighbourhoods and boundaries
+	}
+recent_months = 3	# months counted as recent
+
+# bulk load parms (crimes, outcomes and stops go via police_*_stage tables unless options contains 'no-bulk-load')
+stage_batch = 500	# rows per multi-row insert into police_*_stage tables
+session_id = None	# mysql connection id; marks this session's rows in police_*_stage tables
+id_fields = ['category_id', 'place_id', 'major', 'minor']	# police_*_stage and relation_stage columns holding ids
+
+# id cache parms; maps (table, type, identifier) to hex id for the duration of a load, to save repeated lookups
+# police-location places map to (hex id, longitude, latitude) since a street identifier can be reused for a different lat/long
+id_cache = {}
+id_cache_preloaded = set()	# (table, type) already preloaded
+location_tolerance = 0.0001	# lat/long difference (degrees) at which a police-location is treated as a different place (as post_police_crime)
+
+# token bucket limiting the rate of police API requests across all threads
+class TokenBucket(object):
+	def __init__(self, rate, burst):
+		self.rate = float(rate)
+		self.burst = float(burst)
+		self.tokens = float(burst)
+		self.updated = time()
+		self.lock = threading.Lock()
+
+	# waits until a token is available, then takes it
+	def take(self):
+		while True:
+			with self.lock:
+				now = time()
+				if now >= self.updated:
+					self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+					self.updated = now
+					if self.tokens >= 1:
+						self.tokens = self.tokens - 1
+						return
+					delay = (1 - self.tokens) / self.rate
+				else:
+					delay = self.updated - now # paused
+			sleep(delay)
+
+	# empties the bucket and stops it refilling for given seconds (police API said 429), so every thread backs off
+	def pause(self, seconds):
+		with self.lock:
+			self.tokens = 0.0
+			self.updated = max(self.updated, time() + seconds)
+
+# raised by get_police_records when the police API refuses a poly query for holding too many records (so the tile can be split)
+class TileOverflow(Exception):
+	pass
+
+# load run metrics parms; police API and database timings, plus each (dataset, month) step, are recorded in load_run (and --metrics directory, as JSON)
+metrics_dir = None	# directory load run summaries are written to (--metrics)
+metrics_lock = threading.Lock()	# metrics are recorded by fetch threads as well as the database thread
+metrics = {'http': {}, 'db': {}, 'archive': {}, 'steps': []}
+latency_buckets = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]	# seconds; upper bounds of latency histogram buckets (the last bucket counts anything slower)
+
+# adds one timing to a metrics entry (calls, seconds, max seconds and latency histogram), plus any other counts given
+def metrics_time(group, name, seconds, **counts):
+	with metrics_lock:
+		entry = metrics[group].setdefault(name, {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'histogram': [0] * (len(latency_buckets) + 1)})
+		entry['calls'] = entry['calls'] + 1
+		entry['seconds'] = entry['seconds'] + seconds
+		entry['max_seconds'] = max(entry['max_seconds'], seconds)
+		entry['histogram'][bisect.bisect_left(latency_buckets, seconds)] += 1
+		for count, value in counts.items():
+			entry[count] = entry.get(count, 0) + value
+
+# adds counts to a metrics entry
+def metrics_count(group, name, **counts):
+	with metrics_lock:
+		entry = metrics[group].setdefault(name, {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'histogram': [0] * (len(latency_buckets) + 1)})
+		for count, value in counts.items():
+			entry[count] = entry.get(count, 0) + value
+
+# unit of work parms (options contains 'batch-commit' to commit once per dataset and month rather than after every call)
+step_failed = False	# set by any failed database call during the current step
+stream_skipped = False	# set by write_stream when the streamed payload was unchanged (so nothing was staged)
+
+# load lease and job parms; each region's lease is renewed as the load goes, so a lease left by a run that died expires by itself
+# each (dataset, month) step is tracked in load_job, so the next run resumes with the steps a failed run didnt complete
+lease_seconds = 900	# seconds a lease lasts unless renewed (--lease); must be longer than the slowest step
+lease_holder = None	# host, process and connection id of this run
+job_source = 'api'	# load_job source ('archive' for --archive loads, so they resume separately)
 
 # always returns YYYY-MM-DD where DD is the last day of the month and MM is 01-12
 def standardise_date(date_string):
@@ -46,6 +212,7 @@ def standardise_date(date_string):
 
 # calls specified mysql function and returns result
 def mysql_function(function, params):
+	global step_failed
 	if function is None:
 		print "ERR: mysql_function : must specify function"
 		return None
@@ -76,6 +243,8 @@ def mysql_function(function, params):
 	#print "DBG: X"
 	mysql_cursor = db.cursor()
 	#print "DBG: Y"
+	started = time()
+	failed = 0
 	try:
 		#print "DBG: query = " + query
 		mysql_cursor.execute(query)
@@ -93,13 +262,17 @@ def mysql_function(function, params):
   		template = " - An exception of type {0} occurred. Arguments:\n{1!r}"
     		message = template.format(type(ex).__name__, ex.args)
     		print message
+		step_failed = True
+		failed = 1
 		#pdb.post_mortem()
 		#sys.exit(1)
 		#return None
 	resultset = mysql_cursor.fetchone()
+	metrics_time('db', function, time() - started, failures=failed)
 	#print "DBG: resultset = " + str(resultset)
 	#print "DBG: db.commit()..."
-	db.commit()
+	if 'batch-commit' not in options:
+		db.commit()
 	# print "DBG: DONE db.commit()"
 	mysql_cursor.close()
 	if resultset is not None:
@@ -107,85 +280,626 @@ def mysql_function(function, params):
 	return None
 
 # calls specified mysql procedure
-def mysql_procedure(procedure, params):
+# rows of any result sets it returns are appended to results (if given)
+def mysql_procedure(procedure, params, results=None):
+	global step_failed
 	if procedure is None:
 		print "ERR: mysql_procedure : must specify procedure"
 		return False
 	mysql_cursor = db.cursor()
+	started = time()
 	try:
 		out = mysql_cursor.callproc(procedure, params)
 	except mysql.connector.Error as err:
 		print("ERR: mysql connect error: {}".format(err))
+		step_failed = True
+		metrics_time('db', procedure, time() - started, failures=1)
 		return False
 	except:
 		print 'ERR: cursor warning: ' + str(mysql_cursor.fetchwarnings())
+		step_failed = True
+		metrics_time('db', procedure, time() - started, failures=1)
 		return False
-	db.commit()
+	for result in mysql_cursor.stored_results():
+		rows = result.fetchall()
+		if results is not None:
+			results.extend(rows)
+	metrics_time('db', procedure, time() - started, failures=0)
+	if 'batch-commit' not in options:
+		db.commit()
 	mysql_cursor.close()
 	return True
 
-# returns python map (ie assoc array) of JSON returned by given URL
+# inserts rows (lists of values in the same order as fields) into the given staging table
+# uses executemany, which the connector rewrites into multi-row inserts of up to stage_batch rows each
+def stage_rows(table, fields, rows):
+	global step_failed
+	if table is None or fields is None:
+		print "ERR: stage_rows : must specify table and fields"
+		return False
+	# ids are passed as hex (as returned by the post_* functions)
+	query = 'insert into ' + table + ' (session_id, ' + ', '.join(fields) + ') values (%s, ' + ', '.join(['unhex(%s)' if field in id_fields else '%s' for field in fields]) + ')'
+	stage_cursor = db.cursor()
+	started = time()
+	try:
+		for start in range(0, len(rows), stage_batch):
+			stage_cursor.executemany(query, [[session_id] + list(row) for row in rows[start:start + stage_batch]])
+	except Exception as ex:
+		print 'ERR: stage_rows insert into ' + table + ' failed.'
+		template = " - An exception of type {0} occurred. Arguments:\n{1!r}"
+		message = template.format(type(ex).__name__, ex.args)
+		print message
+		metrics_time('db', 'insert ' + table, time() - started, failures=1, rows=0)
+		if 'batch-commit' in options:
+			step_failed = True
+		else:
+			db.rollback()
+		stage_cursor.close()
+		return False
+	metrics_time('db', 'insert ' + table, time() - started, failures=0, rows=len(rows))
+	if 'batch-commit' not in options:
+		db.commit()
+	stage_cursor.close()
+	return True
+
+# inserts relations ([type, major, minor] with hex ids; type None for default) in one go via relation_stage and post_relations
+# returns number of relations inserted, or None on failure
+def post_relations(relations):
+	if len(relations) == 0:
+		return 0
+	if not stage_rows('relation_stage', ['type', 'major', 'minor'], relations):
+		return None
+	results = []
+	if not mysql_procedure('post_relations', [], results) or len(results) == 0:
+		print "ERR: post_relations : relations not posted"
+		return None
+	return results[0][0]
+
+# returns name of per region bookkeeping variable (eg 'crime-last-updated:Reading Borough')
+def get_region_variable(variable, region_name):
+	return variable + ':' + region_name
+
+# takes each region's load lease; returns False (giving back any already taken) if another run holds one
+def acquire_regions():
+	for region_name in regions:
+		if not mysql_function('acquire_load_lease', [get_region_variable('police-data-load', region_name), lease_holder, lease_seconds]):
+			print('ERR: Police data load is already running for region "' + region_name + '" (its lease expires if that run has died)' )
+			release_regions()
+			return False
+	if 'batch-commit' in options:
+		db.commit()
+	return True
+
+# updates load progress of each region, renewing its lease (committed straight away, so visible while a batch-commit step is in progress)
+# exits if another run has taken a lease over, which it can only do once the lease has expired
+def load_progress(status):
+	lost = [region_name for region_name in regions \
+		if not mysql_function('renew_load_lease', [get_region_variable('police-data-load', region_name), lease_holder, lease_seconds, status])]
+	if 'batch-commit' in options:
+		db.commit()
+	if len(lost) > 0:
+		print('ERR: Load lease for region "' + lost[0] + '" expired and was taken over by another run; specify a longer --lease')
+		sys.exit(1)
+
+# gives back each region's load lease
+def release_regions():
+	for region_name in regions:
+		mysql_procedure('release_load_lease', [get_region_variable('police-data-load', region_name), lease_holder])
+	if 'batch-commit' in options:
+		db.commit()
+
+# records status ('running', 'complete' or 'failed') of (dataset, month) step of each given region in load_job (committed straight away, as load_progress)
+def put_job(step_regions, dataset, month, status, records=None):
+	for region_name in step_regions:
+		mysql_procedure('put_load_job', [region_name, job_source, dataset, month, status, records])
+	if 'batch-commit' in options:
+		db.commit()
+
+# runs one (dataset, month) load step, returning the number of records loaded (step_failed is left set if any database call failed)
+# with batch-commit, the step is one unit of work; committed on success, otherwise rolled back as a whole
+# without batch-commit, a step that raises leaves whatever it wrote before the exception (each call having been committed)
+def load_step(step, month, function, *args):
+	global step_failed
+	step_failed = False
+	loaded = None
+	try:
+		loaded = function(*args)
+	except Exception as ex:
+		print 'ERR: load_step ' + step + ' (' + month + ') failed.'
+		template = " - An exception of type {0} occurred. Arguments:\n{1!r}"
+		message = template.format(type(ex).__name__, ex.args)
+		print message
+		step_failed = True
+	if 'batch-commit' not in options:
+		return loaded
+	if step_failed:
+		print 'ERR: load_step ' + step + ' (' + month + ') rolled back.'
+		db.rollback()
+		id_cache_clear() # ids cached during the step may belong to rows just rolled back; the cache reloads from the database as needed
+		return None
+	db.commit()
+	return loaded
+
+# loads all ids of given table and type into id_cache (one query, only once per load)
+def id_cache_preload(table, type):
+	if (table, type) in id_cache_preloaded:
+		return True
+	if table == 'place':
+		columns = 'identifier, hex(id), longitude, latitude'
+	else:
+		columns = 'identifier, hex(id)'
+	id_cache_cursor = db.cursor()
+	# oldest first, so the latest record with an identifier wins (as the post_police_* lookups)
+	query = 'select ' + columns + ' from ' + table + ' where type = %s and identifier is not null order by ifnull(timestamp_updated, timestamp_created)'
+	try:
+		id_cache_cursor.execute(query, (type,))
+	except:
+		print('ERR: Unable to get run query "' + query + '"')
+		id_cache_cursor.close()
+		return False
+	for row in id_cache_cursor.fetchall():
+		if table == 'place':
+			id_cache[(table, type, row[0])] = (row[1], row[2], row[3])
+		else:
+			id_cache[(table, type, row[0])] = row[1]
+	id_cache_cursor.close()
+	id_cache_preloaded.add((table, type))
+	return True
+
+# returns cached id of given table, type and identifier (None if not known)
+def id_cache_get(table, type, identifier):
+	if identifier is None:
+		return None
+	if (table, type) not in id_cache_preloaded:
+		id_cache_preload(table, type)
+	return id_cache.get((table, type, unicode(identifier).strip()))
+
+# adds id of given table, type and identifier to id_cache (eg once it has been posted)
+def id_cache_put(table, type, identifier, id):
+	if identifier is not None and id is not None:
+		id_cache[(table, type, unicode(identifier).strip())] = id
+
+# adds ids resolved by a merge_police_*_stage procedure (table, type, identifier, id, longitude, latitude) to id_cache
+def id_cache_put_resolved(rows):
+	for table, type, identifier, id, longitude, latitude in rows:
+		if table == 'place':
+			id_cache_put(table, type, identifier, (id, longitude, latitude))
+		else:
+			id_cache_put(table, type, identifier, id)
+
+# empties id_cache (at the end of a load, since ids may be deleted or merged between loads)
+def id_cache_clear():
+	id_cache.clear()
+	id_cache_preloaded.clear()
+
+# returns cached id of police-location, if it is at the given lat/long (otherwise the merge decides which place to use)
+def get_location_id(location_id, latitude, longitude):
+	location = id_cache_get('place', 'police-location', location_id)
+	if location is None or latitude is None or longitude is None or location[1] is None or location[2] is None:
+		return None
+	if abs(float(longitude) - location[1]) > location_tolerance or abs(float(latitude) - location[2]) > location_tolerance:
+		return None
+	return location[0]
+
+# returns cache file name for police API url and payload (a checksum of both, so identical requests share a file)
+def cache_file(url, payload):
+	key = json.dumps([url.strip('/'), payload], sort_keys=True)
+	checksum = hashlib.sha1(key).hexdigest()
+	return os.path.join(cache_dir, checksum[0:2], checksum + '.json')
+
+# returns number of seconds a cached police API response remains fresh
+def get_cache_ttl(url, payload):
+	if url.strip('/') == 'crime-last-updated':
+		return cache_ttl['crime-last-updated']
+	if payload is not None and 'date' in payload:
+		try:
+			month = datetime.strptime(payload['date'], '%Y-%m')
+		except:
+			return cache_ttl['recent-month']
+		if month < datetime.today() - relativedelta.relativedelta(months=recent_months):
+			return cache_ttl['month']
+		return cache_ttl['recent-month']
+	return cache_ttl['default']
+
+# yields each record of a JSON array (or a lone JSON object) read a chunk at a time, so only one record is ever decoded and held
+# raises ValueError if the JSON is malformed or ends part way through
+def iter_json_records(chunks):
+	decoder = json.JSONDecoder()
+	buffer = ''
+	state = 'start'	# 'start' (before '['), 'item' (expecting record), 'next' (expecting ',' or ']') or 'done'
+	for chunk in chunks:
+		buffer = buffer + chunk
+		pos = 0
+		while state != 'done':
+			while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+				pos = pos + 1
+			if pos >= len(buffer):
+				break
+			if state == 'start' and buffer[pos] == '[':
+				state = 'item'
+				pos = pos + 1
+			elif state in ('item', 'next') and buffer[pos] == ']':
+				state = 'done'
+				pos = pos + 1
+			elif state == 'next':
+				if buffer[pos] != ',':
+					raise ValueError('Unexpected ' + repr(buffer[pos]) + ' in police API response')
+				state = 'item'
+				pos = pos + 1
+			else:
+				# a record (or the whole response, if it isnt a list)
+				try:
+					record, pos = decoder.raw_decode(buffer, pos)
+				except ValueError:
+					break # record incomplete; wait for next chunk
+				if record is not None:
+					yield record
+				state = 'next' if state == 'item' else 'done'
+		buffer = buffer[pos:]
+	if state not in ('start', 'done') or len(buffer.strip()) > 0:
+		raise ValueError('Incomplete police API response')
+
+# returns iterator of cached police API response records, or None if not cached (or stale, unless offline)
+def cache_read(url, payload):
+	file_name = cache_file(url, payload)
+	if not os.path.isfile(file_name):
+		return None
+	if not offline and time() - os.path.getmtime(file_name) > get_cache_ttl(url, payload):
+		return None
+	try:
+		cache = open(file_name, 'r')
+	except:
+		print 'ERR: cache_read unable to read "' + file_name + '".'
+		return None
+	return iter_file_records(cache)
+
+# yields each record of a cached police API response, closing the file once read
+def iter_file_records(cache):
+	try:
+		for record in iter_json_records(iter(lambda: cache.read(json_chunk), '')):
+			yield record
+	finally:
+		cache.close()
+
+# passes police API response records through, caching them as they go
+# written to a temporary file then renamed once every record has been read, so concurrent fetches never see part of a file
+def cache_write(url, payload, records):
+	file_name = cache_file(url, payload)
+	temp_file_name = file_name + '.' + str(os.getpid()) + '.' + str(threading.current_thread().ident)
+	if not os.path.isdir(os.path.dirname(file_name)):
+		try:
+			os.makedirs(os.path.dirname(file_name))
+		except OSError:
+			pass # another fetch thread got there first
+	try:
+		cache = open(temp_file_name, 'w')
+	except:
+		print 'ERR: cache_write unable to write "' + file_name + '".'
+		cache = None
+	complete = False
+	try:
+		if cache is not None:
+			cache.write('[')
+		count = 0
+		for record in records:
+			if cache is not None:
+				if count > 0:
+					cache.write(',')
+				json.dump(record, cache)
+			count = count + 1
+			yield record
+		if cache is not None:
+			cache.write(']')
+		complete = True
+	finally:
+		if cache is not None:
+			cache.close()
+			try:
+				if complete:
+					os.rename(temp_file_name, file_name)
+				else:
+					os.remove(temp_file_name)
+			except:
+				print 'ERR: cache_write unable to write "' + file_name + '".'
+
+# returns name of police API endpoint at given url (as endpoint_limits; force specific urls are 'boundary' or 'neighbourhoods')
+def get_endpoint(url):
+	parts = url.strip('/').split('/')
+	if parts[-1] == 'boundary':
+		return 'boundary'
+	if parts[0] in endpoint_limits:
+		return parts[0]
+	return 'neighbourhoods'
+
+# returns (retries, timeouts) of police API endpoint at given url
+def get_endpoint_limits(url):
+	return endpoint_limits.get(get_endpoint(url), endpoint_limits['default'])
+
+# passes police API response through, counting its bytes
+def count_bytes(endpoint, chunks):
+	for chunk in chunks:
+		metrics_count('http', endpoint, bytes=len(chunk))
+		yield chunk
+
+# returns seconds to wait before given retry attempt; exponential backoff with full jitter, but never less than any Retry-After sent
+def get_backoff(attempt, response):
+	backoff = random.uniform(0, min(wait_max, wait * 2 ** (attempt - 1)))
+	if response is not None and 'Retry-After' in response.headers:
+		try:
+			backoff = max(backoff, float(response.headers['Retry-After']))
+		except ValueError:
+			pass # http-date form; stick with backoff
+	return backoff
+
+# returns iterator of records (JSON dicts) returned by given URL, parsed from the response stream as they are read
 # automatically prepends API base URL
+# served from (and saved to) the response cache if --cache is specified
 # police data API may return list (of JSON dict) or naked JSON dict
-# needs to wait and retry on failure (police website a bit odd)
-def get_police_data(url, payload):
+# needs to wait and retry on failure (police website a bit odd); a failure part way through the response raises an exception instead
+# requests are rate limited by rate_bucket; client errors (4xx bar 429) arent retried
+# if split, a 503 (too many records for the poly) raises TileOverflow straight away, as does a response missing from the cache offline
+def get_police_records(url, payload, split=False):
 	if url is None :
-		print "ERR: get_police_data : must specify url"
+		print "ERR: get_police_records : must specify url"
 		return None
+	endpoint = get_endpoint(url)
+	if cache_dir is not None:
+		records = cache_read(url, payload)
+		if records is not None:
+			metrics_count('http', endpoint, cache_hits=1)
+			return records
+		if offline:
+			if split:
+				raise TileOverflow(url)
+			print('ERR: "' + api_url + url + '" using payload "'+ str(payload) + '" is not cached (offline).' )
+			return None
+	retry, timeout = get_endpoint_limits(url)
 	success = False
 	attempt = 1
 	## loop attempts
 	while (attempt <= retry) and not success:
 		success = True
+		r = None
 		# attempt to get url
-		if payload is None:
-			try:
-				r = requests.get(api_url + url)
-			except:
-				success = False
-		else:
-			try:
-				r = requests.get(api_url + url, params=payload)
-			except:
-				success = False
+		rate_bucket.take()
+		started = time()
+		try:
+			r = http_session.get(api_url + url, params=payload, stream=True, timeout=timeout)
+		except:
+			success = False
+		metrics_time('http', endpoint, time() - started, failures=int(not success or r.status_code != 200), retries=int(attempt > 1))
 		# expect 200 code back
+		if success and split and r.status_code == 503:
+			r.close()
+			raise TileOverflow(url)
 		if success and (r.status_code != 200):
+			r.close()
 			success = False
+			if 400 <= r.status_code < 500 and r.status_code != 429:
+				break # wont improve on retry
 		# prepare to loop on failure
 		if not success:
 			attempt = attempt + 1
 			if attempt <= retry:
-				sleep(wait)
+				backoff = get_backoff(attempt - 1, r)
+				if r is not None and r.status_code == 429:
+					rate_bucket.pause(backoff)
+				sleep(backoff)
 	# print "DBG: " + str(r.url)
 	# after success or all retries exhausted
-	# make sure list of dict always returned
-	if success and r.json() is not None:
-		if type(r.json()) is ListType:
-			return r.json()
-		else:
-			return [r.json()]
-			#print('Unable to get JSON from "' + api_url + url + '"' )
-			# sys.exit(1)
-			#return None
-	else:
+	if not success:
 		print('ERR: Unable to get data from "' + api_url + url + '" using payload "'+ str(payload) + '".' )
-		# sys.exit(1)
 		return None
+	records = iter_json_records(count_bytes(endpoint, r.iter_content(chunk_size=json_chunk)))
+	if cache_dir is not None:
+		records = cache_write(url, payload, records)
+	return records
+
+# returns python map (ie assoc array) of JSON returned by given URL
+# make sure list of dict always returned (None on failure)
+def get_police_data(url, payload, split=False):
+	records = get_police_records(url, payload, split)
+	if records is None:
+		return None
+	try:
+		return list(records)
+	except Exception as ex:
+		print('ERR: Unable to get data from "' + api_url + url + '" using payload "'+ str(payload) + '".' )
+		template = " - An exception of type {0} occurred. Arguments:\n{1!r}"
+		message = template.format(type(ex).__name__, ex.args)
+		print message
+		return None
+
+# police_*_stage columns, in the same order as the post_police_* parameters (then any ids already known from id_cache)
+crime_fields = ['crime_category_code', 'crime_id', 'crime_persistent_id', 'context', 'month', 'location_type', 'location_subtype', \
+		'location_id', 'location_name', 'location_latitude', 'location_longitude', 'outcome_category_name', 'outcome_date', \
+		'category_id', 'place_id']
+outcome_fields = ['category_code', 'category_name', 'month', 'person_identifier', 'crime_category_code', 'crime_id', 'crime_persistent_id', 'context', 'crime_month', \
+		'location_type', 'location_subtype', 'location_id', 'location_name', 'location_latitude', 'location_longitude']
+stop_fields = ['datetime', 'outcome_linked_to_object_of_search', 'stop_type', 'operation', 'object_of_search', 'operation_name', \
+		'removal_of_more_than_outer_clothing', 'outcome', 'legislation', 'involved_person', \
+		'location_id', 'location_name', 'location_latitude', 'location_longitude', \
+		'gender', 'self_defined_ethnicity', 'officer_defined_ethnicity', 'age_range', \
+		'place_id']
+
+# maps police API crime record onto post_police_crime parameters (also the police_crime_stage columns)
+def crime_params(crime):
+	return [\
+		crime['category'], \
+		crime['id'], \
+		crime['persistent_id'], \
+		crime['context'], \
+		crime['month'], \
+		crime['location_type'] \
+			if 'location_type' in crime else None, \
+		crime['location_subtype'] \
+			if 'location_subtype' in crime else None,\
+		crime['location']['street']['id'], \
+		crime['location']['street']['name'], \
+		crime['location']['latitude'] \
+			if 'latitude' in crime['location'] else None, \
+		crime['location']['longitude'] \
+			if 'latitude' in crime['location'] else None, \
+		crime['outcome_status']['category'] \
+			if ('outcome_status' in crime and crime['outcome_status'] is not None and 'category' in crime['outcome_status']) else None, \
+		crime['outcome_status']['date'] \
+			if ('outcome_status' in crime and crime['outcome_status'] is not None and 'date' in crime['outcome_status']) else None \
+	]
+
+# maps police API outcome record onto post_police_outcome parameters (also the police_outcome_stage columns)
+def outcome_params(outcome):
+	return [\
+		outcome['category']['code'], \
+		outcome['category']['name'] \
+			if 'name' in outcome['category'] else None, \
+		outcome['date'], \
+		outcome['person_id'] \
+			if 'person_id' in outcome else None, \
+		outcome['crime']['category'] \
+			if ('crime' in outcome and outcome['crime'] is not None and 'category' in outcome['crime']) 		else None, \
+		outcome['crime']['id'] \
+			if ('crime' in outcome and outcome['crime'] is not None and 'id' in outcome['crime']) 			else None, \
+		outcome['crime']['persistent_id'] \
+			if ('crime' in outcome and outcome['crime'] is not None and 'persistent_id' in outcome['crime']) 	else None, \
+		outcome['crime']['context'] \
+			if ('crime' in outcome and outcome['crime'] is not None and 'context' in outcome['crime']) 		else None, \
+		outcome['crime']['month'] \
+			if ('crime' in outcome and outcome['crime'] is not None and 'month' in outcome['crime']) 		else None, \
+		outcome['crime']['location_type'] \
+			if ('crime' in outcome and outcome['crime'] is not None and 'location_type' in outcome['crime']) 	else None, \
+		outcome['crime']['location_subtype'] \
+			if ('crime' in outcome and outcome['crime'] is not None and 'location_subtype' in outcome['crime']) 	else None, \
+		outcome['crime']['location']['street']['id'] \
+			if (	'crime' 	in outcome 				and outcome['crime'] 				is not None and \
+				'location' 	in outcome['crime'] 			and outcome['crime']['location'] 		is not None and \
+				'street' 	in outcome['crime']['location'] 	and outcome['crime']['location']['street'] 	is not None and \
+				'id'		in outcome['crime']['location']['street'] \
+			) else None, \
+		outcome['crime']['location']['street']['name'] \
+			if (	'crime' 	in outcome 				and outcome['crime'] 				is not None and \
+				'location' 	in outcome['crime'] 			and outcome['crime']['location'] 		is not None and \
+				'street' 	in outcome['crime']['location'] 	and outcome['crime']['location']['street'] 	is not None and \
+				'name'		in outcome['crime']['location']['street'] \
+			) else None, \
+		outcome['crime']['location']['latitude'] \
+			if (	'crime' 	in outcome 				and outcome['crime'] 			is not None and \
+				'location' 	in outcome['crime'] 			and outcome['crime']['location'] 	is not None and \
+				'latitude'	in outcome['crime']['location'] \
+			) else None, \
+		outcome['crime']['location']['longitude'] \
+			if (	'crime' 	in outcome 				and outcome['crime'] 			is not None and \
+				'location' 	in outcome['crime'] 			and outcome['crime']['location'] 	is not None and \
+				'longitude'	in outcome['crime']['location'] \
+			) else None \
+	]
+
+# maps police API stop record onto post_police_stop parameters (also the police_stop_stage columns)
+def stop_params(stop):
+	return [\
+		stop['datetime'], \
+		stop['outcome_linked_to_object_of_search'] if 'outcome_linked_to_object_of_search' in stop else None, \
+		stop['type'], \
+		stop['operation'] \
+			if 'operation' in stop else None, \
+		stop['object_of_search'] \
+			if 'object_of_search' in stop else None, \
+		stop['operation_name'] \
+			if 'operation_name' in stop else None, \
+		stop['removal_of_more_than_outer_clothing'] \
+			if 'removal_of_more_than_outer_clothing' in stop else None, \
+		#stop['outcome'] \
+		#	if 'outcome' in stop else None, \
+		stop['outcome_object']['name'] \
+			if ('outcome_object' in stop and stop['outcome_object'] is not None and 'name' in stop['outcome_object']) else None, \
+		stop['legislation'] \
+			if 'legislation' in stop else None, \
+		stop['involved_person'] \
+			if 'involved_person' in stop else None, \
+		stop['location']['street']['id'] \
+			if ('location' in stop and stop['location'] is not None and 'street' in stop['location'] and stop['location']['street'] is not None and 'id' in stop['location']['street']) else None, \
+		stop['location']['street']['name'] \
+			if ('location' in stop and stop['location'] is not None and 'street' in stop['location'] and stop['location']['street'] is not None and 'name' in stop['location']['street']) else None, \
+		stop['location']['latitude'] \
+			if ('location' in stop and stop['location'] is not None and 'latitude' in stop['location']) else None, \
+		stop['location']['longitude'] \
+			if ('location' in stop and stop['location'] is not None and 'longitude' in stop['location']) else None, \
+		stop['gender'] \
+			if 'gender' in stop else None, \
+		stop['self_defined_ethnicity'] \
+			if 'self_defined_ethnicity' in stop else None, \
+		stop['officer_defined_ethnicity'] \
+			if 'officer_defined_ethnicity' in stop else None, \
+		stop['age_range'] \
+			if 'age_range' in stop else None \
+	]
+
+# maps police API crime record onto police_crime_stage columns (post_police_crime parameters plus any ids known from id_cache)
+def crime_row(crime):
+	params = crime_params(crime)
+	return params + [\
+		id_cache_get('category', 'police-crime', params[0].strip().lower() if params[0] is not None else None), \
+		get_location_id(params[7], params[9], params[10]) \
+	]
+
+# maps police API stop record onto police_stop_stage columns (post_police_stop parameters plus any id known from id_cache)
+def stop_row(stop):
+	params = stop_params(stop)
+	return params + [get_location_id(params[10], params[12], params[13])]
+
+# fetches police API details and boundary for one neighbourhood
+# runs in fetch_pool worker threads, so must not touch the database
+def fetch_neighbourhood(force_id, neighbourhood_identifier):
+	specific_neighbourhood = get_police_data( force_id + '/' + neighbourhood_identifier, None)
+	boundaries = get_police_data( force_id + '/' + neighbourhood_identifier + '/boundary', None)
+	return (neighbourhood_identifier, specific_neighbourhood, boundaries)
+
+# adds extension fields (dict of field : value) to record id in a single post_extensions call
+# binds parameters rather than going through mysql_function, which strips the quotes json needs
+def post_extensions(id, fields):
+	global step_failed
+	fields = dict((field, value) for field, value in fields.items() if value is not None and len(unicode(value).strip()) > 0)
+	if id is None or len(fields) == 0:
+		return True
+	mysql_cursor = db.cursor()
+	started = time()
+	try:
+		mysql_cursor.execute('select post_extensions(%s, %s)', (id, json.dumps(fields)))
+	except Exception as ex:
+		print 'ERR: post_extensions for ' + repr(id) + ' failed.'
+		template = " - An exception of type {0} occurred. Arguments:\n{1!r}"
+		message = template.format(type(ex).__name__, ex.args)
+		print message
+		step_failed = True
+		mysql_cursor.close()
+		metrics_time('db', 'post_extensions', time() - started, failures=1)
+		return None
+	resultset = mysql_cursor.fetchone()
+	metrics_time('db', 'post_extensions', time() - started, failures=0)
+	if 'batch-commit' not in options:
+		db.commit()
+	mysql_cursor.close()
+	if resultset is not None:
+		return resultset[0]
+	return None
 
-# loads police API contacts or engagement methods into extension blob
+# loads police API contacts or engagement methods (plus any other fields given) into extension blob in one call
 # note - data must point to ONE LINE in data array, ie data[1] or data[0] etc
-def load_contacts(id, data):
+def load_contacts(id, data, fields=None):
+	fields = dict((field, value) for field, value in (fields or {}).items() if value is not None)
 	if 'engagement_methods' in data :
 		for engagement_method in data['engagement_methods'] :
-			mysql_function('post_extension',[id, engagement_method['title'], engagement_method['url'] ])
+			if engagement_method['url'] is not None:
+				fields.setdefault(engagement_method['title'], engagement_method['url'])
 	if 'contact_details' in data :
 		for field in data['contact_details'] :
-			mysql_function('post_extension',[id, field, data['contact_details'].get(field) ])
+			if data['contact_details'].get(field) is not None:
+				fields.setdefault(field, data['contact_details'].get(field))
+	return post_extensions(id, fields)
 
 # loads police force data for the region 
 # this is a compromise; actually loads force data for each of the MBR corners of the region. May not work if region is v large
 def load_force(place):
-	if region is None:
+	if place is None:
 		print "ERR: load_force : must specify place"
 		return None
 	load_force_cursor = db.cursor()
@@ -220,323 +934,930 @@ def load_force(place):
 	for point in point_list :
 		force_id = get_police_data('locate-neighbourhood',{'q': point})[0]['force']
 
+		# each force is only loaded once per run, however many regions (or region corners) it covers
+		if force_id in loaded_forces:
+			continue
+		loaded_forces.add(force_id)
+
 		# load force data
-		organisation_id = mysql_function('get_organisation', ['identifier', force_id ])
-		if len(json.loads(organisation_id)) > 0 :
-			organisation_id = json.loads(organisation_id)[0]['id']
+		organisation_id = id_cache_get('organisation', 'police-force', force_id)
+		if organisation_id is not None :
 			force_new = False
 		else :
 			#print "DBG: Loading force : " + force_id
 			force_data = get_police_data('forces/'+ force_id, None)
 			organisation_id = mysql_function('post_organisation',['police-force', force_id, force_data[0]['name'], force_data[0]['description'] ])
+			id_cache_put('organisation', 'police-force', force_id, organisation_id)
 			force_new = True
 
 			if organisation_id is not None :
-				mysql_function('post_extension',[organisation_id, 'url', force_data[0]['url'] ])
-				mysql_function('post_extension',[organisation_id, 'telephone', force_data[0]['telephone'] ])
-				load_contacts(organisation_id, force_data[0])
+				load_contacts(organisation_id, force_data[0], {'url': force_data[0]['url'], 'telephone': force_data[0]['telephone']})
 
 		# load force neighbourhood data
+		# details and boundaries of new neighbourhoods are fetched concurrently by fetch_pool; database writes stay in this thread
 		count = 0
 		neighbourhoods = get_police_data( force_id + '/neighbourhoods', None)
+		new_neighbourhoods = []
+		neighbourhood_relations = []
 		for neighbourhood in neighbourhoods :
-			count = count + 1
-			if force_new or mysql_function('exists_place', ['identifier', neighbourhood['id'] ]) == 0 :
-				#print "DBG: Loading neighbourhood " + str(count) + "/" + str(len(neighbourhoods)) + " : " + neighbourhood['id']
-				specific_neighbourhood = get_police_data( force_id + '/' + neighbourhood['id'], None)
-				neighbourhood_id = mysql_function('post_place',['police-neighbourhood', neighbourhood['id'], specific_neighbourhood[0]['name'], specific_neighbourhood[0]['description'], None, None, specific_neighbourhood[0]['centre']['longitude'], specific_neighbourhood[0]['centre']['latitude'], None ])
-
-				if neighbourhood_id is not None:
-					mysql_function('post_relation', [None, organisation_id, neighbourhood_id])
-					mysql_function('post_extension', [neighbourhood_id, 'population', specific_neighbourhood[0]['population'] ])
-					load_contacts(neighbourhood_id, specific_neighbourhood[0])
-
-					# load polygon
-					boundaries = get_police_data( force_id + '/' + neighbourhood['id'] + '/boundary', None)
-					boundary_string = ''
-					for boundary in boundaries:
-						if len(boundary_string) == 0:
-							boundary_string = boundary['longitude'] + ' ' + boundary['latitude']
-							starting_point = boundary_string
+			if force_new or id_cache_get('place', 'police-neighbourhood', neighbourhood['id']) is None :
+				new_neighbourhoods.append(neighbourhood['id'])
+		# relations of neighbourhoods already posted are posted however the loop ends, as later runs treat those neighbourhoods as known
+		try:
+			for neighbourhood_identifier, specific_neighbourhood, boundaries in fetch_pool.imap(lambda n: fetch_neighbourhood(force_id, n), new_neighbourhoods):
+				count = count + 1
+				#print "DBG: Loading neighbourhood " + str(count) + "/" + str(len(new_neighbourhoods)) + " : " + neighbourhood_identifier
+				if specific_neighbourhood is not None:
+					neighbourhood_id = mysql_function('post_place',['police-neighbourhood', neighbourhood_identifier, specific_neighbourhood[0]['name'], specific_neighbourhood[0]['description'], None, None, specific_neighbourhood[0]['centre']['longitude'], specific_neighbourhood[0]['centre']['latitude'], None ])
+
+					if neighbourhood_id is not None:
+						id_cache_put('place', 'police-neighbourhood', neighbourhood_identifier, (neighbourhood_id, None, None))
+						if 'no-bulk-load' in options:
+							mysql_function('post_relation', [None, organisation_id, neighbourhood_id])
 						else:
-							boundary_string = boundary_string + ',' + boundary['longitude'] + ' ' + boundary['latitude']
-					boundary_string = boundary_string + ',' + starting_point
-					query = "update place set polygon = ST_GeometryFromText('POLYGON((" + boundary_string  + "))'," + SRID + ") where type = 'police-neighbourhood' and identifier = '" + str(neighbourhood['id'] +"'")
-					try:
-						load_force_cursor.execute(query)
-					except:
-						print('ERR: Unable to get run query "' + query + '"')
-						return False
+							neighbourhood_relations.append([None, organisation_id, neighbourhood_id])
+						load_contacts(neighbourhood_id, specific_neighbourhood[0], {'population': specific_neighbourhood[0]['population']})
+
+						# load polygon
+						boundary_string = ''
+						for boundary in boundaries or []:
+							if len(boundary_string) == 0:
+								boundary_string = boundary['longitude'] + ' ' + boundary['latitude']
+								starting_point = boundary_string
+							else:
+								boundary_string = boundary_string + ',' + boundary['longitude'] + ' ' + boundary['latitude']
+						if len(boundary_string) == 0:
+							continue
+						boundary_string = boundary_string + ',' + starting_point
+						query = "update place set polygon = ST_GeometryFromText('POLYGON((" + boundary_string  + "))'," + SRID + ") where type = 'police-neighbourhood' and identifier = '" + str(neighbourhood_identifier +"'")
+						try:
+							load_force_cursor.execute(query)
+						except:
+							print('ERR: Unable to get run query "' + query + '"')
+							load_force_cursor.close()
+							return False
+		finally:
+			post_relations(neighbourhood_relations)
 	load_force_cursor.close()
 	if force_data is not None:
 		return len(force_data)
 	else:
 		return 0
 
-# loads police categories
-def load_categories(month):
+# returns police API 'poly' string for the MBR of the given place
+def get_place_string(place):
+	place_string_cursor = db.cursor()
+	query = "select convert_geometry_to_police_string(mbr_polygon )from place where name = '" + place + "'"
+	try:
+		place_string_cursor.execute(query)
+	except:
+		print('ERR: Unable to get run query "' + query + '"')
+		# sys.exit(1)
+		return None
+	resultset = place_string_cursor.fetchone()
+	place_string_cursor.close()
+	if resultset is None:
+		return None
+	return resultset[0]
+
+# returns police API 'poly' string for the MBR of every region (looked up once, in the main thread, before fetching starts)
+def get_regions_string():
+	if len(regions) == 1:
+		return get_place_string(regions[0])
+	latitudes = []
+	longitudes = []
+	for region_name in regions:
+		region_string = get_place_string(region_name)
+		if region_string is None or len(region_string) == 0:
+			return None
+		for point in region_string.split(':'):
+			latitude, longitude = point.split(',')
+			latitudes.append(float(latitude))
+			longitudes.append(float(longitude))
+	return get_tile_string((min(latitudes), min(longitudes), max(latitudes), max(longitudes)))
+
+# returns police API 'date' string (YYYY-MM) for given month, or None if month isnt valid
+def get_month_string(month):
 	# check if month is valid
 	month = standardise_date(month)
-	if datetime.strptime(month, '%Y-%m-%d') > datetime.today():
-		print "ERR: load_crime : specify past month (" + month + ")"
+	if month is None or datetime.strptime(month, '%Y-%m-%d') > datetime.today():
+		print "ERR: get_month_string : must specify month (YYYY-MM-DD) and month must be in the past."
 		return None
-	month_string = '-'.join((month.split('-')[0], month.split('-')[1]))
+	return '-'.join((month.split('-')[0], month.split('-')[1]))
 
-	load_category_cursor = db.cursor()
+# returns region polygon as WKT (looked up once, in the main thread, before fetching starts)
+def get_place_polygon(place):
+	place_polygon_cursor = db.cursor()
+	query = "select st_astext(polygon) from place where name = %s and polygon is not null"
+	try:
+		place_polygon_cursor.execute(query, (place,))
+	except:
+		print('ERR: Unable to get run query "' + query + '"')
+		return None
+	resultset = place_polygon_cursor.fetchone()
+	place_polygon_cursor.close()
+	if resultset is None:
+		return None
+	return resultset[0]
+
+# returns list of rings (lists of (longitude, latitude)) of a POLYGON or MULTIPOLYGON WKT string
+def parse_wkt_rings(wkt):
+	rings = []
+	for ring in re.findall('\(([^()]+)\)', wkt):
+		points = []
+		for point in ring.split(','):
+			coords = point.split()
+			points.append((float(coords[0]), float(coords[1])))
+		if len(points) > 2:
+			rings.append(points)
+	return rings
+
+# adds polygon of given region to region_shapes, indexing its edges by latitude band (see in_region)
+# each region is kept as a shape of its own, so a point where regions overlap is still inside (rather than toggled out by the even-odd rule)
+def set_region_shape(wkt, region_name):
+	global region_bounds
+	rings = parse_wkt_rings(wkt)
+	if len(rings) == 0:
+		return False
+	longitudes = [point[0] for ring in rings for point in ring]
+	latitudes = [point[1] for ring in rings for point in ring]
+	bounds = (min(latitudes), min(longitudes), max(latitudes), max(longitudes))
+	bands = [[] for band in range(region_band_count)]
+	for ring in rings:
+		for i in range(len(ring)):
+			x1, y1 = ring[i - 1]
+			x2, y2 = ring[i]
+			for band in range(get_band(bounds, min(y1, y2)), get_band(bounds, max(y1, y2)) + 1):
+				bands[band].append((x1, y1, x2, y2))
+	region_shapes.append((bounds, bands))
+	region_shape_names.append(region_name)
+	if region_bounds is None:
+		region_bounds = bounds
+	else:
+		region_bounds = (min(region_bounds[0], bounds[0]), min(region_bounds[1], bounds[1]), max(region_bounds[2], bounds[2]), max(region_bounds[3], bounds[3]))
+	return True
 
+# covers the region polygons (see set_region_shape) with tiles of tile_size degrees; tiles shared by several regions are only listed once
+def set_region_tiles():
+	global region_tiles
+	region_tiles = []
+	rows = max(1, int(round((region_bounds[2] - region_bounds[0]) / tile_size + 0.4999)))
+	columns = max(1, int(round((region_bounds[3] - region_bounds[1]) / tile_size + 0.4999)))
+	for row in range(rows):
+		for column in range(columns):
+			tile = (region_bounds[0] + row * tile_size, region_bounds[1] + column * tile_size,
+				region_bounds[2] if row == rows - 1 else region_bounds[0] + (row + 1) * tile_size,
+				region_bounds[3] if column == columns - 1 else region_bounds[1] + (column + 1) * tile_size)
+			if tile_in_region(tile):
+				region_tiles.append(tile)
+	return True
+
+# returns index of latitude's band in a shape with given bounds
+def get_band(bounds, latitude):
+	height = (bounds[2] - bounds[0]) / region_band_count
+	if height <= 0:
+		return 0
+	return max(0, min(region_band_count - 1, int((latitude - bounds[0]) / height)))
+
+# returns true if point is inside shape (even-odd rule, so holes and multipolygons work)
+def in_shape(shape, latitude, longitude):
+	bounds, bands = shape
+	if latitude < bounds[0] or latitude > bounds[2] or longitude < bounds[1] or longitude > bounds[3]:
+		return False
+	inside = False
+	for x1, y1, x2, y2 in bands[get_band(bounds, latitude)]:
+		if (y1 > latitude) != (y2 > latitude) and longitude < (x2 - x1) * (latitude - y1) / (y2 - y1) + x1:
+			inside = not inside
+	return inside
+
+# returns names of regions holding point; every region if there is only one (its records are all its own, even without a polygon)
+# or if point is None (records without a location are kept, see in_tile)
+def get_point_regions(point):
+	if len(regions) == 1 or point is None:
+		return regions
+	return [region_name for region_name, shape in zip(region_shape_names, region_shapes) if in_shape(shape, point[0], point[1])]
+
+# returns true if point is inside any region polygon
+def in_region(latitude, longitude):
+	for shape in region_shapes:
+		if in_shape(shape, latitude, longitude):
+			return True
+	return False
+
+# returns true if tile may overlap shape (a corner is inside it, or an edge's bounding box overlaps the tile)
+def tile_in_shape(shape, tile):
+	bounds, bands = shape
+	min_latitude, min_longitude, max_latitude, max_longitude = tile
+	if min_latitude > bounds[2] or max_latitude < bounds[0] or min_longitude > bounds[3] or max_longitude < bounds[1]:
+		return False
+	for latitude, longitude in ((min_latitude, min_longitude), (min_latitude, max_longitude), (max_latitude, min_longitude), (max_latitude, max_longitude)):
+		if in_shape(shape, latitude, longitude):
+			return True
+	for band in range(get_band(bounds, min_latitude), get_band(bounds, max_latitude) + 1):
+		for x1, y1, x2, y2 in bands[band]:
+			if min(y1, y2) <= max_latitude and max(y1, y2) >= min_latitude and min(x1, x2) <= max_longitude and max(x1, x2) >= min_longitude:
+				return True
+	return False
+
+# returns true if tile may overlap any region polygon
+def tile_in_region(tile):
+	for shape in region_shapes:
+		if tile_in_shape(shape, tile):
+			return True
+	return False
+
+# returns the quarters of tile that may overlap the region polygon
+def split_tile(tile):
+	min_latitude, min_longitude, max_latitude, max_longitude = tile
+	mid_latitude = (min_latitude + max_latitude) / 2
+	mid_longitude = (min_longitude + max_longitude) / 2
+	quarters = [
+		(min_latitude, min_longitude, mid_latitude, mid_longitude),
+		(min_latitude, mid_longitude, mid_latitude, max_longitude),
+		(mid_latitude, min_longitude, max_latitude, mid_longitude),
+		(mid_latitude, mid_longitude, max_latitude, max_longitude)
+	]
+	return [quarter for quarter in quarters if tile_in_region(quarter)]
+
+# returns police API 'poly' string (<lat>,<long>:<lat>,<long>...) for tile
+def get_tile_string(tile):
+	min_latitude, min_longitude, max_latitude, max_longitude = tile
+	return ':'.join(['%.6f,%.6f' % point for point in ((max_latitude, min_longitude), (max_latitude, max_longitude), (min_latitude, max_longitude), (min_latitude, min_longitude))])
+
+# returns true if (latitude, longitude) is in the tile and the region
+# max edges are exclusive (bar those on the region's own bounds), so a point on an edge shared by two tiles belongs to one
+# records without a location are kept (see iter_region_records)
+def in_tile(point, tile):
+	if point is None:
+		return True
+	latitude, longitude = point
+	if latitude < tile[0] or longitude < tile[1] or latitude > tile[2] or longitude > tile[3]:
+		return False
+	if (latitude == tile[2] and tile[2] < region_bounds[2]) or (longitude == tile[3] and tile[3] < region_bounds[3]):
+		return False
+	return in_region(latitude, longitude)
+
+# (latitude, longitude) of police API crime, outcome and stop records (None if not located)
+def get_point(params, latitude_index):
+	if params[latitude_index] is None or params[latitude_index + 1] is None:
+		return None
+	return (float(params[latitude_index]), float(params[latitude_index + 1]))
+
+def crime_point(crime):
+	return get_point(crime_params(crime), 9)
+
+def outcome_point(outcome):
+	return get_point(outcome_params(outcome), 13)
+
+def stop_point(stop):
+	return get_point(stop_params(stop), 12)
+
+# keys used to drop records returned by more than one tile; crimes by crime id, anything without a location by its checksum
+def crime_key(crime):
+	return crime['id'] if 'id' in crime else None
+
+def outcome_key(outcome):
+	if outcome_point(outcome) is not None:
+		return None
+	return hashlib.sha1(json.dumps(outcome, sort_keys=True)).digest()
+
+def stop_key(stop):
+	if stop_point(stop) is not None:
+		return None
+	return hashlib.sha1(json.dumps(stop, sort_keys=True)).digest()
+
+# opens one tile's police API response; runs in tile_pool worker threads, so must not touch the database
+# returns (records iterator, None), or (None, quarters) if the police API says the tile holds too many records (known from its 503,
+# before any body is read), or (None, None) on failure or once the tile has been split tile_depth times
+def open_tile(url, month_string, tile, depth):
+	try:
+		return (get_police_records(url, {'poly': get_tile_string(tile), 'date': month_string}, True), None)
+	except TileOverflow:
+		if depth >= tile_depth:
+			print 'ERR: open_tile : "' + api_url + url + '" (' + month_string + ') tile "' + get_tile_string(tile) + '" still holds too many records after ' + str(tile_depth) + ' splits.'
+			return (None, None)
+		return (None, [(quarter, depth + 1) for quarter in split_tile(tile)])
+
+# yields region records of given police API url and month, streaming each tile in turn
+# about workers tiles are opened ahead, so fetching stays concurrent without the month ever being held in memory;
+# a split tile's quarters take its place, so records always come in the same order (and the payload checksum is stable)
+# only records located in their tile are kept; raises IOError if any tile cant be fetched
+def iter_region_records(url, month_string, point, key):
+	seen = set()
+	waiting = collections.deque((tile, 0) for tile in region_tiles)
+	opening = collections.deque()	# (tile, depth, result of open_tile), in region order
+	while len(waiting) > 0 or len(opening) > 0:
+		while len(waiting) > 0 and len(opening) < workers:
+			tile, depth = waiting.popleft()
+			opening.append((tile, depth, tile_pool.apply_async(open_tile, (url, month_string, tile, depth))))
+		tile, depth, result = opening.popleft()
+		records, quarters = result.get()
+		if quarters is not None:
+			opening.extendleft(reversed([(quarter, quarter_depth, tile_pool.apply_async(open_tile, (url, month_string, quarter, quarter_depth))) \
+				for quarter, quarter_depth in quarters]))
+			continue
+		if records is None:
+			raise IOError('Unable to get "' + api_url + url + '" (' + month_string + ') for every region tile')
+		for record in records:
+			if not in_tile(point(record), tile):
+				continue
+			record_key = key(record)
+			if record_key is not None:
+				if record_key in seen:
+					continue
+				seen.add(record_key)
+			yield record
+
+# fetches region records of given police API url and month; tile by tile if region_tiles is set, otherwise by the region's MBR
+# returns a list of records, or an iterator of records if get is get_police_records
+def fetch_region(url, month_string, get, point, key):
+	if region_tiles is None:
+		return get(url, {'poly': place_string, 'date': month_string})
+	records = iter_region_records(url, month_string, point, key)
+	if get is get_police_records:
+		return records
+	try:
+		return list(records)
+	except Exception as ex:
+		print 'ERR: fetch_region "' + api_url + url + '" (' + month_string + ') failed.'
+		template = " - An exception of type {0} occurred. Arguments:\n{1!r}"
+		message = template.format(type(ex).__name__, ex.args)
+		print message
+		return None
+
+# fetches police categories
+# fetch_* functions run in fetch_pool worker threads, so must not touch the database
+# they return a list of records, or an iterator of records if get is get_police_records
+def fetch_categories(month, get=get_police_data):
+	month_string = get_month_string(month)
+	if month_string is None:
+		return None
+	return get('crime-categories',{'date': month_string})
+
+# fetches crime data (returns no data before 2010-12)
+def fetch_crimes(month, get=get_police_data):
+	month_string = get_month_string(month)
+	if place_string is None or month_string is None:
+		return None
+	return fetch_region('/crimes-street/all-crime', month_string, get, crime_point, crime_key)
+
+# fetches outcome data
+def fetch_outcomes(month, get=get_police_data):
+	month_string = get_month_string(month)
+	if place_string is None or month_string is None:
+		return None
+	return fetch_region('/outcomes-at-location', month_string, get, outcome_point, outcome_key)
+
+# fetches stops data
+# https://data.police.uk/api/stops-street?poly=52.268,0.543:52.794,0.238:52.130,0.478&date=2015-01
+def fetch_stops(month, get=get_police_data):
+	month_string = get_month_string(month)
+	if place_string is None or month_string is None:
+		return None
+	return fetch_region('/stops-street', month_string, get, stop_point, stop_key)
+
+# writes police categories
+def write_categories(month, crime_categories):
 	# load crime categories
-	crime_categories = get_police_data('crime-categories',{'date': month_string})
 	if crime_categories is not None and len(crime_categories) > 0:
 		for crime_category in crime_categories:
-			query = "select count(*) from category where type = 'police-crime' and identifier = '" + re.sub('[ -]+', '-', crime_category['url'].strip()) + "'"
-			try:
-				load_category_cursor.execute(query)
-			except:
-				print('ERR: Unable to get run query "' + query + '"')
-				# sys.exit(1)
-				return 0
-			category_count = load_category_cursor.fetchone()[0]
-			# print "DBG: category_count = " + str(category_count)
-			if category_count == 0 :
+			category_identifier = re.sub('[ -]+', '-', crime_category['url'].strip())
+			if id_cache_get('category', 'police-crime', category_identifier) is None :
 				output = mysql_function('post_category', [
 								'police-crime', 
-								re.sub('[ -]+', '-', crime_category['url'].strip()), 
+								category_identifier, 
 								crime_category['name'], 
 								'https://www.police.uk/about-this-site/faqs/#what-do-the-crime-categories-mean'
 								])
 				# print "DBG: output = " + str(output)
-	load_category_cursor.close()
+				id_cache_put('category', 'police-crime', category_identifier, output)
 	if crime_categories is not None:
 		return len(crime_categories)
 	else:
 		return 0
 
-# loads crime data
-def load_crimes(place, month):
-	# check if month is valid
-	month = standardise_date(month)
-
-	if region is None or month is None or datetime.strptime(month, '%Y-%m-%d') > datetime.today():
-		print "ERR: load_crime : must specify both region and month (YYYY-MM-DD) and month must be in the past."
-		return 0
-
-	# convert geography params into forms used by police API
-	load_crime_cursor = db.cursor()
-	query = "select convert_geometry_to_police_string(mbr_polygon )from place where name = '" + place + "'"
-	try:
-		load_crime_cursor.execute(query)
-	except:
-		print('ERR: Unable to get run query "' + query + '"')
-		# sys.exit(1)
-		return 0
-	place_string = load_crime_cursor.fetchone()
-	load_crime_cursor.close()
-	month_string = '-'.join((month.split('-')[0], month.split('-')[1]))
-
-	# load crime data (returns no data before 2010-12)
+# writes crime data
+def write_crimes(month, crimes):
 	count = 0
-	crimes = get_police_data( '/crimes-street/all-crime', {'poly': place_string, 'date': month_string})
 	if crimes is None or len(crimes) == 0:
 		#print "INF: No crimes to load"
 		return 0
 	else:
-		for crime in crimes:
-			count = count + 1
-			#if count >= 384: # debug code
-			#print "DBG: Loading crime " + str(count) + "/" + str(len(crimes)) + " : " + str(crime['id'])
-			#print repr(crime)
-				
-			crime_id = mysql_function('post_police_crime', [\
-					crime['category'], \
-					crime['id'], \
-					crime['persistent_id'], \
-					crime['context'], \
-					crime['month'], \
-					crime['location_type'] \
-						if 'location_type' in crime else None, \
-					crime['location_subtype'] \
-						if 'location_subtype' in crime else None,\
-					crime['location']['street']['id'], \
-					crime['location']['street']['name'], \
-					crime['location']['latitude'] \
-						if 'latitude' in crime['location'] else None, \
-					crime['location']['longitude'] \
-						if 'latitude' in crime['location'] else None, \
-					crime['outcome_status']['category'] \
-						if ('outcome_status' in crime and crime['outcome_status'] is not None and 'category' in crime['outcome_status']) else None, \
-					crime['outcome_status']['date'] \
-						if ('outcome_status' in crime and crime['outcome_status'] is not None and 'date' in crime['outcome_status']) else None \
-				])
-	if crimes is not None:
-		return len(crimes)
-	else:
-		return 0
-
-# loads outcome data
-def load_outcomes(place, month):
-	# check if month is valid
-	month = standardise_date(month)
-
-	if region is None or month is None or datetime.strptime(month, '%Y-%m-%d') > datetime.today():
-		print "ERR: load_crime : must specify both region and month (YYYY-MM-DD) and month must be in the past."
-		return 0
-
-	# convert geography params into forms used by police API
-	load_outcome_cursor = db.cursor()
-	query = "select convert_geometry_to_police_string(mbr_polygon )from place where name = '" + place + "'"
-	try:
-		load_outcome_cursor.execute(query)
-	except:
-		print('ERR: Unable to get run query "' + query + '"')
-		# sys.exit(1)
-		return 0
-	place_string = load_outcome_cursor.fetchone()
-	load_outcome_cursor.close()
-	month_string = '-'.join((month.split('-')[0], month.split('-')[1]))
+		if 'no-bulk-load' in options:
+			for crime in crimes:
+				count = count + 1
+				#print "DBG: Loading crime " + str(count) + "/" + str(len(crimes)) + " : " + str(crime['id'])
+				crime_id = mysql_function('post_police_crime', crime_params(crime))
+		else:
+			resolved = []
+			if stage_rows('police_crime_stage', crime_fields, [crime_row(crime) for crime in crimes]):
+				mysql_procedure('merge_police_crime_stage', [], resolved)
+				id_cache_put_resolved(resolved)
+	return len(crimes)
 
-	# load crime data (returns no data before 2010-12)
+# writes outcome data
+def write_outcomes(month, outcomes):
 	count = 0
-	outcomes = get_police_data( '/outcomes-at-location', {'poly': place_string, 'date': month_string})
 	if outcomes is None or len(outcomes) == 0:
 		#print "INF: No outcomes to load"
 		return 0
 	else:
-		for outcome in outcomes:
-			count = count + 1
-			# print "DBG: Loading outcome for crime " + str(count) + "/" + str(len(outcomes)) + " : " + str(outcome['crime']['id'])
-			# print outcome
-			
-			outcome_id = mysql_function('post_police_outcome', [\
-					outcome['category']['code'], \
-					outcome['category']['name'] \
-						if 'name' in outcome['category'] else None, \
-					outcome['date'], \
-					outcome['person_id'] \
-						if 'person_id' in outcome else None, \
-					outcome['crime']['category'] \
-						if ('crime' in outcome and outcome['crime'] is not None and 'category' in outcome['crime']) 		else None, \
-					outcome['crime']['id'] \
-						if ('crime' in outcome and outcome['crime'] is not None and 'id' in outcome['crime']) 			else None, \
-					outcome['crime']['persistent_id'] \
-						if ('crime' in outcome and outcome['crime'] is not None and 'persistent_id' in outcome['crime']) 	else None, \
-					outcome['crime']['context'] \
-						if ('crime' in outcome and outcome['crime'] is not None and 'context' in outcome['crime']) 		else None, \
-					outcome['crime']['month'] \
-						if ('crime' in outcome and outcome['crime'] is not None and 'month' in outcome['crime']) 		else None, \
-					outcome['crime']['location_type'] \
-						if ('crime' in outcome and outcome['crime'] is not None and 'location_type' in outcome['crime']) 	else None, \
-					outcome['crime']['location_subtype'] \
-						if ('crime' in outcome and outcome['crime'] is not None and 'location_subtype' in outcome['crime']) 	else None, \
-					outcome['crime']['location']['street']['id'] \
-						if (	'crime' 	in outcome 				and outcome['crime'] 				is not None and \
-							'location' 	in outcome['crime'] 			and outcome['crime']['location'] 		is not None and \
-							'street' 	in outcome['crime']['location'] 	and outcome['crime']['location']['street'] 	is not None and \
-							'id'		in outcome['crime']['location']['street'] \
-						) else None, \
-					outcome['crime']['location']['street']['name'] \
-						if (	'crime' 	in outcome 				and outcome['crime'] 				is not None and \
-							'location' 	in outcome['crime'] 			and outcome['crime']['location'] 		is not None and \
-							'street' 	in outcome['crime']['location'] 	and outcome['crime']['location']['street'] 	is not None and \
-							'name'		in outcome['crime']['location']['street'] \
-						) else None, \
-					outcome['crime']['location']['latitude'] \
-						if (	'crime' 	in outcome 				and outcome['crime'] 			is not None and \
-							'location' 	in outcome['crime'] 			and outcome['crime']['location'] 	is not None and \
-							'latitude'	in outcome['crime']['location'] \
-						) else None, \
-					outcome['crime']['location']['longitude'] \
-						if (	'crime' 	in outcome 				and outcome['crime'] 			is not None and \
-							'location' 	in outcome['crime'] 			and outcome['crime']['location'] 	is not None and \
-							'longitude'	in outcome['crime']['location'] \
-						) else None \
-				])
-	if outcomes is not None:
-		return len(outcomes)
-	else:
-		return 0
-
-# loads stops data
-# https://data.police.uk/api/stops-street?poly=52.268,0.543:52.794,0.238:52.130,0.478&date=2015-01
-def load_stops(place, month):
-	# check if month is valid
-	month = standardise_date(month)
+		if 'no-bulk-load' in options:
+			for outcome in outcomes:
+				count = count + 1
+				# print "DBG: Loading outcome for crime " + str(count) + "/" + str(len(outcomes)) + " : " + str(outcome['crime']['id'])
+				outcome_id = mysql_function('post_police_outcome', outcome_params(outcome))
+		else:
+			resolved = []
+			if stage_rows('police_outcome_stage', outcome_fields, [outcome_params(outcome) for outcome in outcomes]):
+				mysql_procedure('merge_police_outcome_stage', [], resolved)
+				id_cache_put_resolved(resolved)
+	return len(outcomes)
 
-	if region is None or month is None or datetime.strptime(month, '%Y-%m-%d') > datetime.today():
-		print "ERR: load_stops : must specify both region and month (YYYY-MM-DD) and month must be in the past."
+# writes stops data
+def write_stops(month, stops):
+	count = 0
+	if stops is None or len(stops) == 0:
+		#print "INF: No stops to load"
 		return 0
+	else:
+		if 'no-bulk-load' in options:
+			for stop in stops:
+				count = count + 1
+				#print "DBG: Loading stop " + str(count) + "/" + str(len(stops))
+				stop_id = mysql_function('post_police_stop', stop_params(stop))
+		else:
+			resolved = []
+			if stage_rows('police_stop_stage', stop_fields, [stop_row(stop) for stop in stops]):
+				mysql_procedure('merge_police_stop_stage', [], resolved)
+				id_cache_put_resolved(resolved)
+	return len(stops)
 
-	# convert geography params into forms used by police API
-	load_stop_cursor = db.cursor()
-	query = "select convert_geometry_to_police_string(mbr_polygon )from place where name = '" + place + "'"
+# returns police API force ids already in the database (archive files of any other force are skipped; none means no filter)
+def get_archive_forces():
+	forces = set()
+	archive_cursor = db.cursor()
+	query = "select identifier from organisation where type = 'police-force'"
 	try:
-		load_stop_cursor.execute(query)
+		archive_cursor.execute(query)
+		forces.update(row[0] for row in archive_cursor.fetchall() if row[0] is not None)
 	except:
 		print('ERR: Unable to get run query "' + query + '"')
-		# sys.exit(1)
-		return 0
-	place_string = load_stop_cursor.fetchone()
-	load_stop_cursor.close()
-	month_string = '-'.join((month.split('-')[0], month.split('-')[1]))
+	archive_cursor.close()
+	if len(forces) > 0:
+		forces.add('btp') # british transport police crimes fall within any region
+	return forces
 
-	# load crime data (returns no data before 2010-12)
-	count = 0
-	stops = get_police_data( '/stops-street', {'poly': place_string, 'date': month_string})
-	if stops is None or len(stops) == 0:
-		#print "INF: No stops to load"
-		return 0
-	else:
-		for stop in stops:
-			count = count + 1
-			#print "DBG: Loading stop " + str(count) + "/" + str(len(stops))
-			#print stop
-			
-			stop_id = mysql_function('post_police_stop', [\
-					stop['datetime'], \
-					stop['outcome_linked_to_object_of_search'] if 'outcome_linked_to_object_of_search' in stop else None, \
-					stop['type'], \
-					stop['operation'] \
-						if 'operation' in stop else None, \
-					stop['object_of_search'] \
-						if 'object_of_search' in stop else None, \
-					stop['operation_name'] \
-						if 'operation_name' in stop else None, \
-					stop['removal_of_more_than_outer_clothing'] \
-						if 'removal_of_more_than_outer_clothing' in stop else None, \
-					#stop['outcome'] \
-					#	if 'outcome' in stop else None, \
-					stop['outcome_object']['name'] \
-						if ('outcome_object' in stop and stop['outcome_object'] is not None and 'name' in stop['outcome_object']) else None, \
-					stop['legislation'] \
-						if 'legislation' in stop else None, \
-					stop['involved_person'] \
-						if 'involved_person' in stop else None, \
-					stop['location']['street']['id'] \
-						if ('location' in stop and stop['location'] is not None and 'street' in stop['location'] and stop['location']['street'] is not None and 'id' in stop['location']['street']) else None, \
-					stop['location']['street']['name'] \
-						if ('location' in stop and stop['location'] is not None and 'street' in stop['location'] and stop['location']['street'] is not None and 'name' in stop['location']['street']) else None, \
-					stop['location']['latitude'] \
-						if ('location' in stop and stop['location'] is not None and 'latitude' in stop['location']) else None, \
-					stop['location']['longitude'] \
-						if ('location' in stop and stop['location'] is not None and 'longitude' in stop['location']) else None, \
-					stop['gender'] \
-						if 'gender' in stop else None, \
-					stop['self_defined_ethnicity'] \
-						if 'self_defined_ethnicity' in stop else None, \
-					stop['officer_defined_ethnicity'] \
-						if 'officer_defined_ethnicity' in stop else None, \
-					stop['age_range'] \
-						if 'age_range' in stop else None \
-				])
-	if stops is not None:
-		return len(stops)
+# lists archive CSV files (in zip files, directories or given directly) into archive_files by (month, dataset)
+# returns False if a path is missing or no archive files were found
+def index_archives(paths):
+	for path in paths:
+		if zipfile.is_zipfile(path):
+			archive = zipfile.ZipFile(path)
+			names = [(path, member) for member in archive.namelist()]
+			archive.close()
+		elif os.path.isdir(path):
+			names = [(os.path.join(directory, name), None) for directory, subdirectories, files in os.walk(path) for name in files]
+		elif os.path.isfile(path):
+			names = [(path, None)]
+		else:
+			print 'ERR: index_archives : "' + path + '" not found.'
+			return False
+		for file_path, member in names:
+			match = re.match('^(\d{4}-\d{2})-(.+)-(street|outcomes|stop-and-search)\.csv$', os.path.basename(member if member is not None else file_path))
+			if match is None or (len(archive_forces) > 0 and match.group(2) not in archive_forces):
+				continue
+			archive_files.setdefault((standardise_date(match.group(1) + '-01'), archive_datasets[match.group(3)]), []).append((file_path, member))
+	return len(archive_files) > 0
+
+# reads the categories and police-locations archive records are mapped onto (in the main thread, before fetching starts)
+def load_archive_lookups():
+	archive_cursor = db.cursor()
+	try:
+		archive_cursor.execute("select identifier, name from category where type = 'police-crime' and name is not null")
+		for identifier, name in archive_cursor.fetchall():
+			archive_crime_codes[name.strip().lower()] = identifier
+		archive_cursor.execute("select identifier, name from category where type = 'police-crime-outcome' and name is not null")
+		for identifier, name in archive_cursor.fetchall():
+			archive_outcome_codes[name.strip().lower()] = identifier
+		# latest place at each lat/long wins
+		archive_cursor.execute("select identifier, latitude, longitude from place where type = 'police-location' and latitude between %s and %s and longitude between %s and %s " \
+			"order by ifnull(timestamp_updated, timestamp_created)", (region_bounds[0] - 0.001, region_bounds[2] + 0.001, region_bounds[1] - 0.001, region_bounds[3] + 0.001))
+		for identifier, latitude, longitude in archive_cursor.fetchall():
+			archive_locations['%.6f,%.6f' % (latitude, longitude)] = identifier
+	except Exception as ex:
+		print 'ERR: load_archive_lookups failed.'
+		template = " - An exception of type {0} occurred. Arguments:\n{1!r}"
+		message = template.format(type(ex).__name__, ex.args)
+		print message
+	archive_cursor.close()
+
+# maps archive 'True' / 'False' onto police API booleans
+def archive_boolean(value):
+	if value is None:
+		return None
+	return value.lower() == 'true'
+
+# maps archive lat/long onto police API location
+# archive files carry no street id, so the police-location already loaded at the same lat/long is used (or a new one keyed on lat/long)
+def archive_location(row, point):
+	key = '%.6f,%.6f' % point
+	return {
+		'street': {'id': archive_locations.get(key, 'archive-' + key), 'name': row.get('Location')},
+		'latitude': '%.6f' % point[0],
+		'longitude': '%.6f' % point[1]
+	}
+
+# maps archive street CSV row onto police API crime record
+def archive_crime(row, point):
+	crime_type = (row.get('Crime type') or '').lower()
+	return {
+		'category': archive_crime_codes.get(crime_type, re.sub('[^a-z]+', '-', crime_type).strip('-')),
+		'id': None,
+		'persistent_id': row['Crime ID'],
+		'context': row.get('Context') or '',
+		'month': row.get('Month'),
+		'location_type': 'BTP' if row.get('Reported by') == 'British Transport Police' else 'Force',
+		'location_subtype': '',
+		'location': archive_location(row, point),
+		'outcome_status': {'category': row['Last outcome category'], 'date': None} if row.get('Last outcome category') is not None else None
+	}
+
+# maps archive outcomes CSV row onto police API outcome record
+def archive_outcome(row, point):
+	outcome_type = row.get('Outcome type') or ''
+	return {
+		'category': {'code': archive_outcome_codes.get(outcome_type.lower()), 'name': outcome_type},
+		'date': row.get('Month'),
+		'crime': {'persistent_id': row['Crime ID'], 'location': archive_location(row, point)}
+	}
+
+# maps archive stop-and-search CSV row onto police API stop record
+def archive_stop(row, point):
+	return {
+		'datetime': row.get('Date'),
+		'type': row.get('Type'),
+		'operation': archive_boolean(row.get('Part of a policing operation')),
+		'operation_name': row.get('Policing operation'),
+		'involved_person': 'person' in (row.get('Type') or '').lower(),
+		'object_of_search': row.get('Object of search'),
+		'legislation': row.get('Legislation'),
+		'outcome_object': {'name': row.get('Outcome')},
+		'outcome_linked_to_object_of_search': archive_boolean(row.get('Outcome linked to object of search')),
+		'removal_of_more_than_outer_clothing': archive_boolean(row.get('Removal of more than just outer clothing')),
+		'location': archive_location(row, point),
+		'gender': row.get('Gender'),
+		'age_range': row.get('Age range'),
+		'self_defined_ethnicity': row.get('Self-defined ethnicity'),
+		'officer_defined_ethnicity': row.get('Officer-defined ethnicity')
+	}
+
+# returns persistent id for archive street CSV row without a crime id (eg anti-social behaviour); a checksum of its month, type and place,
+# plus how many identical rows came before it in the file, so reloading the same file gives the same ids
+def archive_crime_key(row, occurrences):
+	key = '|'.join([row.get('Month') or '', row.get('Crime type') or '', row.get('Latitude') or '', row.get('Longitude') or '', row.get('Location') or ''])
+	occurrences[key] = occurrences.get(key, 0) + 1
+	return hashlib.sha1(key.encode('utf-8') + '|' + str(occurrences[key])).hexdigest()
+
+# yields region records of one (month, dataset) step from the archive files, in police API form, reading each CSV a row at a time
+# rows outside the region polygon are skipped, as are outcomes without a crime id, which cant be matched to their crime
+# crimes without a crime id (eg anti-social behaviour) get one from archive_crime_key, but only in months older than default_start;
+# later months are loaded from the police API as well, where they have police API ids instead, so would be loaded twice
+# skipped rows are counted in metrics ('archive' group)
+# runs in fetch_pool worker threads, so must not touch the database (each file gets its own ZipFile, as they cant be shared between threads)
+def iter_archive_records(month, dataset):
+	convert = {'crimes': archive_crime, 'outcomes': archive_outcome, 'stops': archive_stop}[dataset]
+	for path, member in archive_files.get((month, dataset), []):
+		archive = zipfile.ZipFile(path) if member is not None else None
+		archive_file = archive.open(member) if archive is not None else open(path, 'rb')
+		occurrences = {}
+		skipped = 0
+		try:
+			header = None
+			for values in csv.reader(archive_file):
+				if header is None:
+					header = [value.decode('utf-8-sig').strip() for value in values]
+					continue
+				row = dict((field, value.decode('utf-8', 'replace').strip() or None) for field, value in zip(header, values))
+				try:
+					point = (float(row['Latitude']), float(row['Longitude']))
+				except (KeyError, TypeError, ValueError):
+					continue
+				if not in_region(point[0], point[1]):
+					continue
+				if dataset == 'crimes' and row.get('Crime ID') is None:
+					if month[:7] >= default_start[:7]:
+						skipped = skipped + 1
+						continue
+					row['Crime ID'] = archive_crime_key(row, occurrences)
+				if dataset == 'outcomes' and row.get('Crime ID') is None:
+					skipped = skipped + 1
+					continue
+				yield convert(row, point)
+		finally:
+			archive_file.close()
+			if archive is not None:
+				archive.close()
+			if skipped > 0:
+				metrics_count('archive', dataset, skipped_rows=skipped)
+
+# returns fetch function (as fetch_crimes etc) for archive dataset, so archive steps go through the same pipeline as police API ones
+def fetch_archive(dataset):
+	def fetch(month, get=get_police_data):
+		records = iter_archive_records(month, dataset)
+		if get is get_police_records:
+			return records
+		return list(records)
+	return fetch
+
+# (dataset, option that skips it, fetch function, write function) in the order each month is loaded
+datasets = [
+		('categories',	'no-category-load',	fetch_categories,	write_categories),
+		('crimes',	'no-crime-load',	fetch_crimes,		write_crimes),
+		('outcomes',	'no-outcome-load',	fetch_outcomes,		write_outcomes),
+		('stops',	'no-stop-load',		fetch_stops,		write_stops)
+	]
+
+# as datasets, for archive loads (categories are added as crimes are merged)
+archive_steps = [
+		('crimes',	'no-crime-load',	fetch_archive('crimes'),	write_crimes),
+		('outcomes',	'no-outcome-load',	fetch_archive('outcomes'),	write_outcomes),
+		('stops',	'no-stop-load',		fetch_archive('stops'),		write_stops)
+	]
+
+# (staging table, fields, row function, merge procedure) of datasets that can be streamed into their police_*_stage table batch by batch
+stream_datasets = {
+		'crimes':	('police_crime_stage',		crime_fields,	crime_row,	'merge_police_crime_stage'),
+		'outcomes':	('police_outcome_stage',	outcome_fields,	outcome_params,	'merge_police_outcome_stage'),
+		'stops':	('police_stop_stage',		stop_fields,	stop_row,	'merge_police_stop_stage')
+	}
+
+# deletes this session's rows from a police_*_stage table (eg a streamed payload that turned out to be unchanged)
+def clear_stage(table):
+	global step_failed
+	clear_cursor = db.cursor()
+	try:
+		clear_cursor.execute('delete from ' + table + ' where session_id = %s', (session_id,))
+	except Exception as ex:
+		print 'ERR: clear_stage ' + table + ' failed.'
+		template = " - An exception of type {0} occurred. Arguments:\n{1!r}"
+		message = template.format(type(ex).__name__, ex.args)
+		print message
+		step_failed = True
+	if 'batch-commit' not in options:
+		db.commit()
+	clear_cursor.close()
+
+# (latitude, longitude) of a record of each dataset whose records are shared out between regions (categories belong to every region)
+dataset_points = {
+		'crimes':	crime_point,
+		'outcomes':	outcome_point,
+		'stops':	stop_point
+	}
+
+# checksums of the payload of one (month, dataset) step, one per region, built up record by record as it is written
+# records are serialised with sorted keys, so field order doesnt matter; a record where regions overlap counts towards each of them
+# each region's records are also checksummed digest_batch at a time; add and finish only hand back records from the first batch of a region
+# that differs from the one at the same place in its last loaded payload, since the records of the batches before it are already in the database
+# (merges only ever add or update); so an unchanged payload hands back nothing at all, and a record is only handed back once
+class RegionDigests(object):
+	def __init__(self, dataset, month, step_regions):
+		self.dataset = dataset
+		self.month = month
+		self.point = dataset_points.get(dataset)
+		self.count = 0		# records added
+		self.written = set()	# numbers of records handed back
+		self.regions = {}
+		for region_name in step_regions:
+			loaded_batches = mysql_function('get_police_load_batches', [region_name, dataset, month])
+			self.regions[region_name] = {
+				'loaded_digest': mysql_function('get_police_load_digest', [region_name, dataset, month]),
+				'loaded_batches': loaded_batches.split(',') if loaded_batches else [],
+				'digest': hashlib.sha1(),
+				'records': 0,
+				'batch': hashlib.sha1(),
+				'batches': [],
+				'pending': [],	# (number, record) of the batch being checksummed, until known to differ
+				'changed': 'force-reload' in options
+				}
+
+	# hands back records of region's pending batch not already handed back (for another region)
+	def flush(self, state):
+		records = [record for number, record in state['pending'] if number not in self.written]
+		self.written.update(number for number, record in state['pending'])
+		state['pending'] = []
+		return records
+
+	# ends region's current batch; the region has changed from the first batch that differs from its last loaded payload
+	def end_batch(self, state):
+		state['batches'].append(state['batch'].hexdigest())
+		state['batch'] = hashlib.sha1()
+		index = len(state['batches']) - 1
+		if index >= len(state['loaded_batches']) or state['loaded_batches'][index] != state['batches'][index]:
+			state['changed'] = True
+		if state['changed']:
+			return self.flush(state)
+		state['pending'] = []
+		return []
+
+	# adds record to the checksums of each of the step's regions holding it; returns records to write now
+	def add(self, record):
+		record_regions = [region_name for region_name in get_point_regions(self.point(record) if self.point is not None else None) \
+			if region_name in self.regions]
+		if len(record_regions) == 0:
+			return []
+		number = self.count
+		self.count = self.count + 1
+		serialised = json.dumps(record, sort_keys=True)
+		records = []
+		for region_name in record_regions:
+			state = self.regions[region_name]
+			state['digest'].update(serialised)
+			state['batch'].update(serialised)
+			state['records'] = state['records'] + 1
+			state['pending'].append((number, record))
+			if state['records'] % digest_batch == 0:
+				records.extend(self.end_batch(state))
+			elif state['changed']:
+				records.extend(self.flush(state))
+		return records
+
+	# ends each region's last (part) batch; returns records still to write
+	def finish(self):
+		records = []
+		for region_name, state in sorted(self.regions.items()):
+			if state['records'] % digest_batch > 0:
+				records.extend(self.end_batch(state))
+		return records
+
+	# returns names of regions whose payload differs from the one last loaded
+	def get_changed(self):
+		return [region_name for region_name, state in sorted(self.regions.items()) if state['changed'] \
+			or state['digest'].hexdigest() != state['loaded_digest'] or len(state['batches']) != len(state['loaded_batches'])]
+
+	# remembers the payload of each region that changed as loaded (call once every record has been written)
+	def save(self):
+		for region_name in self.get_changed():
+			state = self.regions[region_name]
+			mysql_procedure('put_police_load_digest', [region_name, self.dataset, self.month, state['digest'].hexdigest(), state['records'], ','.join(state['batches'])])
+
+# fetches payload for one (month, dataset) step; runs in fetch_pool worker threads
+def fetch_step(fetch, month):
+	return fetch(month)
+
+# streams records of one (month, dataset) step onto batches queue, stream_batch records at a time; runs in fetch_pool worker threads
+# the batches queue is bounded, so no more than stream_queue batches are held ahead of the writer
+# puts True once every record has been read, or None if the fetch failed
+def stream_step(fetch, month, batches):
+	try:
+		records = fetch(month, get_police_records)
+		if records is None:
+			batches.put(None)
+			return
+		batch = []
+		for record in records:
+			batch.append(record)
+			if len(batch) >= stream_batch:
+				batches.put(batch)
+				batch = []
+		if len(batch) > 0:
+			batches.put(batch)
+	except Exception as ex:
+		print 'ERR: stream_step (' + month + ') failed.'
+		template = " - An exception of type {0} occurred. Arguments:\n{1!r}"
+		message = template.format(type(ex).__name__, ex.args)
+		print message
+		batches.put(None)
+		return
+	batches.put(True)
+
+# stages records of a streamed (month, dataset) step; returns False if they couldnt be mapped or staged
+def stage_records(month, dataset, records):
+	table, fields, row, merge = stream_datasets[dataset]
+	try:
+		rows = [row(record) for record in records]
+	except Exception as ex:
+		print 'ERR: write_stream ' + dataset + ' (' + month + ') unable to map records.'
+		template = " - An exception of type {0} occurred. Arguments:\n{1!r}"
+		message = template.format(type(ex).__name__, ex.args)
+		print message
+		return False
+	return stage_rows(table, fields, rows)
+
+# stages batches of a streamed (month, dataset) step as they arrive, then merges them
+# only records RegionDigests hands back are staged, so nothing at all is staged or merged if the payload of every region is identical to the one
+# last loaded, and only the records from a region's first changed batch on otherwise (every record if options contains 'force-reload')
+# records outside the step's regions (eg of a region that already completed the step before a resumed run) are left out
+# returns number of records, or None if the fetch failed
+def write_stream(month, dataset, batches, step_regions):
+	global stream_skipped
+	stream_skipped = False
+	table, fields, row, merge = stream_datasets[dataset]
+	digests = RegionDigests(dataset, month, step_regions)
+	due = []
+	staged = 0
+	failed = False
+	# always read every batch, so the fetch thread can finish
+	while True:
+		batch = batches.get()
+		if batch is None or batch is True:
+			break
+		for record in batch:
+			due.extend(digests.add(record))
+		if len(due) >= stream_batch:
+			failed = failed or not stage_records(month, dataset, due)
+			staged = staged + len(due)
+			due = []
+	if batch is True:
+		due.extend(digests.finish())
+		if len(due) > 0:
+			failed = failed or not stage_records(month, dataset, due)
+			staged = staged + len(due)
+	if batch is None or failed:
+		clear_stage(table)
+		return None
+	if staged == 0:
+		# print "INF: Skipping unchanged " + dataset + " records for '" + month + "'."
+		stream_skipped = True
 	else:
-		return 0
+		resolved = []
+		mysql_procedure(merge, [], resolved)
+		id_cache_put_resolved(resolved)
+	if not step_failed:
+		digests.save()
+	return digests.count
+
+# queues fetches for each (month, dataset) step in order; runs in its own thread
+# the queue is bounded, so no more than prefetch payloads are held ahead of the writer
+# steps whose dataset can be streamed are queued with a (bounded) queue of record batches rather than a whole payload
+def prefetch_steps(steps, step_queue):
+	for month, dataset, fetch, write, step_regions, last_in_month in steps:
+		if dataset in stream_datasets and 'no-stream' not in options and 'no-bulk-load' not in options:
+			batches = Queue.Queue(stream_queue)
+			fetch_pool.apply_async(stream_step, (fetch, month, batches))
+			step_queue.put((month, dataset, write, step_regions, last_in_month, batches))
+		else:
+			step_queue.put((month, dataset, write, step_regions, last_in_month, fetch_pool.apply_async(fetch_step, (fetch, month))))
+	step_queue.put(None)
+
+# records load run summary (totals, police API and database timings, and steps) in load_run and, if --metrics was given, as a JSON file
+# each region loaded gets a load_run row of its own, holding the summary of the whole run
+# a run that didnt get to the end (completed False) is recorded as failed, whatever its steps did
+def write_metrics(started, finished, completed=True):
+	with metrics_lock:
+		summary = copy.deepcopy(metrics)
+	steps = summary['steps']
+	http_calls = sum(entry['calls'] for entry in summary['http'].values())
+	summary['latency_buckets'] = latency_buckets
+	summary['run'] = {
+		'region': region,
+		'regions': regions,
+		'session_id': session_id,
+		'options': options,
+		'archive': archive_paths,
+		'started': str(started),
+		'finished': str(finished),
+		'status': 'failed' if not completed or any(step['failed'] for step in steps) else 'complete'
+		}
+	summary['totals'] = {
+		'steps': len(steps),
+		'failed_steps': len([step for step in steps if step['failed']]),
+		'skipped_steps': len([step for step in steps if step['skipped']]),
+		'records': sum(step['records'] for step in steps),
+		'step_seconds': round(sum(step['seconds'] for step in steps), 3),
+		'http_requests': http_calls - sum(entry.get('retries', 0) for entry in summary['http'].values()),
+		'http_retries': sum(entry.get('retries', 0) for entry in summary['http'].values()),
+		'http_failures': sum(entry.get('failures', 0) for entry in summary['http'].values()),
+		'http_bytes': sum(entry.get('bytes', 0) for entry in summary['http'].values()),
+		'http_seconds': round(sum(entry['seconds'] for entry in summary['http'].values()), 3),
+		'db_calls': sum(entry['calls'] for entry in summary['db'].values()),
+		'db_seconds': round(sum(entry['seconds'] for entry in summary['db'].values()), 3),
+		'archive_skipped_rows': sum(entry.get('skipped_rows', 0) for entry in summary['archive'].values())
+		}
+	if summary['totals']['step_seconds'] > 0:
+		summary['totals']['records_per_second'] = round(summary['totals']['records'] / summary['totals']['step_seconds'], 1)
+	for region_name in regions:
+		mysql_procedure('post_load_run', [region_name, session_id, str(started), str(finished), summary['run']['status'], json.dumps(summary, sort_keys=True)])
+	if metrics_dir is None:
+		return
+	metrics_file = os.path.join(metrics_dir, 'load-run-' + re.sub('[^a-z0-9]+', '-', region.lower()) + '-' + re.sub('[^0-9]', '', str(started)) + '.json')
+	try:
+		if not os.path.isdir(metrics_dir):
+			os.makedirs(metrics_dir)
+		with open(metrics_file, 'w') as f:
+			json.dump(summary, f, sort_keys=True, indent=2)
+	except Exception as ex:
+		print 'ERR: write_metrics "' + metrics_file + '" failed.'
+		template = " - An exception of type {0} occurred. Arguments:\n{1!r}"
+		message = template.format(type(ex).__name__, ex.args)
+		print message
+
 
 ### MAIN ###
 
 # manage commandline args
 try:
-	opts, args = getopt.getopt(sys.argv[1:], "r:u:p:h:d:o:", ["region=", "user=", "password=", "host=", "database=", "options=" ])
+	opts, args = getopt.getopt(sys.argv[1:], "r:u:p:h:d:o:w:", ["region=", "user=", "password=", "host=", "database=", "options=", "workers=", "prefetch=", "cache=", "offline", "tile=", "rate=", "burst=", "archive=", "metrics=", "api-url=", "lease=" ])
 except getopt.GetoptError as err:
 	print(err)
 	sys.exit(2)
@@ -555,11 +1876,64 @@ for o, a in opts:
 		database = a
 	elif o in ("-o", "--options"):
 		options = a
+	elif o in ("-w", "--workers"):
+		workers = int(a)
+	elif o in ("--prefetch",):
+		prefetch = int(a)
+	elif o in ("--cache",):
+		cache_dir = a
+	elif o in ("--offline",):
+		offline = True
+	elif o in ("--tile",):
+		tile_size = float(a)
+	elif o in ("--rate",):
+		rate = float(a)
+	elif o in ("--burst",):
+		burst = int(a)
+	elif o in ("--metrics",):
+		metrics_dir = a
+	elif o in ("--lease",):
+		lease_seconds = int(a)
+	elif o in ("--api-url",):
+		api_url = a if a.endswith('/') else a + '/' # eg benchmark/fake-police-api.py
+	elif o in ("--archive",):
+		archive_paths = [path.strip() for path in a.split(',') if len(path.strip()) > 0]
 
 # check for required parms
 if region is None or user is None or password is None or host is None or database is None:
 	print('ERR: Specify all parameters')
 	sys.exit(1)
+if workers < 1 or prefetch < 1:
+	print('ERR: Specify at least one worker and prefetch')
+	sys.exit(1)
+if rate <= 0 or burst < 1:
+	print('ERR: Specify a rate above 0 and a burst of at least 1')
+	sys.exit(1)
+if tile_size < 0:
+	print('ERR: Specify a tile size of 0 (no tiling) or more degrees')
+	sys.exit(1)
+if lease_seconds < 1:
+	print('ERR: Specify a lease of at least 1 second')
+	sys.exit(1)
+if offline and cache_dir is None:
+	print('ERR: Specify --cache to load offline')
+	sys.exit(1)
+
+# several regions can be loaded together; digests, jobs and load runs are kept for each region, so any of them can be loaded with others or alone
+# they are sorted and deduplicated, so the run (and its metrics file) is named the same however they are listed
+regions = sorted(set(region_name.strip() for region_name in region.split(',') if len(region_name.strip()) > 0))
+region = ','.join(regions)
+if len(regions) == 0:
+	print('ERR: Specify at least one region')
+	sys.exit(1)
+
+# set up pooled police API connections and fetch threads (tile requests run in their own pool, as fetch_pool threads wait on them)
+http_session = requests.Session()
+http_session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=workers * (prefetch + 1)))	# each step being fetched keeps up to workers tiles open
+http_session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=workers * (prefetch + 1)))
+fetch_pool = ThreadPool(workers)
+tile_pool = ThreadPool(workers)
+rate_bucket = TokenBucket(rate, burst)
 
 # test connection to database
 try:
@@ -567,17 +1941,34 @@ try:
 except:
 	print('ERR: Unable to connect to database "' + database + '" with user "' + user + '"' )
 	sys.exit(1)
+session_id = db.connection_id
+lease_holder = socket.gethostname() + ':' + str(os.getpid()) + ':' + str(session_id)
 #print('INF: Connection to DB : OK')
 
+# make sure event has a partition for this year and next; only needed in the first load of a new year, and done here,
+# before anything is written, as its alter table commits implicitly
+if mysql_function('exists_event_partitions', [1]) == 0:
+	mysql_procedure('put_event_partitions', [1])
+
+# archive load; months come from the archive files rather than the police API
+if archive_paths is not None:
+	archive_forces = get_archive_forces()
+	if not index_archives(archive_paths):
+		print('ERR: No police archive files found in "' + ','.join(archive_paths) + '"')
+		sys.exit(1)
+	police_data_last_updated = max(month for month, dataset in archive_files)
+	job_source = 'archive'
+
 # test connection to police data API
 # police data website is *extremely* flaky
-police_data_last_updated = get_police_data('crime-last-updated', None)
-if police_data_last_updated is None or len(police_data_last_updated) == 0:
-	print('ERR: Unable to access police data.')
-	sys.exit(1)
-else :
-	police_data_last_updated = standardise_date(police_data_last_updated[0]['date'])
-#print('INF: Connection to police API : OK')
+else:
+	police_data_last_updated = get_police_data('crime-last-updated', None)
+	if police_data_last_updated is None or len(police_data_last_updated) == 0:
+		print('ERR: Unable to access police data.')
+		sys.exit(1)
+	else :
+		police_data_last_updated = standardise_date(police_data_last_updated[0]['date'])
+	#print('INF: Connection to police API : OK')
 
 # default data load start date (earliest police data 2015-01)
 # default_start = standardise_date(datetime.strftime(datetime.today().date() - timedelta(days=1095), '%Y-%m-01')) # 3 yr
@@ -586,99 +1977,259 @@ default_start = standardise_date(datetime.strftime(datetime.today().date() - tim
 #default_start =  '2015-06-01' # fixed date
 #print "DBG: default_start : " + default_start
 
-# get last update value (assume default_start if blank)
-local_data_last_updated = standardise_date(mysql_function('get_variable', ['crime-last-updated']))
-if local_data_last_updated is None or len(local_data_last_updated) == 0:
-	local_data_last_updated = default_start
-	mysql_procedure('post_variable', ['crime-last-updated', default_start])
+# get last update value of each region (falling back on the value shared by every region before regions kept their own, then default_start)
+region_last_updated = {}
+for region_name in regions:
+	last_updated = standardise_date(mysql_function('get_variable', [get_region_variable('crime-last-updated', region_name)]))
+	if last_updated is None or len(last_updated) == 0:
+		last_updated = standardise_date(mysql_function('get_variable', ['crime-last-updated']))
+		if last_updated is None or len(last_updated) == 0:
+			last_updated = default_start
+		mysql_procedure('post_variable', [get_region_variable('crime-last-updated', region_name), last_updated])
+	region_last_updated[region_name] = last_updated
+
+# resume each region whose last run stopped part way (died, or some step failed); only its unfinished steps are run again
+# (unless options contains 'no-resume', when every step is run afresh)
+resume_regions = []
+if 'no-resume' not in options:
+	resume_regions = [region_name for region_name in regions if (mysql_function('count_unfinished_load_jobs', [region_name, job_source]) or 0) > 0]
+resume = len(resume_regions) > 0
 
-# exit here if already updated
+# exit here if every region already updated and there is nothing to resume (archive loads backfill, so always run)
 # police_data_last_updated is always in the form 'YYYY-MM-01' which actually means 'YYYY-MM-DD' where DD is last day of month
-if datetime.strptime(local_data_last_updated, '%Y-%m-%d') >= datetime.strptime(police_data_last_updated, '%Y-%m-%d'):
+if archive_paths is None and not resume \
+	and datetime.strptime(min(region_last_updated.values()), '%Y-%m-%d') >= datetime.strptime(police_data_last_updated, '%Y-%m-%d'):
 	# print('INF: Already up to date; nothing to do.')
 	sys.exit(0)
 
-# test police data load isnt already running
-# mysql_procedure('delete_variable', ['police-data-load'])
-if mysql_function('get_variable', ['police-data-load']) is not None:
-	print('ERR: Police data load is already running (or failed previously)' )
-	sys.exit(1)
-mysql_procedure('post_variable', ['police-data-load', 'started'])
-
 # test region specified exists
-if region is not None and mysql_function('exists_place', ['name', region ]) == 0 :
-	print('ERROR : Region "' + region + '" has not been loaded into the database')
-	sys.exit(1)
+for region_name in regions:
+	if mysql_function('exists_place', ['name', region_name ]) == 0 :
+		print('ERROR : Region "' + region_name + '" has not been loaded into the database')
+		sys.exit(1)
 # print('INF: Region specified : OK' )
 
-# debug quit before loading
-# sys.exit(0)
+# test police data load isnt already running for any region (each region has its own lease, so other regions can load alongside)
+if not acquire_regions():
+	sys.exit(1)
 
-# load force(s) for region
-if 'no-force-load' not in options:
-	mysql_procedure('put_variable', ['police-data-load', 'loading force and neighbourhood data' ])
-	if load_force(region) is None:
-		print('Unable to load forces for region "' + region + '"')
+# database time load started (recorded in load run metrics); police stats are refreshed for crimes added or changed after stats_since
+load_started = mysql_function('now', [])
+stats_since = load_started
+
+# from here on, leases are given back and run metrics recorded however the load ends (a failed step, an exception or sys.exit)
+load_finished = False
+try:
+	# debug quit before loading
+	# sys.exit(0)
+
+	# load force(s) for each region; forces (and their neighbourhoods) covering several regions are only loaded once
+	if 'no-force-load' not in options:
+		load_progress('loading force and neighbourhood data')
+		for region_name in regions:
+			if load_force(region_name) is None:
+				print('Unable to load forces for region "' + region_name + '"')
+				sys.exit(1)
+			if 'batch-commit' in options:
+				db.commit()
+		# print('INF: Force data loaded : OK')
+
+	# resolve regions into police API form once, before fetching starts (fetch threads dont touch the database)
+	# several regions always need their polygons, to share records out between them (without tiles, the MBR of them all is queried)
+	place_string = get_regions_string()
+	if place_string is None:
+		print('ERR: Unable to get police API boundary for region "' + region + '"')
 		sys.exit(1)
-	# print('INF: Force data loaded : OK')
-
-loop = 1 # safety net
-maxloop = 100 # safety net
-
-# wind through each month (currently starts loop on latest already-loaded month)
-# while datetime.strptime(local_data_last_updated, '%Y-%m-%d') <= datetime.strptime(police_data_last_updated, '%Y-%m-%d') \
-
-# starting point = three years ago (minus 1 month, which is added back on at top of loop)
-month_to_load = default_start
-
-# wind through each month (currently starts loop on 3 years ago, to catch up on later changes to historical data)
-while datetime.strptime(month_to_load, '%Y-%m-%d') <= datetime.strptime(police_data_last_updated, '%Y-%m-%d') \
-	and datetime.strptime(month_to_load, '%Y-%m-%d') <= datetime.today() \
-	and loop <= maxloop:
-	
-	# print "DBG: Loop : " + str(loop) + "/" + str(maxloop) + " (" + month_to_load + " / " + police_data_last_updated + ")"
-	crimes_loaded = 0
-
-	if 'no-category-load' not in options:
-		# print "INF: Loading categories for month '" + month_to_load + "'."
-		mysql_procedure('put_variable', ['police-data-load', 'loading categories ' + ' (' + month_to_load + ' / ' + police_data_last_updated + ')' ])
-		categories_loaded = load_categories(month_to_load)
-		# print "INF: Loaded " + str(categories_loaded) + " category records for '" + month_to_load + "'."
-
-	# debug quit
-	#sys.exit(0)
-
-	if 'no-crime-load' not in options:
-		# print "INF: Loading crime data for region '" + region + "' and month '" + month_to_load + "'."
-		mysql_procedure('put_variable', ['police-data-load', 'loading crimes ' + ' (' + month_to_load + ' / ' + police_data_last_updated + ')' ])
-		crimes_loaded = load_crimes(region, month_to_load)
-		# print "INF: Loaded " + str(crimes_loaded) + " crime records for '" + month_to_load + "'."
-	
-	# only continue if crime data was loaded (note this can cause issues when loading a new DB and crime-last-updated is so old that theres no data for it)
-	# if crimes_loaded is not None and crimes_loaded > 0 :
-	if 'no-outcome-load' not in options:
-		# print "INF: Loading outcome data for region '" + region + "' and month '" + month_to_load + "'."
-		mysql_procedure('put_variable', ['police-data-load', 'loading outcomes ' + ' (' + month_to_load + ' / ' + police_data_last_updated + ')' ])
-		outcomes_loaded = load_outcomes(region, month_to_load)
-		# print "INF: Loaded " + str(outcomes_loaded) + " outcome records for '" + month_to_load + "'."
-
-	if 'no-stop-load' not in options:
-		# print "INF: Loading stop data for region '" + region + "' and month '" + month_to_load + "'."
-		mysql_procedure('put_variable', ['police-data-load', 'loading stops ' + ' (' + month_to_load + ' / ' + police_data_last_updated + ')' ])
-		stops_loaded = load_stops(region, month_to_load)
-		# print "INF: Loaded " + str(stops_loaded) + " stop records for '" + month_to_load + "'."
-
-	# update crime-last-updated value if any crimes have been loaded
-	if datetime.strptime(month_to_load, '%Y-%m-%d') > datetime.strptime(local_data_last_updated, '%Y-%m-%d'):
-		# print "INF: Logging variable 'crime-last-updated' = " + month_to_load + "'."
-		mysql_procedure('put_variable', ['crime-last-updated', month_to_load])
-
-	loop = loop + 1
-	month_to_load = standardise_date( datetime.strftime( datetime.strptime( month_to_load, '%Y-%m-%d' ) + relativedelta.relativedelta(months=1), '%Y-%m-%d' ) )
-
-# perform data load sanity check
-mysql_procedure('delete_variable', ['crime-load-sanity'])
-mysql_procedure('post_variable', ['crime-load-sanity',  mysql_function('police_crime_sanity_check','') ])
-
-# mark that load has completed
-mysql_procedure('delete_variable', ['police-data-load'])
+	if tile_size > 0 or archive_paths is not None or len(regions) > 1:
+		for region_name in regions:
+			region_polygon = get_place_polygon(region_name)
+			if region_polygon is None or not set_region_shape(region_polygon, region_name):
+				if archive_paths is not None or len(regions) > 1:
+					print('ERR: Unable to get polygon for region "' + region_name + '" to share out records by')
+					sys.exit(1)
+				print('ERR: Unable to get polygon for region "' + region_name + '"; querying its MBR instead')
+		if tile_size > 0 and len(region_shapes) > 0:
+			set_region_tiles()
+	if archive_paths is not None:
+		load_archive_lookups()
+
+	loop = 1 # safety net
+	maxloop = 100 # safety net
+
+	# wind through each month (currently starts loop on latest already-loaded month)
+	# while datetime.strptime(local_data_last_updated, '%Y-%m-%d') <= datetime.strptime(police_data_last_updated, '%Y-%m-%d') \
+
+	# starting point = three years ago (minus 1 month, which is added back on at top of loop)
+	month_to_load = default_start
+
+	# list months to load (currently starts loop on 3 years ago, to catch up on later changes to historical data; archive loads cover every archived month)
+	months = []
+	if archive_paths is not None:
+		months = sorted(set(month for month, dataset in archive_files))
+	while archive_paths is None \
+		and datetime.strptime(month_to_load, '%Y-%m-%d') <= datetime.strptime(police_data_last_updated, '%Y-%m-%d') \
+		and datetime.strptime(month_to_load, '%Y-%m-%d') <= datetime.today() \
+		and loop <= maxloop:
+		months.append(month_to_load)
+		loop = loop + 1
+		month_to_load = standardise_date( datetime.strftime( datetime.strptime( month_to_load, '%Y-%m-%d' ) + relativedelta.relativedelta(months=1), '%Y-%m-%d' ) )
+
+	# list each (month, dataset) step
+	steps = []
+	for month_to_load in months:
+		if archive_paths is not None:
+			steps.extend([(month_to_load, dataset, fetch, write) for dataset, skip_option, fetch, write in archive_steps \
+					if skip_option not in options and (month_to_load, dataset) in archive_files])
+		else:
+			steps.extend([(month_to_load, dataset, fetch, write) for dataset, skip_option, fetch, write in datasets if skip_option not in options])
+
+	# a resumed region only runs the steps its last run didnt complete (or didnt have); police stats are refreshed for changes since that run started
+	# steps new since the last run are queued alongside; unfinished ones keep their attempt counts
+	# each step lists the regions it is run for, and is dropped once no region needs it
+	job_status = {}
+	for region_name in regions:
+		if region_name in resume_regions:
+			for month_to_load, dataset, fetch, write in steps:
+				job_status[(region_name, month_to_load, dataset)] = mysql_function('get_load_job_status', [region_name, job_source, dataset, month_to_load])
+			jobs_started = mysql_function('get_load_jobs_started', [region_name, job_source])
+			if jobs_started is not None and (stats_since is None or jobs_started < stats_since):
+				stats_since = jobs_started
+		else:
+			mysql_procedure('delete_load_jobs', [region_name, job_source])
+	steps = [(month_to_load, dataset, fetch, write, [region_name for region_name in regions if job_status.get((region_name, month_to_load, dataset)) != 'complete']) \
+		for month_to_load, dataset, fetch, write in steps]
+	steps = [step for step in steps if len(step[4]) > 0]
+	# if resume:
+	#	print('INF: Resuming police data load of "' + '", "'.join(resume_regions) + '" with ' + str(len(steps)) + ' unfinished steps')
+	for month_to_load, dataset, fetch, write, step_regions in steps:
+		for region_name in step_regions:
+			if job_status.get((region_name, month_to_load, dataset)) is None:
+				mysql_procedure('post_load_job', [region_name, job_source, dataset, month_to_load])
+	if 'batch-commit' in options:
+		db.commit()
+
+	# flag last step of each month
+	steps = [step + (index == len(steps) - 1 or steps[index + 1][0] != step[0],) for index, step in enumerate(steps)]
+
+	# pipeline; prefetch_steps keeps up to prefetch payloads being fetched while this (the only database) thread writes them in order
+	step_queue = Queue.Queue(prefetch)
+	prefetch_thread = threading.Thread(target=prefetch_steps, args=(steps, step_queue))
+	prefetch_thread.daemon = True
+	prefetch_thread.start()
+
+	month_failed = False
+	while True:
+		step = step_queue.get()
+		if step is None:
+			break
+		month_to_load, dataset, write, step_regions, last_in_month, fetched = step
+		step_started = time()
+		skipped = False
+		put_job(step_regions, dataset, month_to_load, 'running')
+
+		# print "DBG: Step : " + dataset + " (" + month_to_load + " / " + police_data_last_updated + ")"
+		if isinstance(fetched, Queue.Queue):
+			# streamed step; write_stream stages, checksums and merges (or skips) the payload batch by batch
+			load_progress('loading ' + dataset + ' ' + ' (' + month_to_load + ' / ' + police_data_last_updated + ')')
+			loaded = load_step(dataset, month_to_load, write_stream, month_to_load, dataset, fetched, step_regions)
+			month_failed = month_failed or loaded is None
+			skipped = stream_skipped
+		else:
+			try:
+				data = fetched.get()
+			except Exception as ex:
+				print 'ERR: fetch ' + dataset + ' (' + month_to_load + ') failed.'
+				template = " - An exception of type {0} occurred. Arguments:\n{1!r}"
+				message = template.format(type(ex).__name__, ex.args)
+				print message
+				data = None
+				month_failed = True
+
+			# a failed fetch fails the step, so a resumed run fetches it again
+			if data is None:
+				loaded = None
+				month_failed = True
+			else:
+				# only the records of each region from its first batch that changed since last loaded are written (see RegionDigests)
+				digests = RegionDigests(dataset, month_to_load, step_regions)
+				due = []
+				for record in data:
+					due.extend(digests.add(record))
+				due.extend(digests.finish())
+				if len(due) == 0:
+					# print "INF: Skipping unchanged " + dataset + " records for '" + month_to_load + "'."
+					loaded = digests.count
+					skipped = True
+					digests.save()
+				else:
+					load_progress('loading ' + dataset + ' ' + ' (' + month_to_load + ' / ' + police_data_last_updated + ')')
+					loaded = load_step(dataset, month_to_load, write, month_to_load, due)
+					month_failed = month_failed or loaded is None
+
+					# only remember payloads written without any failed database call
+					if loaded is not None and not step_failed:
+						loaded = digests.count
+						digests.save()
+				if 'batch-commit' in options:
+					db.commit()
+		# print "INF: Loaded " + str(loaded) + " " + dataset + " records for '" + month_to_load + "'."
+		put_job(step_regions, dataset, month_to_load, 'failed' if loaded is None or step_failed else 'complete', loaded)
+		step_seconds = time() - step_started
+		metrics['steps'].append({
+			'dataset': dataset,
+			'month': month_to_load[:7],
+			'regions': step_regions,
+			'records': loaded or 0,
+			'seconds': round(step_seconds, 3),
+			'records_per_second': round((loaded or 0) / step_seconds, 1) if step_seconds > 0 else None,
+			'skipped': skipped,
+			'failed': loaded is None or step_failed
+			})
+
+		if not last_in_month:
+			continue
+
+		# update each region's crime-last-updated value once every dataset of the month has been written (and none failed to fetch, or was rolled back)
+		# archive loads leave it be, so the police API versions of archived months are still loaded
+		for region_name in regions:
+			if archive_paths is None and datetime.strptime(month_to_load, '%Y-%m-%d') > datetime.strptime(region_last_updated[region_name], '%Y-%m-%d') \
+				and not month_failed:
+				# print "INF: Logging variable 'crime-last-updated' = " + month_to_load + "'."
+				mysql_procedure('put_variable', [get_region_variable('crime-last-updated', region_name), month_to_load])
+		if 'batch-commit' in options:
+			db.commit()
+		month_failed = False
+
+	# refresh each region's materialised police stats for months whose crimes (or their outcomes) changed during this load (unless options contains 'no-stats-refresh')
+	if 'no-stats-refresh' not in options and stats_since is not None:
+		load_progress('refreshing police stats')
+		for region_name in regions:
+			mysql_procedure('refresh_police_stats_since', [str(stats_since), region_name])
+		if 'batch-commit' in options:
+			db.commit()
+
+	# perform data load sanity check
+	mysql_procedure('delete_variable', ['crime-load-sanity'])
+	mysql_procedure('post_variable', ['crime-load-sanity',  mysql_function('police_crime_sanity_check','') ])
+
+	load_finished = True
+finally:
+	# anything left uncommitted by a load that didnt finish is rolled back first, so it isnt committed along with the metrics
+	if not load_finished and 'batch-commit' in options:
+		try:
+			db.rollback()
+		except Exception as ex:
+			print 'ERR: Unable to roll back unfinished load.'
+			template = " - An exception of type {0} occurred. Arguments:\n{1!r}"
+			message = template.format(type(ex).__name__, ex.args)
+			print message
+
+	# record load run metrics
+	write_metrics(load_started, mysql_function('now', []), load_finished)
+
+	# mark that load has completed
+	release_regions()
+
+id_cache_clear()
+fetch_pool.close()
+tile_pool.close()